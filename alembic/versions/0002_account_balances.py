@@ -0,0 +1,51 @@
+"""materialized account balances
+
+Revision ID: 0002_account_balances
+Revises: 0001_initial
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002_account_balances'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # 0001 runs create_all against the current models, so on a fresh database the tables already exist
+    if not inspector.has_table('accountbalance'):
+        op.create_table(
+            'accountbalance',
+            sa.Column('account_id', sa.Integer(), sa.ForeignKey('account.id'), primary_key=True),
+            sa.Column('debit', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('credit', sa.Float(), nullable=False, server_default='0'),
+        )
+        op.execute(
+            "INSERT INTO accountbalance (account_id, debit, credit) "
+            "SELECT a.id, COALESCE(SUM(l.debit), 0), COALESCE(SUM(l.credit), 0) "
+            "FROM account a LEFT JOIN ledgerentry l ON l.account_id = a.id GROUP BY a.id"
+        )
+    if not inspector.has_table('accountdailybalance'):
+        op.create_table(
+            'accountdailybalance',
+            sa.Column('account_id', sa.Integer(), sa.ForeignKey('account.id'), primary_key=True),
+            sa.Column('date', sa.Date(), primary_key=True),
+            sa.Column('debit', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('credit', sa.Float(), nullable=False, server_default='0'),
+        )
+        op.execute(
+            "INSERT INTO accountdailybalance (account_id, date, debit, credit) "
+            "SELECT l.account_id, j.date, SUM(l.debit), SUM(l.credit) "
+            "FROM ledgerentry l JOIN journalentry j ON j.id = l.journal_id "
+            "WHERE l.account_id IS NOT NULL GROUP BY l.account_id, j.date"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('accountdailybalance')
+    op.drop_table('accountbalance')
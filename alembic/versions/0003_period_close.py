@@ -0,0 +1,39 @@
+"""fiscal period close snapshots
+
+Revision ID: 0003_period_close
+Revises: 0002_account_balances
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_period_close'
+down_revision = '0002_account_balances'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('fiscalperiod'):
+        op.create_table(
+            'fiscalperiod',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('start_date', sa.Date(), nullable=False),
+            sa.Column('end_date', sa.Date(), nullable=False),
+            sa.Column('closed_at', sa.DateTime(), nullable=False),
+        )
+    if not inspector.has_table('periodbalance'):
+        op.create_table(
+            'periodbalance',
+            sa.Column('period_id', sa.Integer(), sa.ForeignKey('fiscalperiod.id'), primary_key=True),
+            sa.Column('account_id', sa.Integer(), sa.ForeignKey('account.id'), primary_key=True),
+            sa.Column('debit', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('credit', sa.Float(), nullable=False, server_default='0'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('periodbalance')
+    op.drop_table('fiscalperiod')
@@ -0,0 +1,64 @@
+"""integer minor-unit money columns
+
+Revision ID: 0004_minor_units
+Revises: 0003_period_close
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_minor_units'
+down_revision = '0003_period_close'
+branch_labels = None
+depends_on = None
+
+# table -> [(minor column, float column it is backfilled from)]
+MINOR_COLUMNS = {
+    'ledgerentry': [('debit_minor', 'debit'), ('credit_minor', 'credit')],
+    'invoiceline': [('amount_minor', 'amount'), ('igst_minor', 'igst'), ('cgst_minor', 'cgst'), ('sgst_minor', 'sgst')],
+    'tdsdeduction': [('amount_minor', 'amount'), ('tds_amount_minor', 'tds_amount')],
+    'fxrealization': [('original_amount_minor', 'original_amount'), ('realized_amount_minor', 'realized_amount'), ('gain_loss_minor', 'gain_loss')],
+    # balance tables switch to minor units entirely; their float columns are dropped below
+    'accountbalance': [('debit_minor', 'debit'), ('credit_minor', 'credit')],
+    'accountdailybalance': [('debit_minor', 'debit'), ('credit_minor', 'credit')],
+    'periodbalance': [('debit_minor', 'debit'), ('credit_minor', 'credit')],
+}
+MINOR_ONLY_TABLES = ('accountbalance', 'accountdailybalance', 'periodbalance')
+
+
+def _columns(inspector, table):
+    return {c['name'] for c in inspector.get_columns(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if 'exponent' not in _columns(inspector, 'currency'):
+        op.add_column('currency', sa.Column('exponent', sa.Integer(), nullable=False, server_default='2'))
+    for table, pairs in MINOR_COLUMNS.items():
+        existing = _columns(inspector, table)
+        for minor, major in pairs:
+            if minor in existing:
+                continue
+            op.add_column(table, sa.Column(minor, sa.BigInteger(), nullable=False, server_default='0'))
+            # every currency had the default exponent (2) before this migration
+            op.execute(f"UPDATE {table} SET {minor} = CAST(ROUND({major} * 100) AS BIGINT) WHERE {major} IS NOT NULL")
+    for table in MINOR_ONLY_TABLES:
+        stale = [major for _, major in MINOR_COLUMNS[table] if major in _columns(inspector, table)]
+        if stale:
+            with op.batch_alter_table(table) as batch:
+                for col in stale:
+                    batch.drop_column(col)
+
+
+def downgrade() -> None:
+    for table in MINOR_ONLY_TABLES:
+        for minor, major in MINOR_COLUMNS[table]:
+            op.add_column(table, sa.Column(major, sa.Float(), nullable=False, server_default='0'))
+            op.execute(f"UPDATE {table} SET {major} = {minor} / 100.0")
+    for table, pairs in MINOR_COLUMNS.items():
+        with op.batch_alter_table(table) as batch:
+            for minor, _ in pairs:
+                batch.drop_column(minor)
+    with op.batch_alter_table('currency') as batch:
+        batch.drop_column('exponent')
@@ -0,0 +1,28 @@
+"""columnar export watermarks
+
+Revision ID: 0005_export_watermark
+Revises: 0004_minor_units
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_export_watermark'
+down_revision = '0004_minor_units'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table('exportwatermark'):
+        op.create_table(
+            'exportwatermark',
+            sa.Column('table_name', sa.String(), primary_key=True),
+            sa.Column('last_id', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('exportwatermark')
@@ -0,0 +1,54 @@
+"""indexes for hot lookup paths
+
+Revision ID: 0006_hot_query_indexes
+Revises: 0005_export_watermark
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_hot_query_indexes'
+down_revision = '0005_export_watermark'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns, unique) -- names match what the models declare, so create_all and this agree
+INDEXES = [
+    ('ix_ledgerentry_account_id', 'ledgerentry', ['account_id'], False),
+    ('ix_ledgerentry_journal_id', 'ledgerentry', ['journal_id'], False),
+    ('ix_journalentry_date', 'journalentry', ['date'], False),
+    ('ix_fiscalperiod_end_date', 'fiscalperiod', ['end_date'], False),
+    ('ix_invoice_date', 'invoice', ['date'], False),
+    ('ix_invoice_invoice_number', 'invoice', ['invoice_number'], True),
+    ('ix_invoice_einvoice_irn', 'invoice', ['einvoice_irn'], True),
+    ('ix_invoiceline_invoice_id', 'invoiceline', ['invoice_id'], False),
+    ('ix_einvoiceaudit_invoice_id_timestamp', 'einvoiceaudit', ['invoice_id', 'timestamp'], False),
+    ('ix_exchangerate_base_target_timestamp', 'exchangerate', ['base', 'target', 'timestamp'], False),
+    ('ix_webhooknonce_nonce', 'webhooknonce', ['nonce'], True),
+]
+
+
+def _check_unique(bind, table: str, column: str) -> None:
+    dupes = bind.execute(sa.text(
+        f"SELECT {column}, COUNT(*) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column} HAVING COUNT(*) > 1 LIMIT 5"
+    )).fetchall()
+    if dupes:
+        raise RuntimeError(f"Cannot add unique index on {table}.{column}; duplicate values: {[d[0] for d in dupes]}")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for name, table, columns, unique in INDEXES:
+        # 0001 runs create_all against the current models, so on a fresh database the indexes already exist
+        if name in {ix['name'] for ix in inspector.get_indexes(table)}:
+            continue
+        if unique:
+            _check_unique(bind, table, columns[0])
+        op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,42 @@
+"""unrealized FX revaluation records
+
+Revision ID: 0007_fx_revaluation
+Revises: 0006_hot_query_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007_fx_revaluation'
+down_revision = '0006_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('fxrevaluation'):
+        return
+    op.create_table(
+        'fxrevaluation',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('as_of', sa.Date(), nullable=False),
+        sa.Column('journal_id', sa.Integer(), sa.ForeignKey('journalentry.id'), nullable=True),
+        sa.Column('account_id', sa.Integer(), sa.ForeignKey('account.id'), nullable=True),
+        sa.Column('invoice_id', sa.Integer(), sa.ForeignKey('invoice.id'), nullable=True),
+        sa.Column('currency', sa.String(), nullable=False),
+        sa.Column('functional_currency', sa.String(), nullable=False),
+        sa.Column('closing_rate', sa.Float(), nullable=False),
+        sa.Column('balance_minor', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('carrying_minor', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('revalued_minor', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('gain_loss_minor', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_fxrevaluation_as_of', 'fxrevaluation', ['as_of'])
+    op.create_index('ix_fxrevaluation_account_id', 'fxrevaluation', ['account_id'])
+    op.create_index('ix_fxrevaluation_invoice_id', 'fxrevaluation', ['invoice_id'])
+
+
+def downgrade() -> None:
+    op.drop_table('fxrevaluation')
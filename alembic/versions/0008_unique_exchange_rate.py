@@ -0,0 +1,36 @@
+"""one exchange rate per (base, target, timestamp)
+
+Revision ID: 0008_unique_exchange_rate
+Revises: 0007_fx_revaluation
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008_unique_exchange_rate'
+down_revision = '0007_fx_revaluation'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_exchangerate_base_target_timestamp'
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    indexes = {ix['name']: ix for ix in sa.inspect(bind).get_indexes('exchangerate')}
+    if indexes.get(INDEX, {}).get('unique'):
+        return
+    # keep the most recently inserted row of any exact duplicate, as the bulk import's upsert would
+    op.execute(
+        "DELETE FROM exchangerate WHERE id NOT IN ("
+        "SELECT MAX(id) FROM exchangerate GROUP BY base, target, timestamp)"
+    )
+    if INDEX in indexes:
+        op.drop_index(INDEX, table_name='exchangerate')
+    op.create_index(INDEX, 'exchangerate', ['base', 'target', 'timestamp'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX, table_name='exchangerate')
+    op.create_index(INDEX, 'exchangerate', ['base', 'target', 'timestamp'])
@@ -0,0 +1,70 @@
+"""pre-aggregated GSTR-1 summary
+
+Revision ID: 0009_gst_summary
+Revises: 0008_unique_exchange_rate
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009_gst_summary'
+down_revision = '0008_unique_exchange_rate'
+branch_labels = None
+depends_on = None
+
+# same categories as crud._gst_category; grouped per day here and folded into months below, which keeps the
+# SQL portable (no dialect-specific month formatting)
+BACKFILL = """
+SELECT i.date,
+       CASE WHEN i.is_export AND i.lut_applicable THEN 'EXPWOP'
+            WHEN i.is_export THEN 'EXPWP'
+            WHEN COALESCE(i.customer_gstin, '') != '' THEN 'B2B'
+            ELSE 'B2C' END AS category,
+       COALESCE(i.place_of_supply, '') AS pos, i.currency,
+       COUNT(DISTINCT i.id), COALESCE(SUM(l.amount_minor), 0), COALESCE(SUM(l.igst_minor), 0),
+       COALESCE(SUM(l.cgst_minor), 0), COALESCE(SUM(l.sgst_minor), 0)
+FROM invoice i LEFT JOIN invoiceline l ON l.invoice_id = i.id
+GROUP BY i.date, category, pos, i.currency
+"""
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if inspector.has_table('gstsummary'):
+        # 0001 created it from the current models; it only needs the backfill if invoices predate it
+        if bind.execute(sa.text("SELECT COUNT(*) FROM gstsummary")).scalar():
+            return
+    else:
+        op.create_table(
+            'gstsummary',
+            sa.Column('period', sa.String(), primary_key=True),
+            sa.Column('category', sa.String(), primary_key=True),
+            sa.Column('place_of_supply', sa.String(), primary_key=True),
+            sa.Column('currency', sa.String(), primary_key=True),
+            sa.Column('invoice_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('taxable_minor', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('igst_minor', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('cgst_minor', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('sgst_minor', sa.BigInteger(), nullable=False, server_default='0'),
+        )
+    months: dict[tuple, list[int]] = {}
+    for day, category, pos, currency, *values in bind.execute(sa.text(BACKFILL)):
+        period = str(day)[:7]  # YYYY-MM from a date or its ISO string (SQLite)
+        acc = months.setdefault((period, category, pos, currency), [0, 0, 0, 0, 0])
+        for i, v in enumerate(values):
+            acc[i] += int(v or 0)
+    if months:
+        table = sa.table('gstsummary', *[sa.column(c) for c in (
+            'period', 'category', 'place_of_supply', 'currency', 'invoice_count',
+            'taxable_minor', 'igst_minor', 'cgst_minor', 'sgst_minor')])
+        op.bulk_insert(table, [
+            dict(period=k[0], category=k[1], place_of_supply=k[2], currency=k[3], invoice_count=v[0],
+                 taxable_minor=v[1], igst_minor=v[2], cgst_minor=v[3], sgst_minor=v[4])
+            for k, v in months.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table('gstsummary')
@@ -0,0 +1,50 @@
+"""denormalized invoice totals
+
+Revision ID: 0010_invoice_totals
+Revises: 0009_gst_summary
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010_invoice_totals'
+down_revision = '0009_gst_summary'
+branch_labels = None
+depends_on = None
+
+# invoice total column -> invoiceline minor column(s) it sums
+TOTALS = {
+    'taxable_total': ['amount_minor'],
+    'igst_total': ['igst_minor'],
+    'cgst_total': ['cgst_minor'],
+    'sgst_total': ['sgst_minor'],
+    'grand_total': ['amount_minor', 'igst_minor', 'cgst_minor', 'sgst_minor'],
+}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    existing = {c['name'] for c in sa.inspect(bind).get_columns('invoice')}
+    added = [name for name in TOTALS if f'{name}_minor' not in existing]
+    for name in added:
+        op.add_column('invoice', sa.Column(name, sa.Float(), nullable=False, server_default='0'))
+        op.add_column('invoice', sa.Column(f'{name}_minor', sa.BigInteger(), nullable=False, server_default='0'))
+    if not added:
+        return
+    op.execute("UPDATE invoice SET " + ", ".join(
+        f"{name}_minor = (SELECT COALESCE(SUM({' + '.join(cols)}), 0) FROM invoiceline l WHERE l.invoice_id = invoice.id)"
+        for name, cols in TOTALS.items() if name in added
+    ))
+    # major units per currency exponent; literal divisors keep the SQL portable (no POWER on SQLite)
+    for code, exponent in bind.execute(sa.text("SELECT DISTINCT i.currency, COALESCE(c.exponent, 2) FROM invoice i "
+                                               "LEFT JOIN currency c ON c.code = i.currency")).fetchall():
+        op.execute(sa.text("UPDATE invoice SET " + ", ".join(f"{name} = {name}_minor / {10 ** exponent}.0" for name in added)
+                           + " WHERE currency = :code").bindparams(code=code))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('invoice') as batch:
+        for name in TOTALS:
+            batch.drop_column(f'{name}_minor')
+            batch.drop_column(name)
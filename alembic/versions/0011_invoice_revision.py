@@ -0,0 +1,24 @@
+"""invoice revision for cached e-invoice payloads
+
+Revision ID: 0011_invoice_revision
+Revises: 0010_invoice_totals
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011_invoice_revision'
+down_revision = '0010_invoice_totals'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if 'revision' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('invoice')}:
+        op.add_column('invoice', sa.Column('revision', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('invoice') as batch:
+        batch.drop_column('revision')
@@ -0,0 +1,37 @@
+"""indexes for invoice listing and search
+
+Revision ID: 0012_invoice_list_indexes
+Revises: 0011_invoice_revision
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0012_invoice_list_indexes'
+down_revision = '0011_invoice_revision'
+branch_labels = None
+depends_on = None
+
+# (index name, columns) -- names match what models.Invoice declares, so create_all and this agree
+INDEXES = [
+    ('ix_invoice_date_id', ['date', 'id']),
+    ('ix_invoice_customer_gstin_date_id', ['customer_gstin', 'date', 'id']),
+    ('ix_invoice_einvoice_status_date_id', ['einvoice_status', 'date', 'id']),
+]
+
+
+def upgrade() -> None:
+    # 0001 runs create_all against the current models, so on a fresh database the indexes already exist
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('invoice')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'invoice', columns)
+    # expression indexes aren't reported by every dialect's inspector, so rely on IF NOT EXISTS (SQLite, Postgres)
+    op.execute('CREATE INDEX IF NOT EXISTS ix_invoice_customer_name_lower ON invoice (lower(customer_name))')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_invoice_customer_name_lower', table_name='invoice')
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='invoice')
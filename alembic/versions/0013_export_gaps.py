@@ -0,0 +1,24 @@
+"""export watermark gaps for ids committed out of order
+
+Revision ID: 0013_export_gaps
+Revises: 0012_invoice_list_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0013_export_gaps'
+down_revision = '0012_invoice_list_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if 'gaps' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('exportwatermark')}:
+        op.add_column('exportwatermark', sa.Column('gaps', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('exportwatermark') as batch:
+        batch.drop_column('gaps')
@@ -8,14 +8,46 @@ class Settings:
         # Leave sandbox unset by default so local demos use the simulated GSTN
         self.GSP_SANDBOX_URL: Optional[str] = os.getenv('GSP_SANDBOX_URL')
         self.GSP_CLIENT_ID: Optional[str] = os.getenv('GSP_CLIENT_ID')
-        self.GSP_PRIVATE_KEY_PATH: Optional[str] = os.getenv('GSP_PRIVATE_KEY_PATH')
-        self.GSP_PUBLIC_KEY_PATH: Optional[str] = os.getenv('GSP_PUBLIC_KEY_PATH')
+        # GSP_*_PEM_PATH are the names the submit_to_gsp endpoint used to read
+        self.GSP_PRIVATE_KEY_PATH: Optional[str] = os.getenv('GSP_PRIVATE_KEY_PATH') or os.getenv('GSP_PRIVATE_PEM_PATH')
+        self.GSP_PUBLIC_KEY_PATH: Optional[str] = os.getenv('GSP_PUBLIC_KEY_PATH') or os.getenv('GSP_PUBLIC_PEM_PATH')
         self.GSP_TIMEOUT: int = int(os.getenv('GSP_TIMEOUT', '10'))
         self.GSP_RETRIES: int = int(os.getenv('GSP_RETRIES', '3'))
         self.GSP_BACKOFF_FACTOR: float = float(os.getenv('GSP_BACKOFF_FACTOR', '1.5'))
+        # Overall time budget (seconds) of one async GSP submission, retries and backoff included
+        self.GSP_DEADLINE: float = float(os.getenv('GSP_DEADLINE', '30'))
+        # Keep-alive connections pooled per GSP host by the shared client
+        self.GSP_POOL_SIZE: int = int(os.getenv('GSP_POOL_SIZE', '16'))
+        # Circuit breaker: open after this many consecutive GSP failures, probe again after the reset period
+        self.GSP_BREAKER_FAILURES: int = int(os.getenv('GSP_BREAKER_FAILURES', '5'))
+        self.GSP_BREAKER_RESET_SECONDS: float = float(os.getenv('GSP_BREAKER_RESET_SECONDS', '30'))
+        # Adaptive (AIMD) concurrency limit between 1 and GSP_POOL_SIZE: calls slower than this count as congestion
+        self.GSP_LATENCY_TARGET_MS: float = float(os.getenv('GSP_LATENCY_TARGET_MS', '2000'))
+        # How long a call may queue for a free slot before failing
+        self.GSP_QUEUE_TIMEOUT: float = float(os.getenv('GSP_QUEUE_TIMEOUT', '5'))
+        # Concurrent GSP round trips per batch submission (POST /einvoice/submit_batch, scripts/submit_einvoices.py)
+        self.GSP_SUBMIT_CONCURRENCY: int = int(os.getenv('GSP_SUBMIT_CONCURRENCY', '8'))
+        # Processes that sign payload batches in parallel (0: one per CPU core) and payloads sent to a worker at a time
+        self.GSP_SIGNING_WORKERS: int = int(os.getenv('GSP_SIGNING_WORKERS', '0'))
+        self.GSP_SIGNING_CHUNK: int = int(os.getenv('GSP_SIGNING_CHUNK', '64'))
         # Optional Redis URL for background queue (RQ). If unset, tasks run synchronously.
         self.REDIS_URL: Optional[str] = os.getenv('REDIS_URL')
         self.GSP_QUEUE_NAME: Optional[str] = os.getenv('GSP_QUEUE_NAME', 'gsp')
+        # With REDIS_URL set, new exchange rates are broadcast here so every replica's FX cache stays current
+        self.FX_RATES_CHANNEL: str = os.getenv('FX_RATES_CHANNEL', 'fx-rates')
+        # Currencies used, in order, to triangulate cross rates when a pair has no direct or inverse rate
+        self.FX_PIVOT_CURRENCIES: list[str] = [c.strip().upper() for c in os.getenv('FX_PIVOT_CURRENCIES', 'USD,INR').split(',') if c.strip()]
+        # Reporting currency for FX revaluation of foreign-currency accounts and invoices
+        self.FUNCTIONAL_CURRENCY: str = os.getenv('FUNCTIONAL_CURRENCY', 'INR').upper()
+        # Group commit for POST /journals: coalesce concurrent posts arriving within this window (ms). 0 disables.
+        self.JOURNAL_GROUP_COMMIT_MS: float = float(os.getenv('JOURNAL_GROUP_COMMIT_MS', '0'))
+        self.JOURNAL_GROUP_COMMIT_MAX: int = int(os.getenv('JOURNAL_GROUP_COMMIT_MAX', '500'))
+        # Seconds a POST /journals waits for its group commit before giving up with 503
+        self.JOURNAL_GROUP_COMMIT_TIMEOUT: float = float(os.getenv('JOURNAL_GROUP_COMMIT_TIMEOUT', '30'))
+        # Canonical e-invoice payloads (bytes, ETag, signatures) kept in memory per process (see app.einvoice)
+        self.EINVOICE_PAYLOAD_CACHE_SIZE: int = int(os.getenv('EINVOICE_PAYLOAD_CACHE_SIZE', '10000'))
+        # Keep an in-process NumPy copy of the ledger for /dashboard reports
+        self.LEDGER_CACHE_ENABLED: bool = os.getenv('LEDGER_CACHE_ENABLED', '').lower() in ('1', 'true', 'yes')
 
 
 _settings: Optional[Settings] = None
@@ -1,6 +1,8 @@
 from sqlmodel import Session, select
-from typing import Optional
-from . import models
+from sqlalchemy import func, update, delete, insert, case, and_, or_, bindparam
+from sqlalchemy.exc import IntegrityError
+from typing import Iterable, Optional
+from . import models, money, ledger_cache, fx
 import datetime
 
 def create_currency(session: Session, currency: models.Currency):
@@ -13,50 +15,352 @@ def create_exchange_rate(session: Session, rate: models.ExchangeRate):
     session.add(rate)
     session.commit()
     session.refresh(rate)
+    fx.notify_rate_added(rate)
     return rate
 
-def create_account(session: Session, account: models.Account):
+def _add_account(session: Session, account: models.Account) -> models.Account:
+    """Add `account` with its zero `AccountBalance` row; the caller commits."""
     session.add(account)
+    session.flush()
+    session.add(models.AccountBalance(account_id=account.id))
+    session.flush()
+    return account
+
+
+def create_account(session: Session, account: models.Account):
+    _add_account(session, account)
     session.commit()
     session.refresh(account)
     return account
 
-def create_journal(session: Session, journal: models.JournalEntry, lines: list[models.LedgerEntry]):
-    total_debit = sum(l.debit for l in lines)
-    total_credit = sum(l.credit for l in lines)
-    if round(total_debit, 2) != round(total_credit, 2):
-        raise ValueError("Journal not balanced: debits must equal credits")
-    session.add(journal)
-    session.commit()
+
+def _upsert_increments(session: Session, table, keys: tuple[str, ...], amounts: tuple[str, ...], rows: list[dict]) -> None:
+    """Add the `amounts` of each row to the `table` row with the same `keys`, inserting rows that don't exist.
+
+    Uses an atomic `INSERT ... ON CONFLICT DO UPDATE` on PostgreSQL and SQLite, so two transactions creating the
+    same row don't race into a primary-key conflict; other dialects update, then insert in a savepoint. Pass rows
+    sorted by key so concurrent transactions lock rows in the same order. Does not commit.
+    """
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys),
+                                          set_={c: getattr(table, c) + getattr(stmt.excluded, c) for c in amounts})
+        session.execute(stmt, rows)
+        return
+    for row in rows:
+        match = [getattr(table, k) == row[k] for k in keys]
+        add = update(table).where(*match).values({c: getattr(table, c) + row[c] for c in amounts}).execution_options(synchronize_session=False)
+        if session.execute(add).rowcount:
+            continue
+        try:
+            with session.begin_nested():
+                session.execute(insert(table), [row])
+        except IntegrityError:
+            # another transaction created the row first
+            session.execute(add)
+
+
+def _apply_balance_deltas(session: Session, entries: Iterable[tuple[int, datetime.date, int, int]]) -> None:
+    """Add `(account_id, date, debit_minor, credit_minor)` movements to the running and daily balance tables.
+
+    Movements are summed per account and per account/day first, then upserted with `_upsert_increments`, so
+    concurrent posts neither overwrite each other nor race to create the first daily row of an account. Does not
+    commit.
+    """
+    totals: dict[int, list[int]] = {}
+    daily: dict[tuple[int, datetime.date], list[int]] = {}
+    for account_id, date, debit, credit in entries:
+        t = totals.setdefault(account_id, [0, 0])
+        t[0] += debit
+        t[1] += credit
+        d = daily.setdefault((account_id, date), [0, 0])
+        d[0] += debit
+        d[1] += credit
+    amounts = ('debit_minor', 'credit_minor')
+    _upsert_increments(session, models.AccountBalance, ('account_id',), amounts,
+                       [{"account_id": a, "debit_minor": d, "credit_minor": c} for a, (d, c) in sorted(totals.items())])
+    _upsert_increments(session, models.AccountDailyBalance, ('account_id', 'date'), amounts,
+                       [{"account_id": a, "date": day, "debit_minor": d, "credit_minor": c}
+                        for (a, day), (d, c) in sorted(daily.items())])
+
+
+def _post_ledger_lines(session: Session, journal: models.JournalEntry, lines: list[models.LedgerEntry]) -> None:
+    """Attach `lines` (minor amounts already filled) to a flushed journal and update balances; the caller commits."""
     for l in lines:
         l.journal_id = journal.id
         session.add(l)
+    session.flush()
+    _apply_balance_deltas(session, ((l.account_id, journal.date, l.debit_minor, l.credit_minor) for l in lines))
+
+
+def _fill_ledger_minor(lines, exponents: Optional[dict[int, int]] = None) -> None:
+    """Set `debit_minor`/`credit_minor` from the float amounts, using each account's currency exponent.
+
+    The float fields are left as entered, so filling again with the right exponents never starts from an amount
+    already rounded to a coarser one.
+    """
+    exponents = exponents or {}
+    for l in lines:
+        exp = exponents.get(l.account_id, money.DEFAULT_EXPONENT)
+        l.debit_minor = money.to_minor(l.debit, exp)
+        l.credit_minor = money.to_minor(l.credit, exp)
+
+
+def _check_balanced(lines, exponents: Optional[dict[int, int]] = None) -> None:
+    """Fill minor-unit amounts and require debits to equal credits exactly."""
+    _fill_ledger_minor(lines, exponents)
+    if sum(l.debit_minor for l in lines) != sum(l.credit_minor for l in lines):
+        raise ValueError("Journal not balanced: debits must equal credits")
+
+
+def _latest_closed_period(session: Session, on_or_before: Optional[datetime.date] = None) -> Optional[models.FiscalPeriod]:
+    q = select(models.FiscalPeriod)
+    if on_or_before:
+        q = q.where(models.FiscalPeriod.end_date <= on_or_before)
+    return session.exec(q.order_by(models.FiscalPeriod.end_date.desc())).first()
+
+
+def _check_period_open(session: Session, date: datetime.date) -> None:
+    closed = _latest_closed_period(session)
+    if closed and date <= closed.end_date:
+        raise ValueError(f"Period closed: cannot post journals dated on or before {closed.end_date}")
+
+
+def create_journal(session: Session, journal: models.JournalEntry, lines: list[models.LedgerEntry]):
+    _check_balanced(lines, money.account_exponents(session, (l.account_id for l in lines)))
+    if journal.date is None:
+        journal.date = datetime.date.today()
+    _check_period_open(session, journal.date)
+    session.add(journal)
+    session.flush()
+    _post_ledger_lines(session, journal, lines)
+    posted = [(l.id, l.account_id, journal.date, l.debit_minor, l.credit_minor) for l in lines]
     session.commit()
+    ledger_cache.notify_posted(posted)
     return journal
 
+
+def bulk_create_journals(session: Session, journals: list[tuple[models.JournalEntry, list[models.LedgerEntry]]]) -> list[models.JournalEntry]:
+    """Post a batch of journals in one transaction.
+
+    Headers are flushed together to obtain ids, ledger lines go in as a single executemany insert and balance
+    tables are updated once per account/day for the whole batch. Raises ValueError (and posts nothing) if any
+    journal is unbalanced or dated inside a closed period.
+    """
+    if not journals:
+        return []
+    closed = _latest_closed_period(session)
+    exponents = money.account_exponents(session, (l.account_id for _, lines in journals for l in lines))
+    for journal, lines in journals:
+        _check_balanced(lines, exponents)
+        if journal.date is None:
+            journal.date = datetime.date.today()
+        if closed and journal.date <= closed.end_date:
+            raise ValueError(f"Period closed: cannot post journals dated on or before {closed.end_date}")
+    session.add_all([journal for journal, _ in journals])
+    session.flush()
+    rows = []
+    for journal, lines in journals:
+        for l in lines:
+            rows.append({
+                "journal_id": journal.id, "account_id": l.account_id, "debit": l.debit, "credit": l.credit,
+                "debit_minor": l.debit_minor, "credit_minor": l.credit_minor,
+            })
+    session.execute(insert(models.LedgerEntry), rows)
+    _apply_balance_deltas(session, ((l.account_id, journal.date, l.debit_minor, l.credit_minor) for journal, lines in journals for l in lines))
+    session.commit()
+    if ledger_cache.is_active():
+        # the executemany insert doesn't return ids, so read the committed lines back for the post hook
+        dates = {journal.id: journal.date for journal, _ in journals}
+        q = (
+            select(models.LedgerEntry.id, models.LedgerEntry.journal_id, models.LedgerEntry.account_id,
+                   models.LedgerEntry.debit_minor, models.LedgerEntry.credit_minor)
+            .where(models.LedgerEntry.journal_id.between(min(dates), max(dates)))
+        )
+        ledger_cache.notify_posted([(i, acc, dates[j], d, c) for i, j, acc, d, c in session.exec(q).all() if j in dates])
+    return [journal for journal, _ in journals]
+
 def get_latest_rate(session: Session, base: str, target: str):
     q = select(models.ExchangeRate).where(models.ExchangeRate.base == base, models.ExchangeRate.target == target).order_by(models.ExchangeRate.timestamp.desc())
     return session.exec(q).first()
 
 
-def create_invoice(session: Session, invoice: models.Invoice, lines: list[models.InvoiceLine]):
-    session.add(invoice)
-    session.commit()
+def _fill_invoice_line_minor(lines: list[models.InvoiceLine], exponent: int) -> None:
     for l in lines:
-        l.invoice_id = invoice.id
-        session.add(l)
-    session.commit()
+        l.amount_minor = money.to_minor(l.amount, exponent)
+        l.igst_minor = money.to_minor(l.igst, exponent)
+        l.cgst_minor = money.to_minor(l.cgst, exponent)
+        l.sgst_minor = money.to_minor(l.sgst, exponent)
+
+
+def _is_duplicate_invoice_number(e: IntegrityError) -> bool:
+    """True when `e` violates the unique invoice number (and not e.g. a foreign key or another unique index)."""
+    constraint = getattr(getattr(e.orig, 'diag', None), 'constraint_name', None)  # psycopg2
+    if constraint:
+        return constraint == 'ix_invoice_invoice_number'
+    message = str(e.orig)
+    return 'invoice.invoice_number' in message or 'ix_invoice_invoice_number' in message
+
+
+def create_invoice(session: Session, invoice: models.Invoice, lines: list[models.InvoiceLine]):
+    exponent = money.currency_exponent(session, invoice.currency)
+    _fill_invoice_line_minor(lines, exponent)
+    _fill_invoice_totals(invoice, lines, exponent)
+    if invoice.date is None:
+        invoice.date = datetime.date.today()
+    try:
+        session.add(invoice)
+        session.flush()
+        for l in lines:
+            l.invoice_id = invoice.id
+            session.add(l)
+        _apply_gst_deltas(session, [(_gst_key(invoice), 1, _invoice_tax_totals(invoice))])
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        if _is_duplicate_invoice_number(e):
+            raise ValueError(f"Invoice number already exists: {invoice.invoice_number}")
+        raise
     session.refresh(invoice)
     return invoice
 
 
+def bulk_create_invoices(session: Session, invoices: list[tuple[models.Invoice, list[models.InvoiceLine]]]) -> list[int]:
+    """Create many invoices in one transaction and return their ids in input order.
+
+    Headers and lines are inserted with one executemany each instead of an ORM flush per invoice; ids are read
+    back by the (unique) invoice number. GST summary deltas are applied once for the batch.
+    """
+    if not invoices:
+        return []
+    numbers = [inv.invoice_number for inv, _ in invoices]
+    if len(set(numbers)) != len(numbers):
+        raise ValueError("Duplicate invoice numbers in batch")
+    codes = {inv.currency for inv, _ in invoices}
+    known = dict(session.exec(select(models.Currency.code, models.Currency.exponent).where(models.Currency.code.in_(codes))).all())
+    computed = {'id', *TOTAL_FIELDS, *(f'{name}_minor' for name in TOTAL_FIELDS)}
+    header_cols = [c.name for c in models.Invoice.__table__.columns if c.name not in computed]
+    line_cols = ('description', 'quantity', 'unit_rate', 'amount', 'igst', 'cgst', 'sgst')
+    # minor amounts and totals are computed into the row dicts directly; setting them on the (pydantic-backed)
+    # model instances would cost more than the inserts themselves
+    headers, line_rows, deltas = [], [], []
+    for inv, lines in invoices:
+        exponent = known.get(inv.currency)
+        exponent = money.DEFAULT_EXPONENT if exponent is None else exponent
+        if inv.date is None:
+            inv.date = datetime.date.today()
+        header = {c: getattr(inv, c) for c in header_cols}
+        rows = []
+        for l in lines:
+            row = {c: getattr(l, c) for c in line_cols}
+            for c in ('amount', 'igst', 'cgst', 'sgst'):
+                row[f'{c}_minor'] = money.to_minor(row[c], exponent)
+            rows.append(row)
+        totals = tuple(sum(r[f'{c}_minor'] for r in rows) for c in ('amount', 'igst', 'cgst', 'sgst'))
+        for name, value in zip(TOTAL_FIELDS, (*totals, sum(totals))):
+            header[f'{name}_minor'] = value
+            header[name] = money.from_minor(value, exponent)
+        headers.append(header)
+        line_rows.append(rows)
+        deltas.append((_gst_key(inv), 1, totals))
+    try:
+        session.execute(insert(models.Invoice), headers)
+        ids = dict(session.exec(select(models.Invoice.invoice_number, models.Invoice.id).where(models.Invoice.invoice_number.in_(numbers))).all())
+        rows = [dict(row, invoice_id=ids[number]) for number, lines in zip(numbers, line_rows) for row in lines]
+        if rows:
+            session.execute(insert(models.InvoiceLine), rows)
+        _apply_gst_deltas(session, deltas)
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        if _is_duplicate_invoice_number(e):
+            raise ValueError("Invoice number already exists in batch")
+        raise
+    return [ids[n] for n in numbers]
+
+
+def apply_lut(session: Session, invoice_id: int, lut_ref: str) -> models.Invoice:
+    """Mark an invoice as LUT-applied (export concession), moving it to the EXPWOP GST category if exported."""
+    inv = session.get(models.Invoice, invoice_id)
+    if not inv:
+        raise ValueError("Invoice not found")
+    old_key = _gst_key(inv)
+    inv.lut_applicable = True
+    # store LUT reference in einvoice_status temporarily (demo). In production add a dedicated field.
+    inv.einvoice_status = f"LUT:{lut_ref}"
+    inv.revision += 1
+    new_key = _gst_key(inv)
+    if new_key != old_key:
+        totals = _invoice_tax_totals(inv)
+        _apply_gst_deltas(session, [(old_key, -1, tuple(-t for t in totals)), (new_key, 1, totals)])
+    session.add(inv)
+    session.commit()
+    session.refresh(inv)
+    return inv
+
+
+TOTAL_FIELDS = ('taxable_total', 'igst_total', 'cgst_total', 'sgst_total', 'grand_total')
+
+
+def _fill_invoice_totals(invoice: models.Invoice, lines: list[models.InvoiceLine], exponent: int) -> None:
+    """Store the line totals on the invoice so readers that only need totals don't reload its lines."""
+    invoice.taxable_total_minor = sum(l.amount_minor for l in lines)
+    invoice.igst_total_minor = sum(l.igst_minor for l in lines)
+    invoice.cgst_total_minor = sum(l.cgst_minor for l in lines)
+    invoice.sgst_total_minor = sum(l.sgst_minor for l in lines)
+    invoice.grand_total_minor = (invoice.taxable_total_minor + invoice.igst_total_minor
+                                 + invoice.cgst_total_minor + invoice.sgst_total_minor)
+    for name in TOTAL_FIELDS:
+        setattr(invoice, name, money.from_minor(getattr(invoice, f'{name}_minor'), exponent))
+
+
+def _gst_key(inv: models.Invoice) -> tuple[str, str, str, str]:
+    """(period, category, place_of_supply, currency) of an invoice's `GSTSummary` row; mirrors `_gst_category`."""
+    if inv.is_export:
+        category = 'EXPWOP' if inv.lut_applicable else 'EXPWP'
+    else:
+        category = 'B2B' if inv.customer_gstin else 'B2C'
+    return inv.date.strftime('%Y-%m'), category, inv.place_of_supply or '', inv.currency
+
+
+def _invoice_tax_totals(inv: models.Invoice) -> tuple[int, int, int, int]:
+    """(taxable, igst, cgst, sgst) in minor units."""
+    return inv.taxable_total_minor, inv.igst_total_minor, inv.cgst_total_minor, inv.sgst_total_minor
+
+
+def _apply_gst_deltas(session: Session, deltas: Iterable[tuple[tuple[str, str, str, str], int, tuple[int, int, int, int]]]) -> None:
+    """Add (key, invoice count, (taxable, igst, cgst, sgst)) deltas to `GSTSummary`, creating missing rows.
+
+    Rows are upserted atomically, so two transactions creating the first invoices of the same key don't race
+    each other into a primary-key conflict. Keys are applied in sorted order so concurrent batches lock rows in
+    the same order.
+    """
+    agg: dict[tuple[str, str, str, str], list[int]] = {}
+    for key, count, totals in deltas:
+        acc = agg.setdefault(key, [0, 0, 0, 0, 0])
+        for i, v in enumerate((count, *totals)):
+            acc[i] += v
+    if not agg:
+        return
+    amounts = ('invoice_count', 'taxable_minor', 'igst_minor', 'cgst_minor', 'sgst_minor')
+    keys = ('period', 'category', 'place_of_supply', 'currency')
+    rows = [dict(zip(keys, key), **dict(zip(amounts, values))) for key, values in sorted(agg.items())]
+    _upsert_increments(session, models.GSTSummary, keys, amounts, rows)
+
+
 def build_einvoice_payload(session: Session, invoice_id: int) -> dict:
     inv = session.get(models.Invoice, invoice_id)
     if not inv:
         raise ValueError("Invoice not found")
     q = select(models.InvoiceLine).where(models.InvoiceLine.invoice_id == inv.id)
     lines = session.exec(q).all()
-    total = sum(l.amount for l in lines)
     payload = {
         "supplier_name": None,
         "supplier_gstin": None,
@@ -69,7 +373,7 @@ def build_einvoice_payload(session: Session, invoice_id: int) -> dict:
         "lut_applicable": bool(inv.lut_applicable),
         "iec": inv.iec,
         "currency": inv.currency,
-        "total_amount": total,
+        "total_amount": inv.taxable_total,
         "lines": [
             {"description": l.description, "quantity": l.quantity, "unit_rate": l.unit_rate, "amount": l.amount, "igst": l.igst, "cgst": l.cgst, "sgst": l.sgst}
             for l in lines
@@ -91,6 +395,9 @@ def mark_einvoice_submitted(session: Session, invoice_id: int, irn: str, status:
 
 
 def create_tds_deduction(session: Session, tds: models.TDSDeduction):
+    # TDS is deducted in INR
+    tds.amount_minor = money.to_minor(tds.amount)
+    tds.tds_amount_minor = money.to_minor(tds.tds_amount)
     session.add(tds)
     session.commit()
     session.refresh(tds)
@@ -112,6 +419,32 @@ def record_einvoice_audit(session: Session, invoice_id: int, event: str, details
     return audit
 
 
+def record_einvoice_submissions(session: Session, assigned: list[tuple[int, str, str]], audits: list[tuple[int, str, Optional[str]]]) -> None:
+    """Record many GSP outcomes in one transaction: (invoice_id, irn, status) updates and (invoice_id, event, details) audits."""
+    if assigned:
+        t = models.Invoice.__table__
+        session.execute(
+            t.update().where(t.c.id == bindparam('_id')).values(einvoice_irn=bindparam('_irn'), einvoice_status=bindparam('_status')),
+            [{"_id": invoice_id, "_irn": irn, "_status": status} for invoice_id, irn, status in assigned],
+        )
+    if audits:
+        now = datetime.datetime.utcnow()
+        session.execute(insert(models.EInvoiceAudit), [
+            {"invoice_id": invoice_id, "event": event, "details": details, "timestamp": now} for invoice_id, event, details in audits
+        ])
+    session.commit()
+
+
+def unsubmitted_invoice_ids(session: Session, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> list[int]:
+    """Ids of invoices without an IRN, optionally within a date range, oldest first."""
+    q = select(models.Invoice.id).where(models.Invoice.einvoice_irn.is_(None))
+    if start:
+        q = q.where(models.Invoice.date >= start)
+    if end:
+        q = q.where(models.Invoice.date <= end)
+    return list(session.exec(q.order_by(models.Invoice.date, models.Invoice.id)).all())
+
+
 def list_einvoice_audit(session: Session, invoice_id: int, limit: int = 10):
     q = select(models.EInvoiceAudit).where(models.EInvoiceAudit.invoice_id == invoice_id).order_by(models.EInvoiceAudit.timestamp.desc()).limit(limit)
     return session.exec(q).all()
@@ -152,6 +485,85 @@ def update_einvoice_status_by_irn(session: Session, irn: str, status: str) -> mo
     return inv
 
 
+def _prefix_range(column, prefix: str):
+    """`column` starts with `prefix`, as a range predicate that a plain B-tree index can serve (unlike LIKE)."""
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def _encode_invoice_cursor(date: datetime.date, invoice_id: int) -> str:
+    return f"{date.isoformat()}_{invoice_id}"
+
+
+def _decode_invoice_cursor(cursor: str) -> tuple[datetime.date, int]:
+    try:
+        date, invoice_id = cursor.split('_')
+        return datetime.date.fromisoformat(date), int(invoice_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def list_invoices(session: Session, cursor: Optional[str] = None, limit: int = 100,
+                  start: Optional[datetime.date] = None, end: Optional[datetime.date] = None,
+                  customer_gstin: Optional[str] = None, einvoice_status: Optional[str] = None,
+                  is_export: Optional[bool] = None, currency: Optional[str] = None, q: Optional[str] = None,
+                  include_totals: bool = False) -> dict:
+    """One page of invoices, newest (date, id) first.
+
+    Pages are keyset-paginated on (date, id): `next_cursor` encodes the last row, so page N costs the same as
+    page 1. `q` matches an invoice number prefix or a case-insensitive customer name prefix. Totals come from the
+    stored invoice totals, plus one grouped line count per page, so `include_totals` adds no per-invoice queries.
+    """
+    inv = models.Invoice
+    query = select(inv.id, inv.invoice_number, inv.date, inv.customer_name, inv.customer_gstin, inv.currency,
+                   inv.is_export, inv.einvoice_irn, inv.einvoice_status,
+                   *(getattr(inv, f'{name}_minor') for name in TOTAL_FIELDS))
+    if start:
+        query = query.where(inv.date >= start)
+    if end:
+        query = query.where(inv.date <= end)
+    if customer_gstin:
+        query = query.where(inv.customer_gstin == customer_gstin)
+    if einvoice_status:
+        query = query.where(inv.einvoice_status == einvoice_status)
+    if is_export is not None:
+        query = query.where(inv.is_export == is_export)
+    if currency:
+        query = query.where(inv.currency == currency)
+    if q:
+        query = query.where(or_(_prefix_range(inv.invoice_number, q), _prefix_range(func.lower(inv.customer_name), q.lower())))
+    if cursor:
+        after_date, after_id = _decode_invoice_cursor(cursor)
+        # the leading `date <=` conjunct lets the planner seek into the (date, id) index instead of walking it
+        query = query.where(inv.date <= after_date, (inv.date < after_date) | (inv.id < after_id))
+    fetched = session.exec(query.order_by(inv.date.desc(), inv.id.desc()).limit(limit + 1)).all()
+    page = fetched[:limit]
+    line_counts = {}
+    if include_totals and page:
+        line_counts = dict(session.exec(
+            select(models.InvoiceLine.invoice_id, func.count(models.InvoiceLine.id))
+            .where(models.InvoiceLine.invoice_id.in_([r[0] for r in page]))
+            .group_by(models.InvoiceLine.invoice_id)
+        ).all())
+    exponents = {}
+    rows = []
+    for invoice_id, number, date, name, gstin, code, export, irn, status, *totals in page:
+        row = {
+            "id": invoice_id, "invoice_number": number, "date": str(date), "customer_name": name,
+            "customer_gstin": gstin, "currency": code, "is_export": export, "einvoice_irn": irn, "einvoice_status": status,
+        }
+        if include_totals:
+            if code not in exponents:
+                exponents[code] = money.currency_exponent(session, code)
+            for field, value in zip(TOTAL_FIELDS, totals):
+                row[field] = money.from_minor(value, exponents[code])
+            row["line_count"] = line_counts.get(invoice_id, 0)
+        rows.append(row)
+    next_cursor = None
+    if len(fetched) > limit:
+        next_cursor = _encode_invoice_cursor(page[-1][2], page[-1][0])
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
 def check_and_store_nonce(session: Session, nonce: str, ts: Optional[str]) -> bool:
     """Return True if nonce stored successfully; raise ValueError if nonce exists or invalid timestamp."""
     if not nonce:
@@ -175,7 +587,12 @@ def check_and_store_nonce(session: Session, nonce: str, ts: Optional[str]) -> bo
     # store
     wn = models.WebhookNonce(nonce=nonce)
     session.add(wn)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        # a concurrent delivery stored the same nonce between the check and the insert
+        session.rollback()
+        raise ValueError("Nonce already used")
     session.refresh(wn)
     return True
 
@@ -185,14 +602,18 @@ def create_fx_realization(session: Session, invoice_id: int, payment_amount: flo
     inv = session.get(models.Invoice, invoice_id)
     if not inv:
         raise ValueError("Invoice not found")
-    # sum invoice lines
-    q = select(models.InvoiceLine).where(models.InvoiceLine.invoice_id == inv.id)
-    lines = session.exec(q).all()
-    invoice_total = sum(l.amount for l in lines)
+    # the realization row, the FX account and the journal are written in one transaction, after this check
+    journal = models.JournalEntry(narration=f'FX realization for invoice {inv.invoice_number}')
+    _check_period_open(session, journal.date)
+    realized_exp = money.currency_exponent(session, realized_in_currency)
+    invoice_total_minor = inv.taxable_total_minor
+    invoice_total = inv.taxable_total
     # convert invoice_total from invoice.currency -> realized_in_currency
     converted = _convert_amount(session, invoice_total, inv.currency, realized_in_currency)
-    # realized difference = payment_amount - converted
-    gain_loss = payment_amount - converted
+    # realized difference = payment_amount - converted, rounded to the realized currency's minor unit
+    payment_minor = money.to_minor(payment_amount, realized_exp)
+    gain_loss_minor = payment_minor - money.to_minor(converted, realized_exp)
+    gain_loss = money.from_minor(gain_loss_minor, realized_exp)
     fx = models.FXRealization(
         invoice_id=inv.id,
         base_currency=inv.currency,
@@ -200,21 +621,17 @@ def create_fx_realization(session: Session, invoice_id: int, payment_amount: flo
         original_amount=invoice_total,
         realized_amount=payment_amount,
         gain_loss=gain_loss,
+        original_amount_minor=invoice_total_minor,
+        realized_amount_minor=payment_minor,
+        gain_loss_minor=gain_loss_minor,
     )
     session.add(fx)
-    session.commit()
-    session.refresh(fx)
     # create automatic journal lines: post gain/loss to a FX Gain/Loss account placeholder
     # find or create FX gain account
     qacc = select(models.Account).where(models.Account.name == 'FX Gain/Loss')
     acct = session.exec(qacc).first()
     if not acct:
-        acct = models.Account(name='FX Gain/Loss', type='expense', currency=realized_in_currency)
-        session.add(acct)
-        session.commit()
-        session.refresh(acct)
-    # Post journal
-    journal = models.JournalEntry(narration=f'FX realization for invoice {inv.invoice_number}')
+        acct = _add_account(session, models.Account(name='FX Gain/Loss', type='expense', currency=realized_in_currency))
     # If gain_loss >0 -> credit gain (revenue) else debit loss (expense). We'll simplify: treat positive as revenue (credit)
     if gain_loss > 0:
         lines = [
@@ -227,62 +644,207 @@ def create_fx_realization(session: Session, invoice_id: int, payment_amount: flo
             models.LedgerEntry(account_id=acct.id, debit=abs(gain_loss), credit=0.0),
             models.LedgerEntry(account_id=acct.id, debit=0.0, credit=0.0),
         ]
+    _fill_ledger_minor(lines, {acct.id: money.currency_exponent(session, acct.currency)})
     session.add(journal)
+    session.flush()
+    _post_ledger_lines(session, journal, lines)
+    posted = [(l.id, l.account_id, journal.date, l.debit_minor, l.credit_minor) for l in lines]
     session.commit()
-    for l in lines:
-        l.journal_id = journal.id
-        session.add(l)
-    session.commit()
+    session.refresh(fx)
+    ledger_cache.notify_posted(posted)
     return fx
 
 
+GST_CATEGORIES = ('B2B', 'B2C', 'EXPWP', 'EXPWOP')
+
+
+def _gst_category():
+    """SQL expression for an invoice's GSTR-1 supply category.
+
+    Exports are EXPWOP under a LUT (no tax paid) or EXPWP otherwise; other invoices are B2B when the customer
+    has a GSTIN, else B2C.
+    """
+    return case(
+        (and_(models.Invoice.is_export, models.Invoice.lut_applicable), 'EXPWOP'),
+        (models.Invoice.is_export, 'EXPWP'),
+        (func.coalesce(models.Invoice.customer_gstin, '') != '', 'B2B'),
+        else_='B2C',
+    )
+
+
+def _gstr1_live_rows(session: Session, ranges: list[tuple[datetime.date, datetime.date]]):
+    """(category, place_of_supply, exponent, invoice_count, taxable, igst, cgst, sgst) aggregated from invoices."""
+    category = _gst_category().label('category')
+    exponent = func.coalesce(models.Currency.exponent, money.DEFAULT_EXPONENT)
+    q = (
+        select(
+            category,
+            models.Invoice.place_of_supply,
+            exponent,
+            func.count(models.Invoice.id),
+            func.sum(models.Invoice.taxable_total_minor),
+            func.sum(models.Invoice.igst_total_minor),
+            func.sum(models.Invoice.cgst_total_minor),
+            func.sum(models.Invoice.sgst_total_minor),
+        )
+        .select_from(models.Invoice)
+        .outerjoin(models.Currency, models.Currency.code == models.Invoice.currency)
+        .where(or_(*[and_(models.Invoice.date >= lo, models.Invoice.date <= hi) for lo, hi in ranges]))
+        .group_by(category, models.Invoice.place_of_supply, exponent)
+    )
+    return session.exec(q).all()
+
+
+def _gstr1_summary_rows(session: Session, periods: list[str]):
+    """Same shape as `_gstr1_live_rows`, read from the pre-aggregated `GSTSummary` rows of whole months."""
+    t = models.GSTSummary
+    exponent = func.coalesce(models.Currency.exponent, money.DEFAULT_EXPONENT)
+    q = (
+        select(t.category, t.place_of_supply, exponent, func.sum(t.invoice_count), func.sum(t.taxable_minor),
+               func.sum(t.igst_minor), func.sum(t.cgst_minor), func.sum(t.sgst_minor))
+        .outerjoin(models.Currency, models.Currency.code == t.currency)
+        .where(t.period.in_(periods), t.invoice_count != 0)
+        .group_by(t.category, t.place_of_supply, exponent)
+    )
+    return session.exec(q).all()
+
+
+def _split_months(start: datetime.date, end: datetime.date) -> tuple[list[str], list[tuple[datetime.date, datetime.date]]]:
+    """Split [start, end] into whole calendar months ('YYYY-MM') and the partial-month date ranges at the edges."""
+    months, partial = [], []
+    day = start
+    while day <= end:
+        month_end = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+        if day.day == 1 and month_end <= end:
+            months.append(day.strftime('%Y-%m'))
+        else:
+            partial.append((day, min(month_end, end)))
+        day = month_end + datetime.timedelta(days=1)
+    return months, partial
+
+
 def summarize_gstr1(session: Session, period_start: datetime.date, period_end: datetime.date) -> dict:
-    """Summarize invoices for a period for a basic GSTR-1 report (taxable value and tax by type)."""
-    q = select(models.Invoice).where(models.Invoice.date >= period_start, models.Invoice.date <= period_end)
-    invoices = session.exec(q).all()
-    summary = {}
-    total_taxable = 0.0
-    total_igst = total_cgst = total_sgst = 0.0
-    for inv in invoices:
-        ql = select(models.InvoiceLine).where(models.InvoiceLine.invoice_id == inv.id)
-        lines = session.exec(ql).all()
-        for l in lines:
-            total_taxable += l.amount
-            total_igst += l.igst
-            total_cgst += l.cgst
-            total_sgst += l.sgst
-    summary['total_taxable'] = total_taxable
-    summary['total_igst'] = total_igst
-    summary['total_cgst'] = total_cgst
-    summary['total_sgst'] = total_sgst
-    summary['invoice_count'] = len(invoices)
+    """Summarize invoices for a period for a GSTR-1 report.
+
+    Returns taxable value, IGST/CGST/SGST and invoice count per supply category (B2B, B2C, EXPWP, EXPWOP) and
+    place of supply. Whole months are read from the pre-aggregated `GSTSummary` rows; only partial months at the
+    edges of the range are aggregated from the invoice totals, with one grouped query. Sums use the integer
+    minor-unit columns grouped by currency exponent, so mixed-exponent currencies convert back to major units correctly.
+    """
+    months, partial = _split_months(period_start, period_end)
+    rows = (_gstr1_summary_rows(session, months) if months else []) + (_gstr1_live_rows(session, partial) if partial else [])
+    fields = ('taxable', 'igst', 'cgst', 'sgst')
+    groups: dict[tuple[str, Optional[str]], dict] = {}
+    for cat, pos, exp, count, *amounts in rows:
+        pos = pos or None  # GSTSummary stores a missing place of supply as ''
+        group = groups.setdefault((cat, pos), {"category": cat, "place_of_supply": pos, "invoice_count": 0,
+                                               **{f: 0.0 for f in fields}})
+        group["invoice_count"] += int(count or 0)
+        for f, value in zip(fields, amounts):
+            group[f] += money.from_minor(value, exp)
+    breakdown = sorted(groups.values(), key=lambda g: (GST_CATEGORIES.index(g["category"]), g["place_of_supply"] or ''))
+    by_category = {}
+    for g in breakdown:
+        total = by_category.setdefault(g["category"], {"invoice_count": 0, **{f: 0.0 for f in fields}})
+        total["invoice_count"] += g["invoice_count"]
+        for f in fields:
+            total[f] += g[f]
+    for g in breakdown + list(by_category.values()):
+        for f in fields:
+            g[f] = round(g[f], 6)
+    summary = {f'total_{f}': round(sum(g[f] for g in breakdown), 6) for f in fields}
+    summary['invoice_count'] = sum(g["invoice_count"] for g in breakdown)
+    summary['by_category'] = by_category
+    summary['breakdown'] = breakdown
     return summary
 
 
+def _expected_gst_summary(session: Session) -> dict[tuple[str, str, str, str], tuple[int, int, int, int, int]]:
+    """GSTSummary contents recomputed from the invoices (grouped per day in SQL, folded to months here)."""
+    category = _gst_category().label('category')
+    q = (
+        select(models.Invoice.date, category, func.coalesce(models.Invoice.place_of_supply, ''), models.Invoice.currency,
+               func.count(models.Invoice.id), func.sum(models.Invoice.taxable_total_minor), func.sum(models.Invoice.igst_total_minor),
+               func.sum(models.Invoice.cgst_total_minor), func.sum(models.Invoice.sgst_total_minor))
+        .group_by(models.Invoice.date, category, func.coalesce(models.Invoice.place_of_supply, ''), models.Invoice.currency)
+    )
+    expected: dict[tuple[str, str, str, str], list[int]] = {}
+    for day, cat, pos, currency, *values in session.exec(q).all():
+        acc = expected.setdefault((day.strftime('%Y-%m'), cat, pos, currency), [0, 0, 0, 0, 0])
+        for i, v in enumerate(values):
+            acc[i] += int(v or 0)
+    return {k: tuple(v) for k, v in expected.items()}
+
+
+def verify_gst_summary(session: Session) -> list[dict]:
+    """Return the `GSTSummary` rows that differ from a recomputation over the invoices."""
+    expected = _expected_gst_summary(session)
+    t = models.GSTSummary
+    stored = {(r.period, r.category, r.place_of_supply, r.currency): (r.invoice_count, r.taxable_minor, r.igst_minor, r.cgst_minor, r.sgst_minor)
+              for r in session.exec(select(t)).all()}
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        if expected.get(key, (0,) * 5) != stored.get(key, (0,) * 5):
+            drift.append({"period": key[0], "category": key[1], "place_of_supply": key[2], "currency": key[3],
+                          "expected": expected.get(key), "stored": stored.get(key)})
+    return drift
+
+
+def rebuild_gst_summary(session: Session) -> list[dict]:
+    """Rebuild `GSTSummary` from the invoices (e.g. after a backfill). Returns the drift found before rebuilding."""
+    drift = verify_gst_summary(session)
+    session.execute(delete(models.GSTSummary))
+    for (period, category, pos, currency), (count, taxable, igst, cgst, sgst) in _expected_gst_summary(session).items():
+        session.add(models.GSTSummary(period=period, category=category, place_of_supply=pos, currency=currency,
+                                      invoice_count=count, taxable_minor=taxable, igst_minor=igst, cgst_minor=cgst, sgst_minor=sgst))
+    session.commit()
+    return drift
+
+
 def _convert_amount(session: Session, amount: float, from_currency: str, to_currency: str) -> float:
     """Convert amount from from_currency to to_currency using latest rate; returns same amount if currencies equal or rate missing."""
-    if from_currency == to_currency:
-        return amount
-    rate_obj = get_latest_rate(session, from_currency, to_currency)
-    if not rate_obj:
-        # try inverse
-        inv = get_latest_rate(session, to_currency, from_currency)
-        if inv and inv.rate != 0:
-            return amount / inv.rate
-        return amount
-    return amount * rate_obj.rate
-
-
-def get_account_balance(session: Session, account_id: int, target_currency: str | None = None) -> dict:
+    return fx.get_rate_cache().convert(session, amount, from_currency, to_currency)
+
+
+def _totals_as_of(session: Session, as_of: datetime.date, account_id: Optional[int] = None) -> dict[int, tuple[int, int]]:
+    """Return {account_id: (debit_minor, credit_minor)} as of a date: nearest closed-period snapshot plus later journals."""
+    period = _latest_closed_period(session, as_of)
+    totals: dict[int, tuple[int, int]] = {}
+    if period:
+        qs = select(models.PeriodBalance.account_id, models.PeriodBalance.debit_minor, models.PeriodBalance.credit_minor).where(models.PeriodBalance.period_id == period.id)
+        if account_id is not None:
+            qs = qs.where(models.PeriodBalance.account_id == account_id)
+        totals = {acc_id: (debit, credit) for acc_id, debit, credit in session.exec(qs).all()}
+    qd = (
+        select(models.LedgerEntry.account_id, func.sum(models.LedgerEntry.debit_minor), func.sum(models.LedgerEntry.credit_minor))
+        .join(models.JournalEntry, models.JournalEntry.id == models.LedgerEntry.journal_id)
+        .where(models.JournalEntry.date <= as_of)
+    )
+    if period:
+        qd = qd.where(models.JournalEntry.date > period.end_date)
+    if account_id is not None:
+        qd = qd.where(models.LedgerEntry.account_id == account_id)
+    for acc_id, debit, credit in session.exec(qd.group_by(models.LedgerEntry.account_id)).all():
+        base_debit, base_credit = totals.get(acc_id, (0, 0))
+        totals[acc_id] = (base_debit + int(debit or 0), base_credit + int(credit or 0))
+    return totals
+
+
+def get_account_balance(session: Session, account_id: int, target_currency: str | None = None,
+                        as_of: Optional[datetime.date] = None) -> dict:
     account = session.get(models.Account, account_id)
     if not account:
         raise ValueError("Account not found")
-    q = select(models.LedgerEntry).where(models.LedgerEntry.account_id == account_id)
-    lines = session.exec(q).all()
-    debit = sum(l.debit for l in lines)
-    credit = sum(l.credit for l in lines)
-    balance = debit - credit
-    result = {"account_id": account_id, "currency": account.currency, "balance": balance}
+    if as_of:
+        debit, credit = _totals_as_of(session, as_of, account_id).get(account_id, (0, 0))
+        balance_minor = debit - credit
+    else:
+        row = session.get(models.AccountBalance, account_id)
+        balance_minor = (row.debit_minor - row.credit_minor) if row else 0
+    balance = money.from_minor(balance_minor, money.currency_exponent(session, account.currency))
+    result = {"account_id": account_id, "currency": account.currency, "balance": balance, "balance_minor": balance_minor}
+    if as_of:
+        result["as_of"] = str(as_of)
     if target_currency:
         converted = _convert_amount(session, balance, account.currency, target_currency.upper())
         result["converted_balance"] = converted
@@ -290,21 +852,223 @@ def get_account_balance(session: Session, account_id: int, target_currency: str
     return result
 
 
-def trial_balance(session: Session, target_currency: str | None = None) -> list[dict]:
-    q = select(models.Account)
-    accounts = session.exec(q).all()
+def _encode_ledger_cursor(date: datetime.date, entry_id: int, running_minor: int) -> str:
+    return f"{date.isoformat()}_{entry_id}_{running_minor}"
+
+
+def _decode_ledger_cursor(cursor: str) -> tuple[datetime.date, int, int]:
+    try:
+        date, entry_id, running = cursor.split('_')
+        return datetime.date.fromisoformat(date), int(entry_id), int(running)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def account_ledger(session: Session, account_id: int, cursor: Optional[str] = None, limit: int = 500,
+                   start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> dict:
+    """One page of an account statement in (date, id) order with a running balance.
+
+    Pages are keyset-paginated: `next_cursor` encodes the last (date, entry id) and the running balance at that
+    row, so each page is an index range scan and the running balance never needs to be recomputed from the
+    start. The opening balance for `start` comes from the nearest closed-period snapshot.
+    """
+    account = session.get(models.Account, account_id)
+    if not account:
+        raise ValueError("Account not found")
+    exp = money.currency_exponent(session, account.currency)
+    if cursor:
+        after_date, after_id, running = _decode_ledger_cursor(cursor)
+    else:
+        after_date = after_id = None
+        running = 0
+        if start:
+            debit, credit = _totals_as_of(session, start - datetime.timedelta(days=1), account_id).get(account_id, (0, 0))
+            running = debit - credit
+    opening = running
+    q = (
+        select(models.LedgerEntry.id, models.LedgerEntry.journal_id, models.JournalEntry.date, models.JournalEntry.narration,
+               models.LedgerEntry.debit_minor, models.LedgerEntry.credit_minor)
+        .join(models.JournalEntry, models.JournalEntry.id == models.LedgerEntry.journal_id)
+        .where(models.LedgerEntry.account_id == account_id)
+    )
+    if start:
+        q = q.where(models.JournalEntry.date >= start)
+    if end:
+        q = q.where(models.JournalEntry.date <= end)
+    if after_date is not None:
+        q = q.where((models.JournalEntry.date > after_date) | ((models.JournalEntry.date == after_date) & (models.LedgerEntry.id > after_id)))
+    q = q.order_by(models.JournalEntry.date, models.LedgerEntry.id).limit(limit + 1)
+    fetched = session.exec(q).all()
+    has_more = len(fetched) > limit
+    rows = []
+    for entry_id, journal_id, date, narration, debit, credit in fetched[:limit]:
+        running += debit - credit
+        rows.append({
+            "entry_id": entry_id,
+            "journal_id": journal_id,
+            "date": str(date),
+            "narration": narration,
+            "debit": money.from_minor(debit, exp),
+            "credit": money.from_minor(credit, exp),
+            "balance": money.from_minor(running, exp),
+        })
+    next_cursor = None
+    if has_more:
+        last_id, _, last_date, _, _, _ = fetched[limit - 1]
+        next_cursor = _encode_ledger_cursor(last_date, last_id, running)
+    return {
+        "account_id": account_id,
+        "currency": account.currency,
+        "opening_balance": money.from_minor(opening, exp),
+        "rows": rows,
+        "next_cursor": next_cursor,
+    }
+
+
+def iter_account_ledger(session: Session, account_id: int, start: Optional[datetime.date] = None,
+                        end: Optional[datetime.date] = None, chunk_size: int = 5000):
+    """Yield every statement row for an account, fetching `chunk_size` rows per keyset page."""
+    cursor = None
+    while True:
+        page = account_ledger(session, account_id, cursor=cursor, limit=chunk_size, start=start, end=end)
+        yield from page["rows"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
+
+
+def trial_balance(session: Session, target_currency: str | None = None, as_of: Optional[datetime.date] = None,
+                  date_from: Optional[datetime.date] = None, date_to: Optional[datetime.date] = None) -> list[dict]:
+    """Trial balance for all accounts, computed with grouped aggregate queries.
+
+    Without date filters the materialized `AccountBalance` rows are read directly. `as_of` (or `date_to` alone)
+    answers from the nearest closed-period snapshot plus the journals after it; `date_from`/`date_to` restrict
+    to movements within the period.
+    """
+    if date_from is None and date_to is not None:
+        as_of = min(as_of, date_to) if as_of else date_to
+        date_to = None
+    exponent = func.coalesce(models.Currency.exponent, money.DEFAULT_EXPONENT)
+    accounts = (
+        select(models.Account.id, models.Account.name, models.Account.currency, exponent)
+        .outerjoin(models.Currency, models.Currency.code == models.Account.currency)
+    )
+    snapshot = None
+    if date_from is None and as_of is None:
+        q = (
+            accounts.add_columns(models.AccountBalance.debit_minor, models.AccountBalance.credit_minor)
+            .outerjoin(models.AccountBalance, models.AccountBalance.account_id == models.Account.id)
+        )
+    elif date_from is None:
+        snapshot = _totals_as_of(session, as_of)
+        q = accounts
+    else:
+        movements = (
+            select(
+                models.LedgerEntry.account_id.label('account_id'),
+                func.sum(models.LedgerEntry.debit_minor).label('debit'),
+                func.sum(models.LedgerEntry.credit_minor).label('credit'),
+            )
+            .join(models.JournalEntry, models.JournalEntry.id == models.LedgerEntry.journal_id)
+            .where(models.JournalEntry.date >= date_from)
+        )
+        if as_of:
+            movements = movements.where(models.JournalEntry.date <= as_of)
+        if date_to:
+            movements = movements.where(models.JournalEntry.date <= date_to)
+        movements = movements.group_by(models.LedgerEntry.account_id).subquery()
+        q = (
+            accounts.add_columns(movements.c.debit, movements.c.credit)
+            .outerjoin(movements, movements.c.account_id == models.Account.id)
+        )
     report = []
-    for acc in accounts:
-        ql = select(models.LedgerEntry).where(models.LedgerEntry.account_id == acc.id)
-        lines = session.exec(ql).all()
-        debit = sum(l.debit for l in lines)
-        credit = sum(l.credit for l in lines)
-        bal = debit - credit
-        row = {"account_id": acc.id, "account_name": acc.name, "currency": acc.currency, "balance": bal}
-        if target_currency:
-            row["converted_balance"] = _convert_amount(session, bal, acc.currency, target_currency.upper())
-            row["target_currency"] = target_currency.upper()
+    for acc_row in session.exec(q.order_by(models.Account.id)).all():
+        if snapshot is not None:
+            acc_id, name, currency, exp = acc_row
+            debit, credit = snapshot.get(acc_id, (0, 0))
+        else:
+            acc_id, name, currency, exp, debit, credit = acc_row
+        debit = int(debit or 0)
+        credit = int(credit or 0)
+        bal = money.from_minor(debit - credit, exp)
+        row = {
+            "account_id": acc_id, "account_name": name, "currency": currency,
+            "debit": money.from_minor(debit, exp), "credit": money.from_minor(credit, exp),
+            "balance": bal, "balance_minor": debit - credit,
+        }
         report.append(row)
+    if target_currency:
+        target_currency = target_currency.upper()
+        matrix = fx.get_rate_cache().matrix(session, as_of or date_to)
+        # unknown pairs are reported unconverted, as _convert_amount does
+        converted = matrix.convert_many([r["balance"] for r in report], [r["currency"] for r in report], target_currency)
+        for row, value in zip(report, converted.tolist()):
+            row["converted_balance"] = value
+            row["target_currency"] = target_currency
     return report
 
 
+def verify_account_balances(session: Session) -> list[dict]:
+    """Recompute per-account totals from the ledger and return the accounts whose stored balance drifted."""
+    q = select(models.LedgerEntry.account_id, func.sum(models.LedgerEntry.debit_minor), func.sum(models.LedgerEntry.credit_minor)).group_by(models.LedgerEntry.account_id)
+    expected = {acc_id: (int(debit or 0), int(credit or 0)) for acc_id, debit, credit in session.exec(q).all()}
+    stored = {b.account_id: (b.debit_minor, b.credit_minor) for b in session.exec(select(models.AccountBalance)).all()}
+    drift = []
+    for account_id in sorted(set(expected) | set(stored)):
+        exp_debit, exp_credit = expected.get(account_id, (0, 0))
+        st_debit, st_credit = stored.get(account_id, (0, 0))
+        if exp_debit != st_debit or exp_credit != st_credit:
+            drift.append({
+                "account_id": account_id,
+                "expected_debit_minor": exp_debit,
+                "expected_credit_minor": exp_credit,
+                "stored_debit_minor": st_debit,
+                "stored_credit_minor": st_credit,
+            })
+    return drift
+
+
+def rebuild_account_balances(session: Session) -> list[dict]:
+    """Rebuild running and daily balance tables from the ledger. Returns the drift found before rebuilding."""
+    drift = verify_account_balances(session)
+    session.execute(delete(models.AccountDailyBalance))
+    session.execute(delete(models.AccountBalance))
+    q = select(models.LedgerEntry.account_id, func.sum(models.LedgerEntry.debit_minor), func.sum(models.LedgerEntry.credit_minor)).group_by(models.LedgerEntry.account_id)
+    totals = {acc_id: (int(debit or 0), int(credit or 0)) for acc_id, debit, credit in session.exec(q).all()}
+    for acc_id in session.exec(select(models.Account.id)).all():
+        debit, credit = totals.get(acc_id, (0, 0))
+        session.add(models.AccountBalance(account_id=acc_id, debit_minor=debit, credit_minor=credit))
+    qd = (
+        select(models.LedgerEntry.account_id, models.JournalEntry.date, func.sum(models.LedgerEntry.debit_minor), func.sum(models.LedgerEntry.credit_minor))
+        .join(models.JournalEntry, models.JournalEntry.id == models.LedgerEntry.journal_id)
+        .group_by(models.LedgerEntry.account_id, models.JournalEntry.date)
+    )
+    for acc_id, date, debit, credit in session.exec(qd).all():
+        session.add(models.AccountDailyBalance(account_id=acc_id, date=date, debit_minor=int(debit or 0), credit_minor=int(credit or 0)))
+    session.commit()
+    return drift
+
+
+def close_period(session: Session, start_date: datetime.date, end_date: datetime.date) -> models.FiscalPeriod:
+    """Close a fiscal period: snapshot cumulative per-account totals as of `end_date` and lock earlier dates."""
+    if start_date > end_date:
+        raise ValueError("Period start must be on or before its end")
+    if end_date >= datetime.date.today():
+        # a period still open for posting would lock today's journals and snapshot incomplete totals
+        raise ValueError("Period must end before today")
+    last = _latest_closed_period(session)
+    if last and start_date <= last.end_date:
+        raise ValueError(f"Period overlaps closed period ending {last.end_date}")
+    totals = _totals_as_of(session, end_date)
+    period = models.FiscalPeriod(start_date=start_date, end_date=end_date)
+    session.add(period)
+    session.flush()
+    for acc_id, (debit, credit) in totals.items():
+        session.add(models.PeriodBalance(period_id=period.id, account_id=acc_id, debit_minor=debit, credit_minor=credit))
+    session.commit()
+    session.refresh(period)
+    return period
+
+
+def list_periods(session: Session) -> list[models.FiscalPeriod]:
+    return session.exec(select(models.FiscalPeriod).order_by(models.FiscalPeriod.end_date)).all()
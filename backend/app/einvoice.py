@@ -0,0 +1,106 @@
+"""Canonical e-invoice payloads, cached per invoice.
+
+An invoice's payload is serialized once into canonical JSON bytes (sorted keys, compact separators, UTF-8) and
+kept with its SHA-256 content hash, which doubles as the HTTP ETag, and the RSA signature of every private key
+that has signed it. Entries are keyed by invoice id and `Invoice.revision`, which `crud` bumps whenever a field
+that feeds the payload changes, so a lookup is one primary-key read of the revision while the invoice is
+unchanged. Replicas each keep their own cache; the revision in the database keeps them consistent.
+"""
+import collections
+import hashlib
+import json
+import threading
+from typing import Optional
+from sqlmodel import Session, select
+from . import models, crud
+from .config import get_settings
+from .gst_signing_rsa import sign_with_private
+
+
+def canonical_bytes(payload: dict) -> bytes:
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+class CanonicalPayload:
+    def __init__(self, invoice_id: int, revision: int, payload: dict):
+        self.invoice_id = invoice_id
+        self.revision = revision
+        self.payload = payload
+        self.body = canonical_bytes(payload)
+        self.digest = hashlib.sha256(self.body).hexdigest()
+        self.etag = f'"{self.digest}"'
+        self._lock = threading.Lock()
+        # sha256 of the signing key -> hex signature of `body`
+        self._signatures: dict[str, str] = {}
+
+    def signature(self, pem_private: bytes) -> str:
+        """Hex RSA signature of the body, computed once per signing key."""
+        key = hashlib.sha256(pem_private).hexdigest()
+        with self._lock:
+            sig = self._signatures.get(key)
+            if sig is None:
+                sig = self._signatures[key] = sign_with_private(pem_private, self.body).hex()
+            return sig
+
+    def signed_by(self, pem_private: bytes) -> bool:
+        with self._lock:
+            return hashlib.sha256(pem_private).hexdigest() in self._signatures
+
+    def add_signature(self, pem_private: bytes, signature: str) -> None:
+        """Store a hex signature of the body computed elsewhere (e.g. by a `signing.SigningService` batch)."""
+        with self._lock:
+            self._signatures[hashlib.sha256(pem_private).hexdigest()] = signature
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True when an `If-None-Match` header value names this payload's ETag (weak or strong) or is `*`."""
+        if not if_none_match:
+            return False
+        tags = {t.strip().removeprefix('W/') for t in if_none_match.split(',')}
+        return '*' in tags or self.etag in tags
+
+
+class PayloadCache:
+    def __init__(self, max_entries: int = 10000):
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self._entries: collections.OrderedDict[int, CanonicalPayload] = collections.OrderedDict()
+
+    def get(self, session: Session, invoice_id: int) -> CanonicalPayload:
+        """Cached canonical payload of an invoice, rebuilt if its revision changed. Raises ValueError if missing."""
+        revision = session.exec(select(models.Invoice.revision).where(models.Invoice.id == invoice_id)).first()
+        if revision is None:
+            raise ValueError("Invoice not found")
+        with self._lock:
+            entry = self._entries.get(invoice_id)
+            if entry is not None and entry.revision == revision:
+                self._entries.move_to_end(invoice_id)
+                return entry
+        entry = CanonicalPayload(invoice_id, revision, crud.build_einvoice_payload(session, invoice_id))
+        with self._lock:
+            self._entries[invoice_id] = entry
+            self._entries.move_to_end(invoice_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, invoice_id: Optional[int] = None) -> None:
+        with self._lock:
+            if invoice_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(invoice_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[PayloadCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_payload_cache() -> PayloadCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PayloadCache(get_settings().EINVOICE_PAYLOAD_CACHE_SIZE)
+    return _cache
@@ -0,0 +1,146 @@
+"""Incremental columnar export of the ledger and invoices to partitioned Parquet files.
+
+Each run exports rows with a primary key above the table's `ExportWatermark`, groups them by month of the
+journal/invoice date and writes one Parquet file per month and batch through `storage.Storage`:
+
+    exports/<table>/month=YYYY-MM/part-<first id>-<last id>.parquet
+
+The watermark is advanced after every batch, so an interrupted run resumes where it stopped. Rows are
+append-only by id: later updates to already-exported invoices (e.g. e-invoice status) are not re-exported.
+
+Ids are not committed in id order on Postgres: a transaction can commit id 41 after another committed (and a run
+exported) id 42. So every id range a batch skips over is kept on the watermark as a gap, and later runs first
+export rows that have since appeared in those gaps (in their own `part-` files). Gaps still empty after
+`gap_grace` seconds are dropped; by then they are ids of rolled-back transactions. Requires `pyarrow`.
+"""
+import datetime
+import io
+import json
+import logging
+from typing import Optional
+from sqlmodel import Session, select
+from . import idgaps, models
+from .storage import Storage, StorageError
+
+logger = logging.getLogger(__name__)
+
+
+def _journal_query():
+    q = select(models.JournalEntry.id, models.JournalEntry.date, models.JournalEntry.narration)
+    return q, models.JournalEntry.id, ['id', 'date', 'narration']
+
+
+def _ledger_query():
+    q = (
+        select(models.LedgerEntry.id, models.LedgerEntry.journal_id, models.LedgerEntry.account_id,
+               models.LedgerEntry.debit_minor, models.LedgerEntry.credit_minor, models.LedgerEntry.debit,
+               models.LedgerEntry.credit, models.JournalEntry.date)
+        .join(models.JournalEntry, models.JournalEntry.id == models.LedgerEntry.journal_id)
+    )
+    return q, models.LedgerEntry.id, ['id', 'journal_id', 'account_id', 'debit_minor', 'credit_minor', 'debit', 'credit', 'date']
+
+
+def _invoice_query():
+    cols = ['id', 'invoice_number', 'date', 'customer_name', 'customer_gstin', 'place_of_supply', 'is_export',
+            'lut_applicable', 'iec', 'currency', 'einvoice_irn', 'einvoice_status',
+            'taxable_total', 'igst_total', 'cgst_total', 'sgst_total', 'grand_total',
+            'taxable_total_minor', 'igst_total_minor', 'cgst_total_minor', 'sgst_total_minor', 'grand_total_minor']
+    return select(*[getattr(models.Invoice, c) for c in cols]), models.Invoice.id, cols
+
+
+def _invoice_line_query():
+    cols = ['id', 'invoice_id', 'description', 'quantity', 'unit_rate', 'amount', 'igst', 'cgst', 'sgst',
+            'amount_minor', 'igst_minor', 'cgst_minor', 'sgst_minor']
+    q = (
+        select(*[getattr(models.InvoiceLine, c) for c in cols], models.Invoice.date)
+        .join(models.Invoice, models.Invoice.id == models.InvoiceLine.invoice_id)
+    )
+    return q, models.InvoiceLine.id, cols + ['date']
+
+
+EXPORTS = {
+    'journalentry': _journal_query,
+    'ledgerentry': _ledger_query,
+    'invoice': _invoice_query,
+    'invoiceline': _invoice_line_query,
+}
+
+
+def _parquet_bytes(columns: list[str], rows: list[tuple]) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.table({name: [r[i] for r in rows] for i, name in enumerate(columns)})
+    buf = io.BytesIO()
+    pq.write_table(table, buf, compression='zstd')
+    return buf.getvalue()
+
+
+def _load_gaps(wm: models.ExportWatermark) -> list[list]:
+    return [[a, b, datetime.datetime.fromisoformat(seen)] for a, b, seen in json.loads(wm.gaps or '[]')]
+
+
+def _dump_gaps(gaps: list[list]) -> Optional[str]:
+    return json.dumps([[a, b, seen.isoformat()] for a, b, seen in gaps]) if gaps else None
+
+
+def export_table(session: Session, table: str, storage: Storage, batch_size: int = 50000,
+                 gap_grace: float = 3600.0) -> dict:
+    """Export rows of `table` newer than its watermark, plus late rows that filled earlier gaps.
+
+    Returns {"rows": n, "files": [paths], "last_id": id, "open_gaps": number of id ranges still awaited}.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise StorageError('pyarrow is required for Parquet export: pip install pyarrow')
+    query, id_col, columns = EXPORTS[table]()
+    date_idx = columns.index('date')
+    wm = session.get(models.ExportWatermark, table) or models.ExportWatermark(table_name=table, last_id=0)
+    gaps = _load_gaps(wm)
+    exported = 0
+    files = []
+
+    def write(rows) -> None:
+        by_month: dict[str, list[tuple]] = {}
+        for r in rows:
+            by_month.setdefault(r[date_idx].strftime('%Y-%m'), []).append(tuple(r))
+        for month, month_rows in sorted(by_month.items()):
+            key = f"exports/{table}/month={month}/part-{month_rows[0][0]:012d}-{month_rows[-1][0]:012d}.parquet"
+            files.append(storage.upload_bytes(key, _parquet_bytes(columns, month_rows), content_type='application/vnd.apache.parquet'))
+
+    def save() -> None:
+        wm.gaps = _dump_gaps(gaps)
+        wm.updated_at = datetime.datetime.utcnow()
+        session.add(wm)
+        session.commit()
+
+    now = datetime.datetime.utcnow()
+    if gaps:
+        late = []
+        for ranges in idgaps.filters(id_col, gaps):
+            late += session.exec(query.where(ranges).order_by(id_col)).all()
+        if late:
+            write(late)
+            exported += len(late)
+            gaps = idgaps.without(gaps, [r[0] for r in late])
+        expired = [g for g in gaps if (now - g[2]).total_seconds() > gap_grace]
+        if expired:
+            logger.info('Export of %s: giving up on %d id gaps older than %gs', table, len(expired), gap_grace)
+            gaps = [g for g in gaps if g not in expired]
+        if late or expired:
+            save()
+    while True:
+        rows = session.exec(query.where(id_col > wm.last_id).order_by(id_col).limit(batch_size)).all()
+        if not rows:
+            break
+        write(rows)
+        gaps += [[a, b, now] for a, b in idgaps.missing_ranges(wm.last_id, [r[0] for r in rows])]
+        wm.last_id = rows[-1][0]
+        save()
+        exported += len(rows)
+    return {"rows": exported, "files": files, "last_id": wm.last_id, "open_gaps": len(gaps)}
+
+
+def export_all(session: Session, storage: Storage, tables: Optional[list[str]] = None, batch_size: int = 50000,
+               gap_grace: float = 3600.0) -> dict:
+    return {t: export_table(session, t, storage, batch_size, gap_grace) for t in (tables or list(EXPORTS))}
@@ -0,0 +1,290 @@
+"""Process-level FX rate cache.
+
+Every `ExchangeRate` row is held in memory as a per-(base, target) history sorted by timestamp, so conversions are
+a dict lookup plus a `bisect` for as-of rates instead of an `ORDER BY timestamp DESC` query per converted row.
+The cache loads lazily on first use and is updated in place by `crud.create_exchange_rate`.
+
+With `REDIS_URL` set, each new rate is also published on `FX_RATES_CHANNEL`; `start_listener()` (called at API
+startup) applies rates published by other replicas, and drops the cache for a full reload if the subscription
+breaks, since messages may have been missed.
+
+`RateMatrix` turns the rates in force at a moment into a dense currency x currency matrix: direct rates, then
+inverses, then cross rates triangulated through the pivot currencies (`FX_PIVOT_CURRENCIES`, e.g. USD then INR)
+and finally any longer path. Matrices are memoized per as-of moment until the next rate arrives, so bulk
+conversion is one NumPy gather and multiply.
+"""
+import bisect
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Iterable, Optional, Sequence, Union
+import numpy as np
+from sqlmodel import Session, select
+from . import models
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# identifies this process's own messages on the pub/sub channel
+_ORIGIN = uuid.uuid4().hex
+
+
+def _upper_bound(timestamps: list[datetime.datetime], as_of: Union[datetime.date, datetime.datetime, None]) -> int:
+    """Number of entries at or before `as_of`; a plain date includes the whole day."""
+    if as_of is None:
+        return len(timestamps)
+    if not isinstance(as_of, datetime.datetime):
+        return bisect.bisect_left(timestamps, datetime.datetime.combine(as_of + datetime.timedelta(days=1), datetime.time.min))
+    return bisect.bisect_right(timestamps, as_of)
+
+
+class RateMatrix:
+    """Multipliers between every pair of known currencies; `rates[i, j]` converts currency i into j (NaN: no path)."""
+
+    def __init__(self, currencies: Sequence[str], rates: np.ndarray):
+        self.currencies = list(currencies)
+        self.index = {code: i for i, code in enumerate(self.currencies)}
+        self.rates = rates
+
+    @classmethod
+    def build(cls, pairs: dict[tuple[str, str], float], pivots: Sequence[str] = ()) -> 'RateMatrix':
+        """Build from {(base, target): rate}. Direct rates win over inverses, and both over triangulated ones."""
+        currencies = sorted({c for pair in pairs for c in pair} | set(pivots))
+        idx = {code: i for i, code in enumerate(currencies)}
+        n = len(currencies)
+        m = np.full((n, n), np.nan)
+        for (base, target), rate in pairs.items():
+            if rate:
+                m[idx[target], idx[base]] = 1.0 / rate
+        for (base, target), rate in pairs.items():
+            m[idx[base], idx[target]] = rate
+        np.fill_diagonal(m, 1.0)
+        # fill missing pairs through each intermediate: the pivots first, then every currency (Floyd-Warshall order)
+        order = [idx[p] for p in pivots] + list(range(n))
+        for k in order:
+            missing = np.isnan(m)
+            if not missing.any():
+                break
+            m = np.where(missing, m[:, k, None] * m[None, k, :], m)
+        return cls(currencies, m)
+
+    def rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        if from_currency == to_currency:
+            return 1.0
+        i, j = self.index.get(from_currency), self.index.get(to_currency)
+        if i is None or j is None or np.isnan(self.rates[i, j]):
+            return None
+        return float(self.rates[i, j])
+
+    def column(self, to_currency: str) -> dict[str, float]:
+        """{currency: multiplier into to_currency} for every currency with a path."""
+        j = self.index.get(to_currency)
+        if j is None:
+            return {to_currency: 1.0}
+        return {c: float(r) for c, r in zip(self.currencies, self.rates[:, j]) if not np.isnan(r)}
+
+    def convert_many(self, amounts: Iterable[float], currencies: Iterable[str], to_currency: str) -> np.ndarray:
+        """Convert each amount from its currency into `to_currency` in one vectorized multiply.
+
+        Amounts whose currency has no path to `to_currency` are returned unconverted (and logged).
+        """
+        amounts = np.asarray(list(amounts), dtype=float)
+        codes = list(currencies)
+        j = self.index.get(to_currency)
+        if j is None:
+            factors = np.array([1.0 if c == to_currency else np.nan for c in codes])
+        else:
+            # unknown currencies point at an extra NaN row
+            rates = np.append(self.rates[:, j], np.nan)
+            factors = rates[np.array([self.index.get(c, len(self.currencies)) for c in codes], dtype=np.intp)]
+        missing = np.isnan(factors)
+        if missing.any():
+            logger.warning('No FX path into %s for %s; amounts left unconverted', to_currency,
+                           sorted({c for c, miss in zip(codes, missing) if miss}))
+            factors[missing] = 1.0
+        return amounts * factors
+
+
+class RateCache:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        # (base, target) -> (timestamps ascending, rates)
+        self._history: dict[tuple[str, str], tuple[list[datetime.datetime], list[float]]] = {}
+        # as-of moment (None = latest) -> RateMatrix, dropped whenever the history changes
+        self._matrices: dict = {}
+
+    def load(self, session: Session) -> int:
+        q = select(models.ExchangeRate.base, models.ExchangeRate.target, models.ExchangeRate.timestamp, models.ExchangeRate.rate)
+        # held across the query so a concurrent add() lands after the snapshot instead of being dropped
+        with self._lock:
+            rows = session.exec(q.order_by(models.ExchangeRate.timestamp, models.ExchangeRate.id)).all()
+            history: dict[tuple[str, str], tuple[list, list]] = {}
+            for base, target, ts, rate in rows:
+                timestamps, rates = history.setdefault((base, target), ([], []))
+                timestamps.append(ts)
+                rates.append(rate)
+            self._history = history
+            self._matrices = {}
+            self._loaded = True
+        return len(rows)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+            self._history = {}
+            self._matrices = {}
+
+    def _ensure(self, session: Session) -> None:
+        if not self._loaded:
+            self.load(session)
+
+    def add(self, base: str, target: str, timestamp: datetime.datetime, rate: float) -> None:
+        """Insert one rate in timestamp order. Ignored until the cache is loaded, since the load will include it."""
+        with self._lock:
+            if not self._loaded:
+                return
+            timestamps, rates = self._history.setdefault((base, target), ([], []))
+            i = bisect.bisect_right(timestamps, timestamp)
+            if i and timestamps[i - 1] == timestamp and rates[i - 1] == rate:
+                return  # already applied (e.g. our own pub/sub echo)
+            timestamps.insert(i, timestamp)
+            rates.insert(i, rate)
+            self._matrices = {}
+
+    def rate(self, session: Session, base: str, target: str,
+             as_of: Union[datetime.date, datetime.datetime, None] = None) -> Optional[float]:
+        """Latest base -> target rate at or before `as_of` (None for the newest), or None if there is none."""
+        self._ensure(session)
+        with self._lock:
+            entry = self._history.get((base, target))
+            if not entry:
+                return None
+            i = _upper_bound(entry[0], as_of)
+            return entry[1][i - 1] if i else None
+
+    def matrix(self, session: Session, as_of: Union[datetime.date, datetime.datetime, None] = None) -> RateMatrix:
+        """Conversion matrix for the rates in force at `as_of` (latest when None), built once per moment."""
+        self._ensure(session)
+        with self._lock:
+            m = self._matrices.get(as_of)
+            if m is None:
+                if len(self._matrices) >= 64:
+                    self._matrices = {}
+                pairs = {}
+                for pair, (timestamps, rates) in self._history.items():
+                    i = _upper_bound(timestamps, as_of)
+                    if i:
+                        pairs[pair] = rates[i - 1]
+                m = self._matrices[as_of] = RateMatrix.build(pairs, get_settings().FX_PIVOT_CURRENCIES)
+            return m
+
+    def convert(self, session: Session, amount: float, from_currency: str, to_currency: str,
+                as_of: Union[datetime.date, datetime.datetime, None] = None) -> float:
+        """Convert via the direct rate, its inverse or a triangulated cross rate; unconverted (and logged) if none."""
+        if from_currency == to_currency:
+            return amount
+        rate = self.matrix(session, as_of).rate(from_currency, to_currency)
+        if rate is None:
+            logger.warning('No FX path from %s to %s; amount left unconverted', from_currency, to_currency)
+            return amount
+        return amount * rate
+
+    def rates_into(self, session: Session, to_currency: str,
+                   as_of: Union[datetime.date, datetime.datetime, None] = None) -> dict[str, float]:
+        """{currency: multiplier into to_currency} for every currency with a direct, inverse or cross rate."""
+        return self.matrix(session, as_of).column(to_currency)
+
+
+_cache: Optional[RateCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_rate_cache() -> RateCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RateCache()
+    return _cache
+
+
+def _redis():
+    settings = get_settings()
+    if not settings.REDIS_URL:
+        return None
+    import redis
+    return redis.from_url(settings.REDIS_URL)
+
+
+def notify_rate_added(rate: models.ExchangeRate) -> None:
+    """Hook called by `crud` after a rate commits: update the local cache and tell the other replicas."""
+    get_rate_cache().add(rate.base, rate.target, rate.timestamp, rate.rate)
+    try:
+        conn = _redis()
+        if conn is not None:
+            conn.publish(get_settings().FX_RATES_CHANNEL, json.dumps({
+                "origin": _ORIGIN, "base": rate.base, "target": rate.target,
+                "timestamp": rate.timestamp.isoformat(), "rate": rate.rate,
+            }))
+    except Exception:
+        # replicas fall back to stale rates until they reload; the write itself already succeeded
+        logger.exception('Failed to publish FX rate update')
+
+
+def _apply_message(data) -> None:
+    try:
+        msg = json.loads(data)
+        if msg.get("origin") == _ORIGIN:
+            return
+        if msg.get("invalidate"):
+            get_rate_cache().invalidate()
+            return
+        get_rate_cache().add(msg["base"], msg["target"], datetime.datetime.fromisoformat(msg["timestamp"]), float(msg["rate"]))
+    except (ValueError, KeyError, TypeError):
+        logger.warning('Malformed FX rate message, reloading rates on next use')
+        get_rate_cache().invalidate()
+
+
+def publish_invalidate() -> None:
+    """Ask every replica (and this process) to reload its rates, e.g. after a bulk load."""
+    get_rate_cache().invalidate()
+    try:
+        conn = _redis()
+        if conn is not None:
+            conn.publish(get_settings().FX_RATES_CHANNEL, json.dumps({"origin": _ORIGIN, "invalidate": True}))
+    except Exception:
+        logger.exception('Failed to publish FX rate invalidation')
+
+
+_listener: Optional[threading.Thread] = None
+
+
+def start_listener() -> bool:
+    """Subscribe to rate updates from other replicas in a daemon thread. Returns False without `REDIS_URL`."""
+    global _listener
+    if not get_settings().REDIS_URL:
+        return False
+    with _cache_lock:
+        if _listener is not None:
+            return True
+        _listener = threading.Thread(target=_listen, name='fx-rate-listener', daemon=True)
+        _listener.start()
+    return True
+
+
+def _listen() -> None:
+    channel = get_settings().FX_RATES_CHANNEL
+    while True:
+        try:
+            pubsub = _redis().pubsub()
+            pubsub.subscribe(channel)
+            for message in pubsub.listen():
+                if message.get('type') == 'message':
+                    _apply_message(message['data'])
+        except Exception:
+            logger.exception('FX rate subscription lost; reloading rates on next use')
+        get_rate_cache().invalidate()
+        time.sleep(1)
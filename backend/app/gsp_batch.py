@@ -0,0 +1,81 @@
+"""Concurrent batch submission of e-invoices to the GSP.
+
+Submissions are latency-bound round trips, so a batch runs them on a thread pool of `concurrency` workers
+(`GSP_SUBMIT_CONCURRENCY` by default) while the calling thread loads payloads from the canonical payload cache
+and writes outcomes back. IRNs and audit rows are recorded with `crud.record_einvoice_submissions` every
+`write_batch` completed submissions, so a long run keeps its progress if interrupted. Invoices that already have
+an IRN are skipped. Payloads are signed up front in one batch on the signing process pool (`signing`).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Optional
+from sqlmodel import Session, select
+from . import models, crud, einvoice
+from .config import get_settings
+from .gsp_client import GSPClient, get_client
+
+logger = logging.getLogger(__name__)
+
+
+def submit_batch(session: Session, invoice_ids: Iterable[int], client: Optional[GSPClient] = None,
+                 concurrency: Optional[int] = None, write_batch: int = 500) -> dict:
+    """Submit invoices concurrently. Returns counts and a per-invoice outcome list in input order.
+
+    Each outcome has `invoice_id` and `status`: `submitted` (with `irn`), `rejected` (the GSP answered without
+    an IRN; `response` holds its reply), `failed` (`error`), `skipped` (already has an IRN) or `not_found`.
+    """
+    ids = list(dict.fromkeys(invoice_ids))
+    client = client or get_client()
+    concurrency = max(1, concurrency or get_settings().GSP_SUBMIT_CONCURRENCY)
+    outcomes: dict[int, dict] = {}
+    existing = dict(session.exec(select(models.Invoice.id, models.Invoice.einvoice_irn).where(models.Invoice.id.in_(ids))).all()) if ids else {}
+    cache = einvoice.get_payload_cache()
+    payloads = {}
+    for invoice_id in ids:
+        if invoice_id not in existing:
+            outcomes[invoice_id] = {"invoice_id": invoice_id, "status": "not_found"}
+        elif existing[invoice_id]:
+            outcomes[invoice_id] = {"invoice_id": invoice_id, "status": "skipped", "irn": existing[invoice_id]}
+        else:
+            payloads[invoice_id] = cache.get(session, invoice_id)
+
+    # one parallel signing pass for the whole batch rather than a signature per submission on the I/O threads
+    client.presign(list(payloads.values()))
+
+    assigned, audits = [], []
+
+    def flush():
+        if assigned or audits:
+            crud.record_einvoice_submissions(session, assigned, audits)
+            assigned.clear()
+            audits.clear()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='gsp-submit') as pool:
+        futures = {pool.submit(client.submit_einvoice, payload): invoice_id for invoice_id, payload in payloads.items()}
+        for future in as_completed(futures):
+            invoice_id = futures[future]
+            try:
+                resp = future.result()
+            except Exception as e:
+                logger.warning('GSP submission failed for invoice %s: %s', invoice_id, e)
+                outcomes[invoice_id] = {"invoice_id": invoice_id, "status": "failed", "error": str(e)}
+                audits.append((invoice_id, 'GSP_SUBMISSION_FAILED', str(e)))
+            else:
+                irn = resp.get('irn')
+                if irn:
+                    status = resp.get('status') or 'IRN_ASSIGNED'
+                    outcomes[invoice_id] = {"invoice_id": invoice_id, "status": "submitted", "irn": irn}
+                    assigned.append((invoice_id, irn, status))
+                    audits.append((invoice_id, 'GSP_SUBMISSION', f'irn={irn}'))
+                else:
+                    outcomes[invoice_id] = {"invoice_id": invoice_id, "status": "rejected", "response": resp}
+                    audits.append((invoice_id, 'GSP_SUBMISSION_REJECTED', str(resp)))
+            if len(audits) >= write_batch:
+                flush()
+    flush()
+
+    results = [outcomes[i] for i in ids]
+    counts: dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {"total": len(results), "counts": counts, "results": results}
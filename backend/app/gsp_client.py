@@ -1,24 +1,25 @@
-import json
+import asyncio
+import random
+import threading
 import time
-from typing import Optional
+import weakref
+from typing import Optional, Sequence, Union
+import httpx
 import requests
-from . import integrations
-from .gst_signing_rsa import sign_with_private, verify_with_public
+from requests.adapters import HTTPAdapter
+from . import integrations, resilience, signing
+from .gst_signing_rsa import generate_rsa_keypair, sign_with_private, verify_with_public
+from .einvoice import CanonicalPayload, canonical_bytes
 from .config import get_settings
 
 
-class GSPClient:
-    """Production-ready GSP client with sandbox support and robust retries.
-
-    Behaviour:
-    - Reads configuration from `backend/app/config.get_settings()`.
-    - Loads private/public keys from provided bytes or file paths.
-    - If no `GSP_BASE_URL` set, falls back to simulated GSTN or sandbox.
-    """
+class _GSPClientBase:
+    """Configuration, signing and request building shared by the sync and async clients."""
 
-    def __init__(self, base_url: Optional[str] = None, pem_private: Optional[bytes] = None,
-                 pem_public: Optional[bytes] = None, timeout: Optional[int] = None):
+    def _configure(self, base_url, pem_private, pem_public, timeout, guard) -> None:
         self.settings = get_settings()
+        # circuit breaker + adaptive concurrency limit around every outbound call (process-wide by default)
+        self.guard = guard or resilience.get_gsp_guard()
         self.base_url = base_url or self.settings.GSP_BASE_URL or self.settings.GSP_SANDBOX_URL
         self.timeout = timeout or self.settings.GSP_TIMEOUT
         self.private = pem_private
@@ -54,17 +55,34 @@ class GSPClient:
         sig = sign_with_private(self.private, body)
         return sig.hex()
 
-    def submit_einvoice(self, payload: dict, use_sandbox: bool = False) -> dict:
-        """Submit an e-invoice payload to GSP/sandbox or to the simulated GSTN.
+    def _unsigned(self, payloads: Sequence[CanonicalPayload]) -> list[CanonicalPayload]:
+        if not self.private or self._simulated():
+            return []
+        return [p for p in payloads if not p.signed_by(self.private)]
 
-        - `use_sandbox`: when True and a sandbox URL is configured, send to sandbox.
+    def presign(self, payloads: Sequence[CanonicalPayload]) -> int:
+        """Sign every unsigned payload of a batch up front on the signing pool; returns how many were signed.
+
+        Submissions then reuse the cached signatures instead of signing one by one on the submitting threads.
         """
-        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
-        signature = self._sign_payload(body)
+        todo = self._unsigned(payloads)
+        if todo:
+            sigs = signing.get_signing_service(self.private).sign_many([p.body for p in todo])
+            for p, sig in zip(todo, sigs):
+                p.add_signature(self.private, sig)
+        return len(todo)
 
-        # If using simulated GSTN, call locally
-        if hasattr(self, 'sim') and not self.base_url:
-            return self.sim.submit_einvoice(payload)
+    def _simulated(self) -> bool:
+        return hasattr(self, 'sim') and not self.base_url
+
+    def _request(self, payload: Union[dict, CanonicalPayload], use_sandbox: bool) -> tuple[str, bytes, dict]:
+        """(url, body, headers) of a submission; reuses the bytes and signature of a cached payload."""
+        if isinstance(payload, CanonicalPayload):
+            body = payload.body
+            signature = payload.signature(self.private) if self.private else None
+        else:
+            body = canonical_bytes(payload)
+            signature = self._sign_payload(body)
 
         url_base = self.base_url
         if use_sandbox and self.settings.GSP_SANDBOX_URL:
@@ -74,27 +92,181 @@ class GSPClient:
         headers = {'Content-Type': 'application/json'}
         if signature:
             headers['X-Signature'] = signature
+        return url, body, headers
+
+    def _verify_response(self, text: str, headers) -> None:
+        # optionally verify response signature when public key available
+        if self.public and 'signature' in headers:
+            try:
+                verify_with_public(self.public, text.encode(), bytes.fromhex(headers['signature']))
+            except Exception:
+                # signature verification failed — log / raise in prod
+                pass
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff: uniform in [0, backoff ** attempt], capped at 60s."""
+        return random.uniform(0, min(60, self.backoff ** attempt))
+
+
+class GSPClient(_GSPClientBase):
+    """Production-ready GSP client with sandbox support and robust retries.
+
+    Behaviour:
+    - Reads configuration from `backend/app/config.get_settings()`.
+    - Loads private/public keys from provided bytes or file paths.
+    - If no `GSP_BASE_URL` set, falls back to simulated GSTN or sandbox.
+    - Sends through a keep-alive `requests.Session` pooling up to `GSP_POOL_SIZE` connections per host, so a
+      long-lived client (see `get_client`) pays the TCP/TLS handshake once rather than per submission.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, pem_private: Optional[bytes] = None,
+                 pem_public: Optional[bytes] = None, timeout: Optional[int] = None,
+                 guard: Optional[resilience.Guard] = None):
+        self._configure(base_url, pem_private, pem_public, timeout, guard)
+        self.http = requests.Session()
+        # retries are handled below, so the adapter itself doesn't retry
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.settings.GSP_POOL_SIZE, max_retries=0)
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+
+    def close(self) -> None:
+        self.http.close()
+
+    def submit_einvoice(self, payload: Union[dict, CanonicalPayload], use_sandbox: bool = False) -> dict:
+        """Submit an e-invoice payload to GSP/sandbox or to the simulated GSTN.
 
+        - `payload`: a payload dict, or a cached `CanonicalPayload` whose bytes and signature are reused.
+        - `use_sandbox`: when True and a sandbox URL is configured, send to sandbox.
+        """
+        # If using simulated GSTN, call locally
+        if self._simulated():
+            with self.guard.call():
+                return self.sim.submit_einvoice(payload.payload if isinstance(payload, CanonicalPayload) else payload)
+
+        url, body, headers = self._request(payload, use_sandbox)
         attempt = 0
         last_exc = None
         while attempt < max(1, self.retries):
             try:
-                r = requests.post(url, data=body, headers=headers, timeout=self.timeout)
-                r.raise_for_status()
-                # optionally verify response signature when public key available
-                resp_json = r.json()
-                if self.public and 'signature' in r.headers:
-                    try:
-                        verify_with_public(self.public, r.text.encode(), bytes.fromhex(r.headers['signature']))
-                    except Exception:
-                        # signature verification failed — log / raise in prod
-                        pass
+                # CircuitOpenError / LimiterTimeout are not retried: failing fast is the point
+                with self.guard.call():
+                    r = self.http.post(url, data=body, headers=headers, timeout=self.timeout)
+                    r.raise_for_status()
+                    resp_json = r.json()
+                self._verify_response(r.text, r.headers)
                 return resp_json
             except requests.RequestException as e:
                 last_exc = e
+                if not resilience.is_gsp_failure(e):
+                    # a 4xx rejects this payload; resending it won't help
+                    raise RuntimeError(f'GSP rejected the submission: {e}') from e
                 attempt += 1
-                sleep = (self.backoff ** attempt)
-                time.sleep(min(60, sleep))
+                if attempt < max(1, self.retries):
+                    time.sleep(self._backoff_delay(attempt))
 
         raise RuntimeError('GSP submission failed after retries') from last_exc
 
+
+class AsyncGSPClient(_GSPClientBase):
+    """asyncio variant of `GSPClient` for request handlers: HTTP via a pooled `httpx.AsyncClient` and backoff via
+    `asyncio.sleep`, so a slow or failing GSP parks coroutines instead of threadpool workers.
+
+    Each call has a deadline (`GSP_DEADLINE` seconds by default) covering every attempt and backoff; request
+    timeouts shrink to the time left, and no retry starts that could not finish in time.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, pem_private: Optional[bytes] = None,
+                 pem_public: Optional[bytes] = None, timeout: Optional[int] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, guard: Optional[resilience.Guard] = None):
+        self._configure(base_url, pem_private, pem_public, timeout, guard)
+        limits = httpx.Limits(max_connections=self.settings.GSP_POOL_SIZE, max_keepalive_connections=self.settings.GSP_POOL_SIZE)
+        self.http = httpx.AsyncClient(limits=limits, transport=transport)
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def apresign(self, payloads: Sequence[CanonicalPayload]) -> int:
+        """`presign` awaiting the signing pool instead of blocking the event loop."""
+        todo = self._unsigned(payloads)
+        if todo:
+            sigs = await signing.get_signing_service(self.private).sign_many_async([p.body for p in todo])
+            for p, sig in zip(todo, sigs):
+                p.add_signature(self.private, sig)
+        return len(todo)
+
+    async def submit_einvoice(self, payload: Union[dict, CanonicalPayload], use_sandbox: bool = False,
+                              deadline: Optional[float] = None) -> dict:
+        """Async `GSPClient.submit_einvoice`; raises RuntimeError once retries or the deadline (seconds) run out."""
+        loop = asyncio.get_running_loop()
+        budget = deadline if deadline is not None else self.settings.GSP_DEADLINE
+        expires = loop.time() + budget
+        if self._simulated():
+            # the simulator is synchronous (and may sleep to inject latency)
+            sim_payload = payload.payload if isinstance(payload, CanonicalPayload) else payload
+            try:
+                async with self.guard.acall():
+                    return await asyncio.wait_for(asyncio.to_thread(self.sim.submit_einvoice, sim_payload), budget)
+            except asyncio.TimeoutError as e:
+                raise RuntimeError('GSP submission failed after retries or deadline') from e
+
+        # RSA signing is CPU-bound: do it on the signing service / a worker thread, not on the event loop
+        if isinstance(payload, CanonicalPayload):
+            await self.apresign([payload])
+            url, body, headers = self._request(payload, use_sandbox)
+        elif self.private:
+            url, body, headers = await asyncio.to_thread(self._request, payload, use_sandbox)
+        else:
+            url, body, headers = self._request(payload, use_sandbox)
+        attempt = 0
+        last_exc = None
+        while attempt < max(1, self.retries):
+            remaining = expires - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                async with self.guard.acall():
+                    # wait_for bounds the whole exchange (connect, pool wait, body) by the deadline
+                    r = await asyncio.wait_for(self.http.post(url, content=body, headers=headers, timeout=min(self.timeout, remaining)), remaining)
+                    r.raise_for_status()
+                    resp_json = r.json()
+                self._verify_response(r.text, r.headers)
+                return resp_json
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                last_exc = e
+                if not resilience.is_gsp_failure(e):
+                    # a 4xx rejects this payload; resending it won't help
+                    raise RuntimeError(f'GSP rejected the submission: {e}') from e
+                attempt += 1
+                delay = self._backoff_delay(attempt)
+                if attempt >= max(1, self.retries) or loop.time() + delay >= expires:
+                    break
+                await asyncio.sleep(delay)
+
+        raise RuntimeError('GSP submission failed after retries or deadline') from last_exc
+
+
+_client: Optional[GSPClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GSPClient:
+    """Process-wide client configured from settings, shared by the API, batch submission and workers."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GSPClient()
+    return _client
+
+
+# event loop -> its client; httpx connections belong to the loop that opened them
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncGSPClient]' = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> AsyncGSPClient:
+    """Shared async client of the running event loop (the API's, in practice: one per process)."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = AsyncGSPClient()
+    return client
@@ -1,6 +1,7 @@
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
 from cryptography.hazmat.backends import default_backend
+from functools import lru_cache
 from typing import Tuple
 
 def generate_rsa_keypair(bits: int = 2048) -> Tuple[bytes, bytes]:
@@ -17,8 +18,17 @@ def generate_rsa_keypair(bits: int = 2048) -> Tuple[bytes, bytes]:
     )
     return pem_priv, pem_pub
 
+@lru_cache(maxsize=16)
+def load_private_key(pem_private: bytes):
+    """Parsed private key, cached per PEM so signing doesn't re-parse the key every time."""
+    return serialization.load_pem_private_key(pem_private, password=None, backend=default_backend())
+
+@lru_cache(maxsize=16)
+def load_public_key(pem_public: bytes):
+    return serialization.load_pem_public_key(pem_public, backend=default_backend())
+
 def sign_with_private(pem_private: bytes, message: bytes) -> bytes:
-    private_key = serialization.load_pem_private_key(pem_private, password=None, backend=default_backend())
+    private_key = load_private_key(pem_private)
     sig = private_key.sign(
         message,
         padding.PKCS1v15(),
@@ -27,7 +37,7 @@ def sign_with_private(pem_private: bytes, message: bytes) -> bytes:
     return sig
 
 def verify_with_public(pem_public: bytes, message: bytes, signature: bytes) -> bool:
-    public_key = serialization.load_pem_public_key(pem_public, backend=default_backend())
+    public_key = load_public_key(pem_public)
     try:
         public_key.verify(signature, message, padding.PKCS1v15(), hashes.SHA256())
         return True
@@ -0,0 +1,40 @@
+"""Tracking of autoincrement id ranges that were skipped because they had not committed yet.
+
+Ids are not committed in id order on Postgres: a transaction can commit id 41 after another committed id 42.
+Readers that catch up with `id > last_id` (the Parquet export, the ledger cache) keep every range a read skipped
+over as a gap `[first, last, seen]` and re-read the gaps on later runs until the rows appear or the gap is old
+enough to be ids of rolled-back transactions.
+"""
+from sqlalchemy import or_
+
+# gap ranges per OR'd `between` filter
+CHUNK = 200
+
+
+def missing_ranges(after_id: int, ids: list[int]) -> list[tuple[int, int]]:
+    """Id ranges above `after_id` that the ascending `ids` skip over."""
+    ranges, prev = [], after_id
+    for i in ids:
+        if i > prev + 1:
+            ranges.append((prev + 1, i - 1))
+        prev = i
+    return ranges
+
+
+def without(gaps: list[list], ids: list[int]) -> list[list]:
+    """Gap ranges with `ids` (now seen) removed, splitting ranges around them."""
+    found = sorted(ids)
+    out = []
+    for a, b, seen in gaps:
+        inside = [i for i in found if a <= i <= b]
+        out += [[x, y, seen] for x, y in missing_ranges(a - 1, inside + [b + 1])]
+    return out
+
+
+def contains(gaps: list[list], i: int) -> bool:
+    return any(a <= i <= b for a, b, _ in gaps)
+
+
+def filters(id_col, gaps: list[list]):
+    """`id_col` filters matching the gap ranges, `CHUNK` ranges each."""
+    return [or_(*(id_col.between(a, b) for a, b, _ in gaps[i:i + CHUNK])) for i in range(0, len(gaps), CHUNK)]
@@ -0,0 +1,499 @@
+"""Streaming bulk imports (NDJSON and CSV) of journals and exchange rates.
+
+The request body is consumed line by line; parsed journals are collected into batches of `batch_size` and
+posted with `crud.bulk_create_journals`, one transaction per batch. Only the current batch is held in memory.
+
+NDJSON: one `JournalCreate` object per line, e.g.
+    {"narration": "Payroll", "date": "2026-01-31", "lines": [{"account_id": 1, "debit": 10}, {"account_id": 2, "credit": 10}]}
+
+CSV: a header row `journal_ref,date,narration,account_id,debit,credit` followed by one row per ledger line.
+Consecutive rows sharing a `journal_ref` form one journal.
+
+Exchange rates (`RateImport`) use the same two formats with the fields `base,target,rate,timestamp` (an ISO date
+or datetime; timezone-aware values are stored as UTC). Rows are de-duplicated on (base, target, timestamp) within
+each batch and upserted, so re-importing a file or overlapping backfills replaces rates instead of duplicating
+them. FX caches are refreshed once when the import finishes.
+
+Invoices (`InvoiceImport`) are `InvoiceCreate` objects, either NDJSON or a single JSON array. The array is split
+into its top-level elements as the body streams in (`JSONArraySplitter`), so only the element being read and the
+current batch are held in memory. They are created with `crud.bulk_create_invoices` per batch, and the assigned
+ids are reported in input order.
+"""
+import codecs
+import csv
+import datetime
+import json
+import re
+from typing import AsyncIterator, Optional
+from sqlmodel import Session, select
+from sqlalchemy import delete, insert, tuple_
+from pydantic import ValidationError
+from . import models, schemas, crud, fx, money
+
+CSV_COLUMNS = ['journal_ref', 'date', 'narration', 'account_id', 'debit', 'credit']
+RATE_COLUMNS = ['base', 'target', 'rate', 'timestamp']
+
+
+async def aiter_text(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a stream of UTF-8 byte chunks, including characters split across chunks."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a stream of byte chunks into decoded text lines without buffering the whole body."""
+    pending = ''
+    async for text in aiter_text(chunks):
+        pending += text
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+    if pending:
+        yield pending.rstrip('\r')
+
+
+class JSONArraySplitter:
+    """Incrementally split the text of one JSON array into the source text of its top-level elements.
+
+    `feed` takes arbitrary pieces of the text and returns the elements completed so far; `close` checks that the
+    array ended. Only brackets, braces, commas and strings are tracked; each element is parsed on its own with
+    `json.loads`, which reports any other syntax error.
+    """
+    _STRUCTURE = re.compile(r'[\[\]{},"]')
+    _STRING = re.compile(r'[\\"]')
+
+    def __init__(self):
+        self._state = 'start'  # 'start' before '[', 'items' inside the array, 'end' after the closing ']'
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._parts: list[str] = []
+        self._count = 0
+        self._after_comma = False
+
+    def feed(self, text: str) -> list[str]:
+        items = []
+        pos, n = 0, len(text)
+        while pos < n:
+            if self._state == 'start':
+                while pos < n and text[pos].isspace():
+                    pos += 1
+                if pos == n:
+                    break
+                if text[pos] != '[':
+                    raise ValueError("Expected a JSON array of invoices")
+                self._state = 'items'
+                pos += 1
+            elif self._state == 'end':
+                if text[pos:].strip():
+                    raise ValueError("Invalid JSON array: data after the closing bracket")
+                break
+            elif self._escape:
+                self._parts.append(text[pos])
+                self._escape = False
+                pos += 1
+            elif self._in_string:
+                m = self._STRING.search(text, pos)
+                if not m:
+                    self._parts.append(text[pos:])
+                    break
+                self._parts.append(text[pos:m.end()])
+                pos = m.end()
+                if m.group() == '"':
+                    self._in_string = False
+                else:
+                    self._escape = True
+            else:
+                m = self._STRUCTURE.search(text, pos)
+                if not m:
+                    self._parts.append(text[pos:])
+                    break
+                ch = m.group()
+                if self._depth == 0 and ch in ',]':
+                    self._parts.append(text[pos:m.start()])
+                    pos = m.end()
+                    item = ''.join(self._parts).strip()
+                    self._parts = []
+                    if item:
+                        items.append(item)
+                        self._count += 1
+                    elif ch == ',' or self._after_comma or self._count:
+                        raise ValueError(f"Invalid JSON array: missing value after element {self._count}")
+                    self._after_comma = ch == ','
+                    if ch == ']':
+                        self._state = 'end'
+                    continue
+                self._parts.append(text[pos:m.end()])
+                pos = m.end()
+                if ch == '"':
+                    self._in_string = True
+                elif ch in '[{':
+                    self._depth += 1
+                elif self._depth == 0:
+                    raise ValueError(f"Invalid JSON array: unbalanced '{ch}' in element {self._count + 1}")
+                elif ch in ']}':
+                    self._depth -= 1
+        return items
+
+    def close(self) -> None:
+        if self._state != 'end':
+            raise ValueError("Invalid JSON array: the body ended before the closing bracket")
+
+
+class JournalImport:
+    """Incremental journal importer. Call `feed` per line, `flush` when it returns True, then `finish`."""
+
+    def __init__(self, fmt: str = 'ndjson', batch_size: int = 1000):
+        if fmt not in ('ndjson', 'csv'):
+            raise ValueError(f"Unsupported import format: {fmt}")
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.imported = 0
+        self.errors: list[dict] = []
+        self._row = 0
+        self._batch: list[tuple[int, models.JournalEntry, list[models.LedgerEntry], Optional[str]]] = []
+        self._csv_header: Optional[list[str]] = None
+        # (journal_ref, first row number, raw rows) of the CSV journal being assembled
+        self._csv_current: Optional[tuple[str, int, list[dict]]] = None
+
+    def feed(self, line: str) -> bool:
+        """Parse one line. Returns True when a full batch is ready to be flushed."""
+        self._row += 1
+        if not line.strip():
+            return False
+        if self.fmt == 'ndjson':
+            try:
+                data = schemas.JournalCreate(**json.loads(line))
+            except (ValueError, ValidationError) as e:
+                self._error(self._row, e)
+                return False
+            self._add(self._row, data)
+        else:
+            self._feed_csv(line)
+        return len(self._batch) >= self.batch_size
+
+    def _feed_csv(self, line: str) -> None:
+        values = next(csv.reader([line]))
+        if self._csv_header is None:
+            header = [v.strip().lower() for v in values]
+            missing = [c for c in CSV_COLUMNS if c not in header]
+            if missing:
+                raise ValueError(f"CSV header missing columns: {', '.join(missing)}")
+            self._csv_header = header
+            return
+        row = dict(zip(self._csv_header, values))
+        ref = row.get('journal_ref', '')
+        if self._csv_current and self._csv_current[0] != ref:
+            self._close_csv_journal()
+        if not self._csv_current:
+            self._csv_current = (ref, self._row, [])
+        self._csv_current[2].append(row)
+
+    def _close_csv_journal(self) -> None:
+        if not self._csv_current:
+            return
+        ref, first_row, rows = self._csv_current
+        self._csv_current = None
+        try:
+            data = schemas.JournalCreate(
+                narration=rows[0].get('narration') or None,
+                date=rows[0].get('date') or None,
+                lines=[
+                    schemas.LedgerLine(account_id=r['account_id'], debit=r.get('debit') or 0.0, credit=r.get('credit') or 0.0)
+                    for r in rows
+                ],
+            )
+        except (ValueError, ValidationError) as e:
+            self._error(first_row, e, ref)
+            return
+        self._add(first_row, data, ref)
+
+    def _add(self, row: int, data: schemas.JournalCreate, ref: Optional[str] = None) -> None:
+        lines = [models.LedgerEntry(account_id=ln.account_id, debit=ln.debit, credit=ln.credit) for ln in data.lines]
+        if not lines:
+            self._error(row, 'Journal has no lines', ref)
+            return
+        # balance is checked in flush(), once the account currency exponents are known
+        journal = models.JournalEntry(narration=data.narration, date=data.date or datetime.date.today())
+        self._batch.append((row, journal, lines, ref))
+
+    def _error(self, row: int, error, ref: Optional[str] = None) -> None:
+        entry = {"row": row, "error": str(error)}
+        if ref is not None:
+            entry["journal_ref"] = ref
+        self.errors.append(entry)
+
+    def flush(self, session: Session) -> None:
+        """Post the pending batch in one transaction; on failure every journal in the batch is reported."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        # every check bulk_create_journals makes is repeated here per journal, so one bad journal is reported on
+        # its own row instead of failing the whole batch
+        account_ids = {l.account_id for _, _, lines, _ in batch for l in lines}
+        known = set(session.exec(select(models.Account.id).where(models.Account.id.in_(account_ids))).all())
+        exponents = money.account_exponents(session, known)
+        closed = crud._latest_closed_period(session)
+        postable = []
+        for row, journal, lines, ref in batch:
+            unknown = sorted({l.account_id for l in lines} - known)
+            if unknown:
+                self._error(row, f"Unknown account id(s): {unknown}", ref)
+                continue
+            if closed and journal.date <= closed.end_date:
+                self._error(row, f"Period closed: cannot post journals dated on or before {closed.end_date}", ref)
+                continue
+            try:
+                crud._check_balanced(lines, exponents)
+            except ValueError as e:
+                self._error(row, e, ref)
+                continue
+            postable.append((row, journal, lines, ref))
+        try:
+            crud.bulk_create_journals(session, [(journal, lines) for _, journal, lines, _ in postable])
+        except Exception as e:
+            session.rollback()
+            for row, _, _, ref in postable:
+                self._error(row, e, ref)
+            return
+        self.imported += len(postable)
+
+    def finish(self, session: Session) -> dict:
+        if self.fmt == 'csv':
+            self._close_csv_journal()
+        self.flush(session)
+        self.errors.sort(key=lambda e: e["row"])
+        return {"imported": self.imported, "failed": len(self.errors), "errors": self.errors}
+
+
+def _parse_timestamp(value) -> datetime.datetime:
+    ts = datetime.datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _upsert_rates(session: Session, rows: list[dict]) -> None:
+    """Insert rates, replacing the rate of any existing (base, target, timestamp)."""
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(models.ExchangeRate)
+        stmt = stmt.on_conflict_do_update(index_elements=['base', 'target', 'timestamp'], set_={'rate': stmt.excluded.rate})
+        session.execute(stmt, rows)
+        return
+    key = tuple_(models.ExchangeRate.base, models.ExchangeRate.target, models.ExchangeRate.timestamp)
+    session.execute(delete(models.ExchangeRate).where(key.in_([(r['base'], r['target'], r['timestamp']) for r in rows])))
+    session.execute(insert(models.ExchangeRate), rows)
+
+
+class RateImport:
+    """Incremental exchange-rate importer with the same feed/flush/finish protocol as `JournalImport`."""
+
+    def __init__(self, fmt: str = 'ndjson', batch_size: int = 5000):
+        if fmt not in ('ndjson', 'csv'):
+            raise ValueError(f"Unsupported import format: {fmt}")
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.upserted = 0
+        self.duplicates = 0
+        self.errors: list[dict] = []
+        self._row = 0
+        # (base, target, timestamp) -> (row number, rate); a later row for the same key wins
+        self._batch: dict[tuple[str, str, datetime.datetime], tuple[int, float]] = {}
+        self._csv_header: Optional[list[str]] = None
+
+    def feed(self, line: str) -> bool:
+        """Parse one line. Returns True when a full batch is ready to be flushed."""
+        self._row += 1
+        if not line.strip():
+            return False
+        if self.fmt == 'csv':
+            values = next(csv.reader([line]))
+            if self._csv_header is None:
+                header = [v.strip().lower() for v in values]
+                missing = [c for c in RATE_COLUMNS if c not in header]
+                if missing:
+                    raise ValueError(f"CSV header missing columns: {', '.join(missing)}")
+                self._csv_header = header
+                return False
+            data = dict(zip(self._csv_header, values))
+        else:
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                self._error(self._row, e)
+                return False
+        try:
+            base, target = str(data['base']).strip().upper(), str(data['target']).strip().upper()
+            rate = float(data['rate'])
+            ts = _parse_timestamp(data['timestamp'])
+        except (KeyError, TypeError, ValueError) as e:
+            self._error(self._row, e if not isinstance(e, KeyError) else f"Missing field {e}")
+            return False
+        if base == target or not rate > 0:
+            self._error(self._row, 'Rate must be positive between two different currencies')
+            return False
+        key = (base, target, ts)
+        if key in self._batch:
+            self.duplicates += 1
+        self._batch[key] = (self._row, rate)
+        return len(self._batch) >= self.batch_size
+
+    def _error(self, row: int, error) -> None:
+        self.errors.append({"row": row, "error": str(error)})
+
+    def flush(self, session: Session) -> None:
+        """Upsert the pending batch in one transaction; on failure every row in the batch is reported."""
+        batch, self._batch = self._batch, {}
+        if not batch:
+            return
+        codes = {c for base, target, _ in batch for c in (base, target)}
+        known = set(session.exec(select(models.Currency.code).where(models.Currency.code.in_(codes))).all())
+        postable = []
+        for (base, target, ts), (row, rate) in batch.items():
+            unknown = sorted({base, target} - known)
+            if unknown:
+                self._error(row, f"Unknown currency code(s): {unknown}")
+            else:
+                postable.append((row, {"base": base, "target": target, "timestamp": ts, "rate": rate}))
+        if not postable:
+            return
+        try:
+            _upsert_rates(session, [values for _, values in postable])
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            for row, _ in postable:
+                self._error(row, e)
+            return
+        self.upserted += len(postable)
+
+    def finish(self, session: Session) -> dict:
+        self.flush(session)
+        if self.upserted:
+            fx.publish_invalidate()
+        self.errors.sort(key=lambda e: e["row"])
+        return {"upserted": self.upserted, "duplicates": self.duplicates, "failed": len(self.errors), "errors": self.errors}
+
+
+class InvoiceImport:
+    """Incremental invoice importer with the same feed/flush/finish protocol as `JournalImport`.
+
+    `fmt='auto'` treats a body whose first non-blank character is `[` as a JSON array, otherwise NDJSON. Error
+    rows are 1-based record numbers, which also index `invoice_ids`.
+    """
+
+    def __init__(self, fmt: str = 'auto', batch_size: int = 1000):
+        if fmt not in ('auto', 'ndjson', 'json'):
+            raise ValueError(f"Unsupported import format: {fmt}")
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.imported = 0
+        self.errors: list[dict] = []
+        # assigned id per input record (None for rejected ones)
+        self.invoice_ids: list[Optional[int]] = []
+        self._row = 0
+        self._batch: list[tuple[int, models.Invoice, list[models.InvoiceLine]]] = []
+        self._array = JSONArraySplitter()
+        self._pending = ''
+
+    def _detect(self, text: str) -> None:
+        if self.fmt == 'auto' and text.strip():
+            self.fmt = 'json' if text.lstrip().startswith('[') else 'ndjson'
+
+    def _record(self, text: str) -> None:
+        self._row += 1
+        self.invoice_ids.append(None)
+        try:
+            self._add(self._row, json.loads(text))
+        except ValueError as e:
+            self._error(self._row, e)
+
+    def feed(self, line: str) -> bool:
+        """Parse one line. Returns True when a full batch is ready to be flushed."""
+        self._detect(line)
+        if self.fmt == 'json':
+            return self.feed_text(line + '\n')
+        if line.strip():
+            self._record(line)
+        return len(self._batch) >= self.batch_size
+
+    def feed_text(self, text: str) -> bool:
+        """Parse an arbitrary piece of the body (e.g. a decoded network chunk), so a JSON array on a single line
+        is not buffered whole. Returns True when at least a full batch is ready to be flushed."""
+        self._detect(text)
+        if self.fmt == 'json':
+            for item in self._array.feed(text):
+                self._record(item)
+            return len(self._batch) >= self.batch_size
+        self._pending += text
+        *lines, self._pending = self._pending.split('\n')
+        for line in lines:
+            if line.strip():
+                self._record(line)
+        return len(self._batch) >= self.batch_size
+
+    def _add(self, row: int, data) -> None:
+        try:
+            data = schemas.InvoiceCreate(**data)
+        except (TypeError, ValidationError) as e:
+            self._error(row, e)
+            return
+        inv = models.Invoice(**data.dict(exclude={'lines'}))
+        inv.currency = inv.currency.upper()
+        lines = [models.InvoiceLine(**ln.dict()) for ln in data.lines]
+        self._batch.append((row, inv, lines))
+
+    def _error(self, row: int, error) -> None:
+        self.errors.append({"row": row, "error": str(error)})
+
+    def flush(self, session: Session) -> None:
+        """Create the pending batch in one transaction; on failure every invoice in the batch is reported."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        numbers = [inv.invoice_number for _, inv, _ in batch]
+        codes = {inv.currency for _, inv, _ in batch}
+        known = set(session.exec(select(models.Currency.code).where(models.Currency.code.in_(codes))).all())
+        taken = set(session.exec(select(models.Invoice.invoice_number).where(models.Invoice.invoice_number.in_(numbers))).all())
+        postable = []
+        for row, inv, lines in batch:
+            if inv.currency not in known:
+                self._error(row, f"Unknown currency code: {inv.currency}")
+            elif inv.invoice_number in taken:
+                self._error(row, f"Invoice number already exists: {inv.invoice_number}")
+            else:
+                taken.add(inv.invoice_number)
+                postable.append((row, inv, lines))
+        if not postable:
+            return
+        try:
+            ids = crud.bulk_create_invoices(session, [(inv, lines) for _, inv, lines in postable])
+        except Exception as e:
+            session.rollback()
+            for row, _, _ in postable:
+                self._error(row, e)
+            return
+        for (row, _, _), invoice_id in zip(postable, ids):
+            self.invoice_ids[row - 1] = invoice_id
+        self.imported += len(postable)
+
+    def finish(self, session: Session) -> dict:
+        if self.fmt == 'json':
+            self._array.close()
+        elif self._pending.strip():
+            self._record(self._pending)
+        self._pending = ''
+        self.flush(session)
+        self.errors.sort(key=lambda e: e["row"])
+        return {"imported": self.imported, "invoice_ids": self.invoice_ids, "failed": len(self.errors), "errors": self.errors}
@@ -2,6 +2,9 @@
 
 These are simple interfaces and simulated implementations used by the prototype.
 """
+import random
+import threading
+import time
 from typing import Protocol, Optional, Dict
 
 
@@ -14,7 +17,13 @@ class GSTNClient(Protocol):
 
 
 class SimulatedGSTN:
+    def __init__(self, latency: float = 0.0):
+        # seconds slept per call, to exercise concurrent submission against a realistic round trip
+        self.latency = latency
+
     def submit_einvoice(self, payload: dict) -> Dict:
+        if self.latency:
+            time.sleep(self.latency)
         # simulate assigning an IRN
         return {"status": "IRN_ASSIGNED", "irn": f"IRN-SIM-{payload.get('invoice_number', '0')}"}
 
@@ -22,6 +31,41 @@ class SimulatedGSTN:
         return {"irn": irn, "status": "VALID"}
 
 
+class FaultyGSTN(SimulatedGSTN):
+    """SimulatedGSTN with injected faults, for exercising retries, the circuit breaker and the concurrency limit.
+
+    `failure_rate` of calls (seeded, so runs are reproducible) raise `ConnectionError`; `fail_next(n)` forces the
+    next n calls to fail and `set_healthy()` clears both. `latency` applies to every call.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        super().__init__(latency)
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._forced = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fail_next(self, n: int) -> None:
+        with self._lock:
+            self._forced = n
+
+    def set_healthy(self) -> None:
+        with self._lock:
+            self._forced, self.failure_rate = 0, 0.0
+
+    def submit_einvoice(self, payload: dict) -> Dict:
+        with self._lock:
+            self.calls += 1
+            fail = self._forced > 0 or self._random.random() < self.failure_rate
+            self._forced = max(0, self._forced - 1)
+        if fail:
+            if self.latency:
+                time.sleep(self.latency)
+            raise ConnectionError('injected GSTN fault')
+        return super().submit_einvoice(payload)
+
+
 class BankConnector(Protocol):
     def fetch_statements(self, account_id: int, since: str) -> list:
         ...
@@ -0,0 +1,269 @@
+"""In-process columnar read model of the ledger for dashboard reports.
+
+Keeps every `LedgerEntry` as NumPy columns (entry id, account id, journal date as epoch days, debit/credit in
+minor units). Reports group the columns with `np.bincount` keyed on account id (and month), so they are single
+vectorized passes that take milliseconds on a few million lines while staying exact integer sums.
+
+The cache is loaded at startup when `LEDGER_CACHE_ENABLED` is set, appended to by every `crud` posting path after
+its commit, and caught up with `sync()` (rows with an id above the last one seen) before each report, which also
+picks up posts made by other processes. A lower id can commit after a higher one, so `sync` keeps the id ranges it
+skipped as gaps (see `idgaps`) and re-reads them on later syncs for `gap_grace` seconds.
+`check_consistency` compares the cache with the SQL balances.
+"""
+import datetime
+import threading
+import time
+from typing import Optional
+import numpy as np
+from sqlmodel import Session, select
+from sqlalchemy import func
+from . import idgaps, models, money
+from .config import get_settings
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def _day(d: datetime.date) -> int:
+    return (d - _EPOCH).days
+
+
+class LedgerCache:
+    def __init__(self, initial_capacity: int = 1024, gap_grace: float = 3600.0):
+        self._lock = threading.RLock()
+        self.gap_grace = gap_grace
+        self._reset(initial_capacity)
+
+    def _reset(self, initial_capacity: int = 1024) -> None:
+        self._size = 0
+        self._ids = np.empty(initial_capacity, dtype=np.int64)
+        self._account = np.empty(initial_capacity, dtype=np.int64)
+        self._day = np.empty(initial_capacity, dtype=np.int32)
+        self._month = np.empty(initial_capacity, dtype=np.int32)  # months since 1970-01
+        self._debit = np.empty(initial_capacity, dtype=np.int64)
+        self._credit = np.empty(initial_capacity, dtype=np.int64)
+        self._synced_id = 0
+        # ids appended by the post hook but not yet covered by sync(), so sync doesn't add them twice
+        self._appended: set[int] = set()
+        # [first, last, monotonic time first seen] id ranges below the sync point that had not committed yet
+        self._gaps: list[list] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        if needed <= len(self._ids):
+            return
+        capacity = max(needed, 2 * len(self._ids))
+        for name in ('_ids', '_account', '_day', '_month', '_debit', '_credit'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, rows: list[tuple[int, int, datetime.date, int, int]], from_sync: bool = False) -> None:
+        """Append `(entry_id, account_id, date, debit_minor, credit_minor)` rows."""
+        with self._lock:
+            if from_sync:
+                rows = [r for r in rows if r[0] not in self._appended]
+            else:
+                # an id at or below the sync point is new only if it committed after sync() skipped over it
+                rows = [r for r in rows if r[0] not in self._appended
+                        and (r[0] > self._synced_id or idgaps.contains(self._gaps, r[0]))]
+                self._appended.update(r[0] for r in rows if r[0] > self._synced_id)
+                late = [r[0] for r in rows if r[0] <= self._synced_id]
+                if late:
+                    self._gaps = idgaps.without(self._gaps, late)
+            if not rows:
+                return
+            self._reserve(len(rows))
+            n, m = self._size, self._size + len(rows)
+            self._ids[n:m] = [r[0] for r in rows]
+            self._account[n:m] = [r[1] for r in rows]
+            self._day[n:m] = [_day(r[2]) for r in rows]
+            self._month[n:m] = [(r[2].year - 1970) * 12 + r[2].month - 1 for r in rows]
+            self._debit[n:m] = [r[3] for r in rows]
+            self._credit[n:m] = [r[4] for r in rows]
+            self._size = m
+
+    def sync(self, session: Session, batch_size: int = 100000) -> int:
+        """Load ledger rows with an id above the last synced one, or inside an earlier gap. Returns rows added."""
+        query = (
+            select(models.LedgerEntry.id, models.LedgerEntry.account_id, models.JournalEntry.date,
+                   models.LedgerEntry.debit_minor, models.LedgerEntry.credit_minor)
+            .join(models.JournalEntry, models.JournalEntry.id == models.LedgerEntry.journal_id)
+        )
+        added = 0
+        with self._lock:
+            now = time.monotonic()
+            if self._gaps:
+                late = []
+                for ranges in idgaps.filters(models.LedgerEntry.id, self._gaps):
+                    late += session.exec(query.where(ranges).order_by(models.LedgerEntry.id)).all()
+                if late:
+                    before = self._size
+                    self.append(late, from_sync=True)
+                    added += self._size - before
+                    self._gaps = idgaps.without(self._gaps, [r[0] for r in late])
+                self._gaps = [g for g in self._gaps if now - g[2] <= self.gap_grace]
+            while True:
+                rows = session.exec(query.where(models.LedgerEntry.id > self._synced_id)
+                                    .order_by(models.LedgerEntry.id).limit(batch_size)).all()
+                if not rows:
+                    break
+                before = self._size
+                self.append(rows, from_sync=True)
+                added += self._size - before
+                # ids the post hook appended after this query's snapshot are skipped over but already cached
+                skipped = [[a, b, now] for a, b in idgaps.missing_ranges(self._synced_id, [r[0] for r in rows])]
+                self._gaps += idgaps.without(skipped, [i for i in self._appended if i <= rows[-1][0]])
+                self._synced_id = rows[-1][0]
+                self._appended = {i for i in self._appended if i > self._synced_id}
+        return added
+
+    def load(self, session: Session) -> int:
+        with self._lock:
+            self._reset()
+            return self.sync(session)
+
+    def _columns(self):
+        with self._lock:
+            n = self._size
+            return self._account[:n], self._day[:n], self._month[:n], self._debit[:n], self._credit[:n]
+
+    def account_totals(self, as_of: Optional[datetime.date] = None, date_from: Optional[datetime.date] = None,
+                       date_to: Optional[datetime.date] = None) -> dict[int, tuple[int, int]]:
+        """{account_id: (debit_minor, credit_minor)} for journals in the optional date window."""
+        account, day, _, debit, credit = self._columns()
+        mask = _date_mask(day, date_from, min(filter(None, (as_of, date_to)), default=None))
+        if mask is not None:
+            account, debit, credit = account[mask], debit[mask], credit[mask]
+        if not len(account):
+            return {}
+        # account ids are dense autoincrement keys, so they index the bins directly
+        size = int(account.max()) + 1
+        d, c = _group_sum(account, debit, size), _group_sum(account, credit, size)
+        return {int(a): (int(d[a]), int(c[a])) for a in np.flatnonzero(d | c)}
+
+    def monthly_movements(self, account_id: Optional[int] = None, date_from: Optional[datetime.date] = None,
+                          date_to: Optional[datetime.date] = None) -> list[tuple[int, str, int, int]]:
+        """[(account_id, 'YYYY-MM', debit_minor, credit_minor)] per account per calendar month."""
+        account, day, month, debit, credit = self._columns()
+        mask = _date_mask(day, date_from, date_to)
+        if account_id is not None:
+            mask = (account == account_id) if mask is None else mask & (account == account_id)
+        if mask is not None:
+            account, month, debit, credit = account[mask], month[mask], debit[mask], credit[mask]
+        if not len(account):
+            return []
+        first_month = int(month.min())
+        span = int(month.max()) - first_month + 1
+        key = account * span + (month - first_month)
+        # group on the distinct keys only: account id x months spanned can be millions of mostly empty bins
+        keys, inverse = np.unique(key, return_inverse=True)
+        d, c = _group_sum(inverse, debit, len(keys)), _group_sum(inverse, credit, len(keys))
+        return [
+            (int(k // span), str(np.datetime64(int(k % span) + first_month, 'M')), int(d[i]), int(c[i]))
+            for i, k in enumerate(keys) if d[i] or c[i]
+        ]
+
+
+def _date_mask(day: np.ndarray, date_from: Optional[datetime.date], date_to: Optional[datetime.date]) -> Optional[np.ndarray]:
+    mask = None
+    if date_from:
+        mask = day >= _day(date_from)
+    if date_to:
+        upper = day <= _day(date_to)
+        mask = upper if mask is None else mask & upper
+    return mask
+
+
+# float64 bincount sums are exact while every partial sum stays below 2**53
+_EXACT_LIMIT = 2 ** 53
+
+
+def _group_sum(keys: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Exact per-key sums of non-negative minor amounts: `np.bincount` while float64 can't round, else `np.add.at`."""
+    if len(values) * int(values.max()) < _EXACT_LIMIT:
+        return np.bincount(keys, weights=values, minlength=size).astype(np.int64)
+    out = np.zeros(size, dtype=np.int64)
+    np.add.at(out, keys, values)
+    return out
+
+
+_cache: Optional[LedgerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LedgerCache]:
+    """Return the process-wide cache, or None when `LEDGER_CACHE_ENABLED` is off."""
+    global _cache
+    if not get_settings().LEDGER_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LedgerCache()
+    return _cache
+
+
+def is_active() -> bool:
+    """Whether the process-wide cache exists, so posting paths can skip building hook rows."""
+    return _cache is not None
+
+
+def notify_posted(rows: list[tuple[int, int, datetime.date, int, int]]) -> None:
+    """Post hook called by `crud` after a journal commits; no-op unless the cache is active."""
+    if _cache is not None:
+        _cache.append(rows)
+
+
+def _account_meta(session: Session) -> dict[int, tuple[str, str, int]]:
+    exponent = func.coalesce(models.Currency.exponent, money.DEFAULT_EXPONENT)
+    q = (
+        select(models.Account.id, models.Account.name, models.Account.currency, exponent)
+        .outerjoin(models.Currency, models.Currency.code == models.Account.currency)
+    )
+    return {acc_id: (name, currency, exp) for acc_id, name, currency, exp in session.exec(q).all()}
+
+
+def trial_balance(session: Session, cache: LedgerCache, as_of: Optional[datetime.date] = None) -> list[dict]:
+    cache.sync(session)
+    totals = cache.account_totals(as_of=as_of)
+    report = []
+    for acc_id, (name, currency, exp) in sorted(_account_meta(session).items()):
+        debit, credit = totals.get(acc_id, (0, 0))
+        report.append({
+            "account_id": acc_id, "account_name": name, "currency": currency,
+            "debit": money.from_minor(debit, exp), "credit": money.from_minor(credit, exp),
+            "balance": money.from_minor(debit - credit, exp), "balance_minor": debit - credit,
+        })
+    return report
+
+
+def movements(session: Session, cache: LedgerCache, account_id: Optional[int] = None,
+              date_from: Optional[datetime.date] = None, date_to: Optional[datetime.date] = None) -> list[dict]:
+    cache.sync(session)
+    meta = _account_meta(session)
+    rows = []
+    for acc_id, month, debit, credit in cache.monthly_movements(account_id, date_from, date_to):
+        exp = meta.get(acc_id, (None, None, money.DEFAULT_EXPONENT))[2]
+        rows.append({"account_id": acc_id, "month": month, "debit": money.from_minor(debit, exp),
+                     "credit": money.from_minor(credit, exp), "net": money.from_minor(debit - credit, exp)})
+    return rows
+
+
+def check_consistency(session: Session, cache: LedgerCache) -> list[dict]:
+    """Compare cached per-account totals with a SQL aggregate of the ledger; returns mismatching accounts."""
+    cache.sync(session)
+    q = (
+        select(models.LedgerEntry.account_id, func.sum(models.LedgerEntry.debit_minor), func.sum(models.LedgerEntry.credit_minor))
+        .where(models.LedgerEntry.id <= cache._synced_id)
+        .group_by(models.LedgerEntry.account_id)
+    )
+    expected = {acc_id: (int(d or 0), int(c or 0)) for acc_id, d, c in session.exec(q).all()}
+    cached = cache.account_totals()
+    mismatches = []
+    for acc_id in sorted(set(expected) | set(cached)):
+        if expected.get(acc_id, (0, 0)) != cached.get(acc_id, (0, 0)):
+            mismatches.append({"account_id": acc_id, "sql": expected.get(acc_id, (0, 0)), "cache": cached.get(acc_id, (0, 0))})
+    return mismatches
@@ -1,11 +1,16 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
+import datetime
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('biznooks')
-from fastapi import UploadFile, File
+from fastapi import UploadFile, File, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+import csv
+import io
 from sqlmodel import Session
-from . import models, schemas, crud, database
+from . import models, schemas, crud, database, imports, posting, ledger_cache, fx, revaluation, einvoice, gsp_batch, gsp_client, resilience
 from .storage import storage
 from .auth import get_current_user_optional, get_current_user, require_role
 
@@ -19,6 +24,12 @@ app.add_middleware(SimpleRateLimiter, calls_per_minute=600)
 @app.on_event("startup")
 def on_startup():
     database.init_db()
+    cache = ledger_cache.get_cache()
+    if cache is not None:
+        with next(database.get_session()) as session:
+            logger.info('Ledger cache loaded: %d lines', cache.load(session))
+    if fx.start_listener():
+        logger.info('Listening for FX rate updates')
 
 
 @app.post("/currencies")
@@ -27,7 +38,7 @@ def add_currency(data: schemas.CurrencyCreate, user=Depends(get_current_user)):
     if not require_role(user, 'admin'):
         raise HTTPException(status_code=403, detail='admin role required')
     with next(database.get_session()) as session:
-        cur = models.Currency(code=data.code.upper(), name=data.name)
+        cur = models.Currency(code=data.code.upper(), name=data.name, exponent=data.exponent)
         return crud.create_currency(session, cur)
 
 
@@ -38,6 +49,25 @@ def add_rate(data: schemas.ExchangeRateCreate):
         return crud.create_exchange_rate(session, rate)
 
 
+@app.post("/rates/bulk")
+async def import_rates(request: Request, format: str | None = None, batch_size: int = 5000):
+    """Bulk-upsert exchange rates from an NDJSON or CSV request body (see `app.imports.RateImport`)."""
+    fmt = format or ('csv' if 'csv' in request.headers.get('content-type', '') else 'ndjson')
+    try:
+        job = imports.RateImport(fmt, batch_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with next(database.get_session()) as session:
+        async for line in imports.aiter_lines(request.stream()):
+            try:
+                ready = job.feed(line)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if ready:
+                await run_in_threadpool(job.flush, session)
+        return await run_in_threadpool(job.finish, session)
+
+
 @app.post("/accounts")
 def add_account(data: schemas.AccountCreate, user=Depends(get_current_user)):
     # require admin role to create accounts
@@ -55,13 +85,42 @@ def add_journal(data: schemas.JournalCreate):
         lines = []
         for ln in data.lines:
             lines.append(models.LedgerEntry(account_id=ln.account_id, debit=ln.debit, credit=ln.credit))
+        committer = posting.get_group_committer()
         try:
-            created = crud.create_journal(session, journal, lines)
+            if committer:
+                created = committer.post(journal, lines)
+            else:
+                created = crud.create_journal(session, journal, lines)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
+        except TimeoutError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         return {"journal_id": created.id}
 
 
+@app.post("/journals/import")
+async def import_journals(request: Request, format: str | None = None, batch_size: int = 1000):
+    """Bulk-import journals from an NDJSON or CSV request body (see `app.imports`).
+
+    The body is streamed and posted in batches of `batch_size` journals per transaction. Returns the number
+    imported and a per-row error report.
+    """
+    fmt = format or ('csv' if 'csv' in request.headers.get('content-type', '') else 'ndjson')
+    try:
+        job = imports.JournalImport(fmt, batch_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with next(database.get_session()) as session:
+        async for line in imports.aiter_lines(request.stream()):
+            try:
+                ready = job.feed(line)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if ready:
+                await run_in_threadpool(job.flush, session)
+        return await run_in_threadpool(job.finish, session)
+
+
 @app.post("/invoices")
 def add_invoice(data: schemas.InvoiceCreate):
     with next(database.get_session()) as session:
@@ -79,18 +138,61 @@ def add_invoice(data: schemas.InvoiceCreate):
         lines = []
         for ln in data.lines:
             lines.append(models.InvoiceLine(description=ln.description, quantity=ln.quantity, unit_rate=ln.unit_rate, amount=ln.amount, igst=ln.igst, cgst=ln.cgst, sgst=ln.sgst))
-        created = crud.create_invoice(session, inv, lines)
+        try:
+            created = crud.create_invoice(session, inv, lines)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         return {"invoice_id": created.id}
 
 
+@app.get("/invoices")
+def list_invoices(cursor: str | None = None, limit: int = Query(default=100, ge=1, le=1000),
+                  start: datetime.date | None = None, end: datetime.date | None = None,
+                  customer_gstin: str | None = None, einvoice_status: str | None = None, is_export: bool | None = None,
+                  currency: str | None = None, q: str | None = None, include_totals: bool = False):
+    """Invoices newest first. `q` is an invoice number or customer name prefix; pass `next_cursor` back as `cursor`."""
+    with next(database.get_session()) as session:
+        try:
+            return crud.list_invoices(session, cursor=cursor, limit=limit, start=start, end=end,
+                                      customer_gstin=customer_gstin, einvoice_status=einvoice_status, is_export=is_export,
+                                      currency=currency.upper() if currency else None, q=q, include_totals=include_totals)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/invoices/bulk")
+async def import_invoices(request: Request, format: str = 'auto', batch_size: int = 1000):
+    """Create invoices from a JSON array or NDJSON request body of `InvoiceCreate` objects (see `app.imports`).
+
+    Invoices are created in batches of `batch_size` per transaction. Returns the number imported, the assigned
+    ids in input order (null for rejected invoices) and a per-record error report.
+    """
+    try:
+        job = imports.InvoiceImport(format, batch_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with next(database.get_session()) as session:
+        try:
+            async for text in imports.aiter_text(request.stream()):
+                if job.feed_text(text):
+                    await run_in_threadpool(job.flush, session)
+            return await run_in_threadpool(job.finish, session)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/invoices/{invoice_id}/einvoice_payload")
-def get_einvoice_payload(invoice_id: int):
+def get_einvoice_payload(invoice_id: int, request: Request):
+    """Canonical JSON payload, served from the per-invoice cache with an ETag; `If-None-Match` gets a 304."""
     with next(database.get_session()) as session:
         try:
-            payload = crud.build_einvoice_payload(session, invoice_id)
+            entry = einvoice.get_payload_cache().get(session, invoice_id)
         except ValueError as e:
             raise HTTPException(status_code=404, detail=str(e))
-        return payload
+    headers = {"ETag": entry.etag}
+    if entry.matches(request.headers.get('if-none-match')):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type='application/json', headers=headers)
 
 
 @app.post("/invoices/{invoice_id}/submit_einvoice")
@@ -109,6 +211,16 @@ def submit_einvoice(invoice_id: int):
         return {"invoice_id": inv.id, "irn": irn, "status": inv.einvoice_status}
 
 
+@app.post("/einvoice/submit_batch")
+def submit_einvoice_batch(data: schemas.EInvoiceBatchSubmit):
+    """Submit many invoices to the GSP concurrently (see `app.gsp_batch`); reports the outcome per invoice."""
+    if data.invoice_ids is None and data.start is None and data.end is None:
+        raise HTTPException(status_code=400, detail="Provide invoice_ids or a start/end date range")
+    with next(database.get_session()) as session:
+        ids = data.invoice_ids if data.invoice_ids is not None else crud.unsubmitted_invoice_ids(session, data.start, data.end)
+        return gsp_batch.submit_batch(session, ids, concurrency=data.concurrency)
+
+
 @app.post("/tds_deductions")
 def add_tds_deduction(data: schemas.TDSDeductionCreate):
     with next(database.get_session()) as session:
@@ -139,22 +251,113 @@ def add_ewaybill(data: schemas.EWaybillCreate):
 
 
 @app.get("/accounts/{account_id}/balance")
-def account_balance(account_id: int, target_currency: str | None = None):
+def account_balance(account_id: int, target_currency: str | None = None, as_of: datetime.date | None = None):
     with next(database.get_session()) as session:
         try:
-            res = crud.get_account_balance(session, account_id, target_currency)
+            res = crud.get_account_balance(session, account_id, target_currency, as_of=as_of)
         except ValueError as e:
             raise HTTPException(status_code=404, detail=str(e))
         return res
 
 
+@app.get("/accounts/{account_id}/ledger")
+def account_ledger(account_id: int, cursor: str | None = None, limit: int = Query(default=500, ge=1, le=5000),
+                   start: datetime.date | None = None, end: datetime.date | None = None):
+    """Account statement page with running balance. Pass `next_cursor` back as `cursor` for the next page."""
+    with next(database.get_session()) as session:
+        try:
+            return crud.account_ledger(session, account_id, cursor=cursor, limit=limit, start=start, end=end)
+        except ValueError as e:
+            status = 404 if 'not found' in str(e) else 400
+            raise HTTPException(status_code=status, detail=str(e))
+
+
+@app.get("/accounts/{account_id}/ledger.csv")
+def account_ledger_csv(account_id: int, start: datetime.date | None = None, end: datetime.date | None = None):
+    """Full account statement as streamed CSV; memory stays flat regardless of statement length."""
+    with next(database.get_session()) as session:
+        if not session.get(models.Account, account_id):
+            raise HTTPException(status_code=404, detail="Account not found")
+
+    def generate():
+        columns = ["entry_id", "journal_id", "date", "narration", "debit", "credit", "balance"]
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=columns)
+        writer.writeheader()
+        with next(database.get_session()) as session:
+            for i, row in enumerate(crud.iter_account_ledger(session, account_id, start=start, end=end), 1):
+                writer.writerow(row)
+                if i % 1000 == 0:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+        yield buf.getvalue()
+
+    headers = {"Content-Disposition": f'attachment; filename="account-{account_id}-ledger.csv"'}
+    return StreamingResponse(generate(), media_type="text/csv", headers=headers)
+
+
 @app.get("/reports/trial_balance")
-def get_trial_balance(target_currency: str | None = None):
+def get_trial_balance(target_currency: str | None = None, as_of: datetime.date | None = None,
+                      date_from: datetime.date | None = Query(default=None, alias="from"),
+                      date_to: datetime.date | None = Query(default=None, alias="to")):
     with next(database.get_session()) as session:
-        report = crud.trial_balance(session, target_currency)
+        report = crud.trial_balance(session, target_currency, as_of=as_of, date_from=date_from, date_to=date_to)
         return {"rows": report}
 
 
+def _require_ledger_cache() -> ledger_cache.LedgerCache:
+    cache = ledger_cache.get_cache()
+    if cache is None:
+        raise HTTPException(status_code=503, detail='Ledger cache disabled; set LEDGER_CACHE_ENABLED=1')
+    return cache
+
+
+@app.get("/dashboard/trial_balance")
+def dashboard_trial_balance(as_of: datetime.date | None = None):
+    """Trial balance from the in-process columnar ledger cache."""
+    cache = _require_ledger_cache()
+    with next(database.get_session()) as session:
+        return {"rows": ledger_cache.trial_balance(session, cache, as_of=as_of)}
+
+
+@app.get("/dashboard/movements")
+def dashboard_movements(account_id: int | None = None, date_from: datetime.date | None = Query(default=None, alias="from"),
+                        date_to: datetime.date | None = Query(default=None, alias="to")):
+    """Monthly debit/credit movements per account from the columnar ledger cache."""
+    cache = _require_ledger_cache()
+    with next(database.get_session()) as session:
+        return {"rows": ledger_cache.movements(session, cache, account_id, date_from, date_to)}
+
+
+@app.get("/dashboard/consistency")
+def dashboard_consistency():
+    """Compare the columnar cache with the SQL ledger; `mismatches` should be empty."""
+    cache = _require_ledger_cache()
+    with next(database.get_session()) as session:
+        mismatches = ledger_cache.check_consistency(session, cache)
+        return {"lines": len(cache), "mismatches": mismatches}
+
+
+@app.post("/periods/close")
+def close_period(data: schemas.PeriodClose, user=Depends(get_current_user)):
+    # closing books locks back-dated posting, so require admin role
+    if not require_role(user, 'admin'):
+        raise HTTPException(status_code=403, detail='admin role required')
+    with next(database.get_session()) as session:
+        try:
+            period = crud.close_period(session, data.start_date, data.end_date)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"period_id": period.id, "start_date": str(period.start_date), "end_date": str(period.end_date)}
+
+
+@app.get("/periods")
+def list_periods():
+    with next(database.get_session()) as session:
+        return {"periods": crud.list_periods(session)}
+
+
 @app.post("/fx/realize")
 def fx_realize(invoice_id: int, payment_amount: float, payment_currency: str):
     with next(database.get_session()) as session:
@@ -165,6 +368,18 @@ def fx_realize(invoice_id: int, payment_amount: float, payment_currency: str):
         return {"fx_id": fx.id, "gain_loss": fx.gain_loss}
 
 
+@app.post("/fx/revalue")
+def fx_revalue(as_of: datetime.date, dry_run: bool = False, user=Depends(get_current_user_optional)):
+    # a real run posts journals, so it needs the admin role; a dry run only previews the entries
+    if not dry_run and not require_role(user, 'admin'):
+        raise HTTPException(status_code=403, detail='admin role required')
+    with next(database.get_session()) as session:
+        try:
+            return revaluation.revalue(session, as_of, dry_run=dry_run)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/reports/gstr1")
 def gstr1_report(start: str, end: str):
     # expects YYYY-MM-DD strings
@@ -235,78 +450,77 @@ def presign_signed(invoice_id: int, filename: str, user=Depends(get_current_user
 def apply_lut(invoice_id: int, lut_ref: str):
     """Mark an invoice as LUT-applied (export concession) with a reference."""
     with next(database.get_session()) as session:
-        inv = session.get(models.Invoice, invoice_id)
-        if not inv:
-            raise HTTPException(status_code=404, detail="Invoice not found")
-        inv.lut_applicable = True
-        # store LUT reference in einvoice_status temporarily (demo). In production add a dedicated field.
-        inv.einvoice_status = f"LUT:{lut_ref}"
-        session.add(inv)
-        session.commit()
-        session.refresh(inv)
+        try:
+            inv = crud.apply_lut(session, invoice_id, lut_ref)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
         return {"invoice_id": inv.id, "lut_ref": lut_ref}
 
 
 @app.post("/webhooks/gstn")
-def gstn_webhook(payload: schemas.GSTNWebhook):
+async def gstn_webhook(payload: schemas.GSTNWebhook):
     """Receive webhook callbacks from GSTN/GSP. Verifies signature and updates invoice status."""
+    from .gst_signing import verify_signature
     # verify signature
     sig = payload.signature
     text = f"{payload.irn}|{payload.status}"
-    # verify nonce/timestamp and signature
+
+    def apply():
+        # verify nonce/timestamp and signature
+        with next(database.get_session()) as session:
+            try:
+                crud.check_and_store_nonce(session, payload.nonce or '', payload.timestamp)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if sig is None or not verify_signature(f"{text}|{payload.nonce or ''}|{payload.timestamp or ''}", sig):
+                raise HTTPException(status_code=400, detail="Invalid signature")
+            try:
+                inv = crud.update_einvoice_status_by_irn(session, payload.irn, payload.status)
+            except ValueError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            return {"invoice_id": inv.id, "irn": inv.einvoice_irn, "status": inv.einvoice_status}
+
+    # database work runs in the threadpool; the event loop stays free for other requests
+    return await run_in_threadpool(apply)
+
+
+def _load_payload(invoice_id: int) -> einvoice.CanonicalPayload:
     with next(database.get_session()) as session:
-        try:
-            crud.check_and_store_nonce(session, payload.nonce or '', payload.timestamp)
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        from .gst_signing import verify_signature
-        from .gsp_client import GSPClient, generate_rsa_keypair
-        import os
-        if sig is None or not verify_signature(f"{text}|{payload.nonce or ''}|{payload.timestamp or ''}", sig):
-            raise HTTPException(status_code=400, detail="Invalid signature")
-        try:
-            inv = crud.update_einvoice_status_by_irn(session, payload.irn, payload.status)
-        except ValueError as e:
-            raise HTTPException(status_code=404, detail=str(e))
-        return {"invoice_id": inv.id, "irn": inv.einvoice_irn, "status": inv.einvoice_status}
+        return einvoice.get_payload_cache().get(session, invoice_id)
 
 
-@app.post("/invoices/{invoice_id}/submit_to_gsp")
-def submit_to_gsp(invoice_id: int):
-    """Submit invoice payload to configured GSP. Uses RSA keys from env or simulated client if none configured."""
+def _record_submission(invoice_id: int, irn: str, status: str) -> None:
     with next(database.get_session()) as session:
-        try:
-            payload = crud.build_einvoice_payload(session, invoice_id)
-        except ValueError as e:
-            raise HTTPException(status_code=404, detail=str(e))
-        # load keys and base url from env
-        base_url = os.environ.get('GSP_BASE_URL')
-        priv_pem = None
-        pub_pem = None
-        priv_path = os.environ.get('GSP_PRIVATE_PEM_PATH')
-        pub_path = os.environ.get('GSP_PUBLIC_PEM_PATH')
-        if priv_path:
-            try:
-                with open(priv_path, 'rb') as f:
-                    priv_pem = f.read()
-            except Exception:
-                pass
-        if pub_path:
-            try:
-                with open(pub_path, 'rb') as f:
-                    pub_pem = f.read()
-            except Exception:
-                pass
-        client = GSPClient(base_url=base_url, pem_private=priv_pem, pem_public=pub_pem)
-        try:
-            resp = client.submit_einvoice(payload)
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=str(e))
-        # on success, record IRN if returned
-        irn = resp.get('irn')
-        status = resp.get('status')
-        if irn:
-            inv = crud.mark_einvoice_submitted(session, invoice_id, irn, status=status or 'IRN_ASSIGNED')
-            crud.record_einvoice_audit(session, invoice_id, 'GSP_SUBMISSION', f'irn={irn}')
-            return {"invoice_id": invoice_id, "irn": irn, "status": inv.einvoice_status}
-        return {"invoice_id": invoice_id, "response": resp}
+        crud.record_einvoice_submissions(session, [(invoice_id, irn, status)], [(invoice_id, 'GSP_SUBMISSION', f'irn={irn}')])
+
+
+@app.post("/invoices/{invoice_id}/submit_to_gsp")
+async def submit_to_gsp(invoice_id: int):
+    """Submit invoice payload to configured GSP via the shared async client (simulated GSTN if none configured).
+
+    Retries back off with `asyncio.sleep` under the `GSP_DEADLINE` budget, so a slow GSP doesn't hold a worker thread.
+    """
+    try:
+        payload = await run_in_threadpool(_load_payload, invoice_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        resp = await gsp_client.get_async_client().submit_einvoice(payload)
+    except (resilience.CircuitOpenError, resilience.LimiterTimeout) as e:
+        # shed load locally instead of queueing behind a GSP that is down or saturated
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    # on success, record IRN if returned
+    irn = resp.get('irn')
+    status = resp.get('status') or 'IRN_ASSIGNED'
+    if irn:
+        await run_in_threadpool(_record_submission, invoice_id, irn, status)
+        return {"invoice_id": invoice_id, "irn": irn, "status": status}
+    return {"invoice_id": invoice_id, "response": resp}
+
+
+@app.get("/health/gsp")
+def gsp_health():
+    """Circuit breaker state, adaptive concurrency limit and trip counts of the outbound GSP guard."""
+    return resilience.get_gsp_guard().snapshot()
@@ -1,12 +1,21 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import BigInteger, Column, Index, func
 from typing import Optional
 import datetime
 
+
+def _minor_field():
+    """Integer minor-unit amount (paise/cents) stored as BIGINT; see `app.money`."""
+    return Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default='0'))
+
+
 class Currency(SQLModel, table=True):
     code: str = Field(primary_key=True)
     name: Optional[str]
+    exponent: int = 2  # minor-unit digits: 2 for INR/USD, 0 for JPY, 3 for KWD
 
 class ExchangeRate(SQLModel, table=True):
+    __table_args__ = (Index('ix_exchangerate_base_target_timestamp', 'base', 'target', 'timestamp', unique=True),)
     id: Optional[int] = Field(default=None, primary_key=True)
     base: str = Field(foreign_key="currency.code")
     target: str = Field(foreign_key="currency.code")
@@ -21,21 +30,60 @@ class Account(SQLModel, table=True):
 
 class JournalEntry(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    date: datetime.date = Field(default_factory=datetime.date.today)
+    date: datetime.date = Field(default_factory=datetime.date.today, index=True)
     narration: Optional[str]
 
 class LedgerEntry(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    journal_id: Optional[int] = Field(foreign_key="journalentry.id")
-    account_id: Optional[int] = Field(foreign_key="account.id")
+    journal_id: Optional[int] = Field(foreign_key="journalentry.id", index=True)
+    account_id: Optional[int] = Field(foreign_key="account.id", index=True)
     debit: float = 0.0
     credit: float = 0.0
+    debit_minor: int = _minor_field()
+    credit_minor: int = _minor_field()
+
+
+class AccountBalance(SQLModel, table=True):
+    """Running debit/credit totals (minor units) per account, maintained on every journal post."""
+    account_id: int = Field(foreign_key="account.id", primary_key=True)
+    debit_minor: int = _minor_field()
+    credit_minor: int = _minor_field()
+
+
+class AccountDailyBalance(SQLModel, table=True):
+    """Debit/credit movement (minor units) per account per journal date."""
+    account_id: int = Field(foreign_key="account.id", primary_key=True)
+    date: datetime.date = Field(primary_key=True)
+    debit_minor: int = _minor_field()
+    credit_minor: int = _minor_field()
+
+
+class FiscalPeriod(SQLModel, table=True):
+    """A closed accounting period. Journals dated on or before `end_date` are rejected once closed."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    start_date: datetime.date
+    end_date: datetime.date = Field(index=True)
+    closed_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+
+class PeriodBalance(SQLModel, table=True):
+    """Cumulative debit/credit totals (minor units) per account as of a closed period's end date."""
+    period_id: int = Field(foreign_key="fiscalperiod.id", primary_key=True)
+    account_id: int = Field(foreign_key="account.id", primary_key=True)
+    debit_minor: int = _minor_field()
+    credit_minor: int = _minor_field()
 
 
 class Invoice(SQLModel, table=True):
+    # keyset pages of GET /invoices: newest (date, id) first, optionally narrowed to one customer or e-invoice status
+    __table_args__ = (
+        Index('ix_invoice_date_id', 'date', 'id'),
+        Index('ix_invoice_customer_gstin_date_id', 'customer_gstin', 'date', 'id'),
+        Index('ix_invoice_einvoice_status_date_id', 'einvoice_status', 'date', 'id'),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
-    invoice_number: str
-    date: datetime.date = Field(default_factory=datetime.date.today)
+    invoice_number: str = Field(unique=True, index=True)
+    date: datetime.date = Field(default_factory=datetime.date.today, index=True)
     customer_name: Optional[str]
     customer_gstin: Optional[str]
     place_of_supply: Optional[str]
@@ -43,13 +91,30 @@ class Invoice(SQLModel, table=True):
     lut_applicable: bool = False
     iec: Optional[str]
     currency: str = Field(foreign_key="currency.code")
-    einvoice_irn: Optional[str] = None
+    einvoice_irn: Optional[str] = Field(default=None, unique=True, index=True)
     einvoice_status: Optional[str] = None
+    # bumped by crud whenever a field of the e-invoice payload changes; keys the cached canonical payload
+    revision: int = Field(default=0, sa_column_kwargs={'server_default': '0'})
+    # line totals, set once by crud.create_invoice; grand_total = taxable + igst + cgst + sgst
+    taxable_total: float = 0.0
+    igst_total: float = 0.0
+    cgst_total: float = 0.0
+    sgst_total: float = 0.0
+    grand_total: float = 0.0
+    taxable_total_minor: int = _minor_field()
+    igst_total_minor: int = _minor_field()
+    cgst_total_minor: int = _minor_field()
+    sgst_total_minor: int = _minor_field()
+    grand_total_minor: int = _minor_field()
+
+
+# case-insensitive prefix search on customer names (crud.list_invoices)
+Index('ix_invoice_customer_name_lower', func.lower(Invoice.__table__.c.customer_name))
 
 
 class InvoiceLine(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    invoice_id: Optional[int] = Field(foreign_key="invoice.id")
+    invoice_id: Optional[int] = Field(foreign_key="invoice.id", index=True)
     description: Optional[str]
     quantity: float = 1.0
     unit_rate: float = 0.0
@@ -57,6 +122,27 @@ class InvoiceLine(SQLModel, table=True):
     igst: float = 0.0
     cgst: float = 0.0
     sgst: float = 0.0
+    amount_minor: int = _minor_field()
+    igst_minor: int = _minor_field()
+    cgst_minor: int = _minor_field()
+    sgst_minor: int = _minor_field()
+
+
+class GSTSummary(SQLModel, table=True):
+    """Pre-aggregated GSTR-1 totals (minor units) per month, supply category, place of supply and currency.
+
+    Maintained by `crud.create_invoice` / `crud.apply_lut` in the invoice's transaction. `place_of_supply` is ''
+    for invoices without one. Rebuild with `scripts/rebuild_gst_summary.py`.
+    """
+    period: str = Field(primary_key=True)  # YYYY-MM of the invoice date
+    category: str = Field(primary_key=True)  # B2B / B2C / EXPWP / EXPWOP
+    place_of_supply: str = Field(default='', primary_key=True)
+    currency: str = Field(primary_key=True)
+    invoice_count: int = 0
+    taxable_minor: int = _minor_field()
+    igst_minor: int = _minor_field()
+    cgst_minor: int = _minor_field()
+    sgst_minor: int = _minor_field()
 
 
 class TDSDeduction(SQLModel, table=True):
@@ -65,6 +151,8 @@ class TDSDeduction(SQLModel, table=True):
     amount: float
     tds_rate: float
     tds_amount: float
+    amount_minor: int = _minor_field()
+    tds_amount_minor: int = _minor_field()
     section: str  # e.g., '195' for non-resident payments
     date: datetime.date = Field(default_factory=datetime.date.today)
 
@@ -81,6 +169,7 @@ class EWaybill(SQLModel, table=True):
 
 
 class EInvoiceAudit(SQLModel, table=True):
+    __table_args__ = (Index('ix_einvoiceaudit_invoice_id_timestamp', 'invoice_id', 'timestamp'),)
     id: Optional[int] = Field(default=None, primary_key=True)
     invoice_id: Optional[int] = Field(foreign_key="invoice.id")
     event: str
@@ -98,7 +187,7 @@ class SignedDocument(SQLModel, table=True):
 
 class WebhookNonce(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    nonce: str
+    nonce: str = Field(unique=True, index=True)
     timestamp: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
 
 
@@ -110,5 +199,38 @@ class FXRealization(SQLModel, table=True):
     original_amount: float
     realized_amount: float
     gain_loss: float
+    original_amount_minor: int = _minor_field()
+    realized_amount_minor: int = _minor_field()
+    gain_loss_minor: int = _minor_field()
     timestamp: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
 
+
+
+class ExportWatermark(SQLModel, table=True):
+    """Highest primary key already exported per table by the columnar export job."""
+    table_name: str = Field(primary_key=True)
+    last_id: int = 0
+    # JSON [[first id, last id, first seen (ISO)], ...]: ids below last_id not seen yet, which a transaction still
+    # in flight may commit later (Postgres hands out ids before commit); see `app.exports`
+    gaps: Optional[str] = None
+    updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+
+class FXRevaluation(SQLModel, table=True):
+    """Unrealized FX revaluation of one foreign-currency account or open invoice at a closing date.
+
+    `balance_minor` is in the item's currency; carrying/revalued/gain_loss are in the functional currency.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    as_of: datetime.date = Field(index=True)
+    journal_id: Optional[int] = Field(default=None, foreign_key="journalentry.id")
+    account_id: Optional[int] = Field(default=None, foreign_key="account.id", index=True)
+    invoice_id: Optional[int] = Field(default=None, foreign_key="invoice.id", index=True)
+    currency: str
+    functional_currency: str
+    closing_rate: float
+    balance_minor: int = _minor_field()
+    carrying_minor: int = _minor_field()
+    revalued_minor: int = _minor_field()
+    gain_loss_minor: int = _minor_field()
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
@@ -0,0 +1,43 @@
+"""Exact money representation.
+
+Amounts are stored as integer minor units (paise, cents) in BIGINT `*_minor` columns next to the legacy float
+columns. `Currency.exponent` gives the number of minor digits (2 for INR/USD, 0 for JPY, 3 for KWD). Aggregations
+sum the integer columns and convert back to major units only for presentation.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable
+from sqlmodel import Session, select
+from . import models
+
+DEFAULT_EXPONENT = 2
+
+
+def to_minor(amount, exponent: int = DEFAULT_EXPONENT) -> int:
+    """Convert a major-unit amount (float, str or Decimal) to integer minor units, rounding half up."""
+    if amount is None:
+        return 0
+    return int(Decimal(str(amount)).scaleb(exponent).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(value, exponent: int = DEFAULT_EXPONENT) -> float:
+    if value is None:
+        return 0.0
+    return float(Decimal(int(value)).scaleb(-exponent))
+
+
+def currency_exponent(session: Session, code: str) -> int:
+    cur = session.get(models.Currency, code)
+    return cur.exponent if cur and cur.exponent is not None else DEFAULT_EXPONENT
+
+
+def account_exponents(session: Session, account_ids: Iterable[int]) -> dict[int, int]:
+    """Return {account_id: exponent of the account currency} in one query."""
+    ids = {a for a in account_ids if a is not None}
+    if not ids:
+        return {}
+    q = (
+        select(models.Account.id, models.Currency.exponent)
+        .join(models.Currency, models.Currency.code == models.Account.currency)
+        .where(models.Account.id.in_(ids))
+    )
+    return {acc_id: (exp if exp is not None else DEFAULT_EXPONENT) for acc_id, exp in session.exec(q).all()}
@@ -0,0 +1,155 @@
+"""Group-commit journal posting.
+
+Concurrent callers hand journals to a single background writer which collects everything that arrives within a
+short window (`JOURNAL_GROUP_COMMIT_MS`) and posts it with one transaction via `crud.bulk_create_journals`, so N
+concurrent posts share one commit/fsync instead of paying one each. Callers block until their batch commits, for at
+most `JOURNAL_GROUP_COMMIT_TIMEOUT` seconds. A database error fails the batch's futures, never the writer thread.
+"""
+import datetime
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Optional
+from sqlmodel import Session
+from . import crud, models, money
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitter:
+    def __init__(self, engine, window: float = 0.005, max_batch: int = 500, timeout: float = 30.0):
+        self.engine = engine
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.timeout = timeout
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, journal: models.JournalEntry, lines: list[models.LedgerEntry]) -> Future:
+        """Queue a journal for posting; the future resolves to the committed (detached) JournalEntry."""
+        fut: Future = Future()
+        if journal.date is None:
+            journal.date = datetime.date.today()
+        self._ensure_started()
+        self._queue.put((fut, journal, lines))
+        return fut
+
+    def post(self, journal: models.JournalEntry, lines: list[models.LedgerEntry],
+             timeout: Optional[float] = None) -> models.JournalEntry:
+        """Post and wait for the commit. Raises TimeoutError after `timeout` seconds (default `self.timeout`)."""
+        fut = self.submit(journal, lines)
+        try:
+            return fut.result(self.timeout if timeout is None else timeout)
+        except FutureTimeout:
+            if fut.cancel():
+                raise TimeoutError('Journal not posted: the group commit queue is not draining')
+            # already taken by the writer; its outcome is unknown to this caller
+            raise TimeoutError('Timed out waiting for the journal commit; it may still be posted')
+
+    def close(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread:
+                self._queue.put(None)
+        if thread:
+            thread.join()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='journal-group-commit', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            self._loop()
+        finally:
+            # if the writer ever dies, let the next submit() start a new one instead of queueing forever
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: list) -> None:
+        # futures cancelled by a timed-out post() are dropped; the rest are marked running and can't be cancelled
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        try:
+            self._commit_batch(batch)
+        except Exception as e:
+            logger.exception('Group commit of %d journals failed', len(batch))
+            for fut, _, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+
+    def _commit_batch(self, batch: list) -> None:
+        with Session(self.engine, expire_on_commit=False) as session:
+            closed = crud._latest_closed_period(session)
+            exponents = money.account_exponents(session, (l.account_id for _, _, lines in batch for l in lines))
+            valid = []
+            for fut, journal, lines in batch:
+                try:
+                    crud._check_balanced(lines, exponents)
+                    if closed and journal.date <= closed.end_date:
+                        raise ValueError(f"Period closed: cannot post journals dated on or before {closed.end_date}")
+                except ValueError as e:
+                    fut.set_exception(e)
+                    continue
+                valid.append((fut, journal, lines))
+            try:
+                crud.bulk_create_journals(session, [(journal, lines) for _, journal, lines in valid])
+            except Exception:
+                session.rollback()
+                # isolate the failing journal(s) by posting the rest one at a time
+                for fut, journal, lines in valid:
+                    journal.id = None
+                    try:
+                        fut.set_result(crud.create_journal(session, journal, lines))
+                    except Exception as e:
+                        session.rollback()
+                        fut.set_exception(e)
+                return
+        for fut, journal, _ in valid:
+            fut.set_result(journal)
+
+
+_committer: Optional[GroupCommitter] = None
+_committer_lock = threading.Lock()
+
+
+def get_group_committer() -> Optional[GroupCommitter]:
+    """Return the process-wide committer, or None when group commit is disabled."""
+    global _committer
+    settings = get_settings()
+    if settings.JOURNAL_GROUP_COMMIT_MS <= 0:
+        return None
+    with _committer_lock:
+        if _committer is None:
+            from .database import engine
+            _committer = GroupCommitter(engine, settings.JOURNAL_GROUP_COMMIT_MS / 1000.0, settings.JOURNAL_GROUP_COMMIT_MAX,
+                                        settings.JOURNAL_GROUP_COMMIT_TIMEOUT)
+    return _committer
@@ -0,0 +1,323 @@
+"""Circuit breaker and adaptive concurrency limit for outbound GSP calls.
+
+`CircuitBreaker` opens after `failure_threshold` consecutive failures and rejects calls with `CircuitOpenError`
+for `reset_timeout` seconds; it then lets `half_open_max` probe calls through (half-open) and closes again on a
+probe success or re-opens on a probe failure. With `REDIS_URL` set, an open breaker is also written to Redis
+with a TTL of the reset timeout, so every worker fails fast while any one of them has seen the GSP go down.
+
+`AdaptiveLimiter` bounds in-flight calls with an AIMD limit: each success under `latency_target` grows the
+limit by 1/limit (about +1 per round of calls), while a failure or slow call halves it (at most once per
+`latency_target`). Callers over the limit queue for up to `queue_timeout` seconds, then get `LimiterTimeout`.
+
+`Guard` pairs the two around one call (`with guard.call():` / `async with guard.acall():`) and `snapshot()`
+exposes state, limits and trip counts for `/health/gsp`. Only signs of an unhealthy GSP count as failures
+(`is_gsp_failure`: transport errors, timeouts, 5xx and 429); a 4xx rejects one request, not the service, so it
+counts as a success. Outcomes of calls admitted before the breaker last opened are ignored, so a slow call that
+started while the GSP was healthy can't close a breaker that has opened since.
+"""
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from typing import Optional
+import httpx
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class LimiterTimeout(RuntimeError):
+    pass
+
+
+def is_gsp_failure(exc: BaseException) -> bool:
+    """True for errors that mean the GSP itself is unhealthy: 5xx/429 responses, transport errors and timeouts."""
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is not None:
+        return status >= 500 or status == 429
+    # requests' connection errors and timeouts are OSErrors, as are asyncio/builtin timeouts
+    return isinstance(exc, (OSError, httpx.TransportError))
+
+
+def _redis():
+    settings = get_settings()
+    if not settings.REDIS_URL:
+        return None
+    import redis
+    return redis.from_url(settings.REDIS_URL)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max: int = 1,
+                 shared: Optional[bool] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max = max(1, half_open_max)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        # bumped each time the breaker opens; outcomes of calls admitted in an earlier epoch are stale
+        self._epoch = 0
+        self.trips = 0
+        self.rejected = 0
+        self._shared = bool(get_settings().REDIS_URL) if shared is None else shared
+        # the shared open flag is re-read from Redis at most this often (seconds)
+        self._remote_checked = 0.0
+        self._remote_open = False
+
+    @property
+    def _key(self) -> str:
+        return f'gsp:breaker:{self.name}'
+
+    def _remote_is_open(self, now: float) -> bool:
+        if not self._shared:
+            return False
+        if now - self._remote_checked >= 1.0:
+            self._remote_checked = now
+            try:
+                self._remote_open = bool(_redis().exists(self._key))
+            except Exception:
+                logger.exception('Circuit breaker state unavailable from Redis; using local state only')
+                self._remote_open = False
+        return self._remote_open
+
+    def _publish_open(self) -> None:
+        if not self._shared:
+            return
+        try:
+            conn = _redis()
+            conn.set(self._key, '1', px=max(1, int(self.reset_timeout * 1000)))
+            conn.incr(f'{self._key}:trips')
+        except Exception:
+            logger.exception('Failed to share open circuit breaker state')
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current(time.monotonic())
+
+    def _current(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state, self._probes = HALF_OPEN, 0
+        return self._state
+
+    def allow(self) -> tuple[int, bool]:
+        """Admit a call or raise `CircuitOpenError`. Returns the (epoch, is probe) token for `record_*`/`cancel`."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current(now)
+            if state == CLOSED and not self._remote_is_open(now):
+                return self._epoch, False
+            if state == HALF_OPEN and self._probes < self.half_open_max:
+                self._probes += 1
+                return self._epoch, True
+            self.rejected += 1
+        raise CircuitOpenError(f'GSP circuit {self.name} is open; retry after {self.reset_timeout:g}s')
+
+    def cancel(self, token: tuple[int, bool]) -> None:
+        """Give back a call slot taken by `allow()` for a call that never went out (or whose outcome is moot)."""
+        epoch, probe = token
+        with self._lock:
+            if probe and epoch == self._epoch and self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def _counts(self, token: tuple[int, bool], state: str) -> bool:
+        epoch, probe = token
+        return epoch == self._epoch and (state == CLOSED or (state == HALF_OPEN and probe))
+
+    def record_success(self, token: tuple[int, bool]) -> None:
+        with self._lock:
+            state = self._current(time.monotonic())
+            if not self._counts(token, state):
+                return
+            if state != CLOSED:
+                logger.info('GSP circuit %s closed', self.name)
+            self._state, self._failures, self._probes = CLOSED, 0, 0
+
+    def record_failure(self, token: tuple[int, bool]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current(now)
+            if not self._counts(token, state):
+                return
+            self._failures += 1
+            if state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state, self._opened_at = OPEN, now
+                self._epoch += 1
+                self.trips += 1
+                logger.warning('GSP circuit %s opened after %d failures', self.name, self._failures)
+                publish = True
+            else:
+                publish = False
+        if publish:
+            self._publish_open()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current(now)
+            snap = {
+                "state": state, "consecutive_failures": self._failures, "trips": self.trips, "rejected": self.rejected,
+                "retry_in": round(max(0.0, self.reset_timeout - (now - self._opened_at)), 3) if state == OPEN else 0.0,
+            }
+        if self._shared:
+            snap["shared_open"] = self._remote_is_open(now)
+        return snap
+
+
+class AdaptiveLimiter:
+    def __init__(self, min_limit: int = 1, max_limit: int = 16, latency_target: float = 2.0, queue_timeout: float = 5.0):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target = latency_target
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._limit = float(self.max_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self.decreases = 0
+        self.timeouts = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def _try_acquire(self) -> bool:
+        if self._in_flight < self.limit:
+            self._in_flight += 1
+            return True
+        return False
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        with self._cond:
+            while not self._try_acquire():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise LimiterTimeout(f'GSP concurrency limit {self.limit} reached')
+                self._cond.wait(remaining)
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> None:
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        delay = 0.001
+        while True:
+            with self._cond:
+                if self._try_acquire():
+                    return
+            if time.monotonic() >= deadline:
+                with self._cond:
+                    self.timeouts += 1
+                raise LimiterTimeout(f'GSP concurrency limit {self.limit} reached')
+            # released slots are picked up by polling; threads blocked in acquire() are woken by the condition
+            await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 2, 0.05)
+
+    def release(self, latency: float, ok: Optional[bool]) -> None:
+        """Free a slot and adapt the limit to the outcome; `ok=None` (e.g. a cancelled call) leaves it unchanged."""
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight -= 1
+            if ok is None:
+                pass
+            elif ok and latency <= self.latency_target:
+                self._limit = min(self.max_limit, self._limit + 1.0 / max(1.0, self._limit))
+            elif now - self._last_decrease >= self.latency_target:
+                # one multiplicative decrease per latency window, not one per failed in-flight call
+                self._limit = max(self.min_limit, self._limit / 2)
+                self._last_decrease = now
+                self.decreases += 1
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {"limit": self.limit, "in_flight": self._in_flight, "min": self.min_limit, "max": self.max_limit,
+                    "decreases": self.decreases, "queue_timeouts": self.timeouts}
+
+
+class Guard:
+    def __init__(self, breaker: CircuitBreaker, limiter: AdaptiveLimiter, is_failure=is_gsp_failure):
+        self.breaker = breaker
+        self.limiter = limiter
+        self.is_failure = is_failure
+
+    @contextlib.contextmanager
+    def call(self):
+        token = self.breaker.allow()
+        try:
+            self.limiter.acquire()
+        except LimiterTimeout:
+            self.breaker.cancel(token)
+            raise
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._finish(token, started, self._outcome(e))
+            raise
+        self._finish(token, started, True)
+
+    @contextlib.asynccontextmanager
+    async def acall(self):
+        token = self.breaker.allow()
+        try:
+            await self.limiter.acquire_async()
+        except LimiterTimeout:
+            self.breaker.cancel(token)
+            raise
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._finish(token, started, self._outcome(e))
+            raise
+        self._finish(token, started, True)
+
+    def _outcome(self, exc: BaseException) -> Optional[bool]:
+        """False for a GSP failure, True for an error of the request itself (the GSP answered), None if cancelled."""
+        if not isinstance(exc, Exception):
+            return None
+        return not self.is_failure(exc)
+
+    def _finish(self, token: tuple[int, bool], started: float, ok: Optional[bool]) -> None:
+        self.limiter.release(time.monotonic() - started, ok)
+        if ok is None:
+            self.breaker.cancel(token)
+        elif ok:
+            self.breaker.record_success(token)
+        else:
+            self.breaker.record_failure(token)
+
+    def snapshot(self) -> dict:
+        return {"breaker": self.breaker.snapshot(), "limiter": self.limiter.snapshot()}
+
+
+def new_gsp_guard() -> Guard:
+    settings = get_settings()
+    return Guard(
+        CircuitBreaker('gsp', settings.GSP_BREAKER_FAILURES, settings.GSP_BREAKER_RESET_SECONDS),
+        AdaptiveLimiter(1, settings.GSP_POOL_SIZE, settings.GSP_LATENCY_TARGET_MS / 1000.0, settings.GSP_QUEUE_TIMEOUT),
+    )
+
+
+_guard: Optional[Guard] = None
+_guard_lock = threading.Lock()
+
+
+def get_gsp_guard() -> Guard:
+    """Process-wide guard shared by every GSP client, sync and async."""
+    global _guard
+    with _guard_lock:
+        if _guard is None:
+            _guard = new_gsp_guard()
+    return _guard
@@ -0,0 +1,194 @@
+"""Period-end unrealized FX revaluation.
+
+Revalues every foreign-currency account balance and every open foreign-currency invoice (one without an
+`FXRealization`) at the closing rate of `as_of`, in the functional currency (`FUNCTIONAL_CURRENCY`).
+
+The carrying amount of an item is its revalued amount from the previous run plus the movements since that run
+converted at the rate of their journal date (the invoice date for invoices first seen). The difference between
+the revalued and carrying amounts is the unrealized gain or loss. All items are computed together as NumPy
+arrays, then posted as a single journal in one transaction:
+
+    FX Revaluation Adjustment   Dr/Cr  one line per revalued item
+    Unrealized FX Gain/Loss     Cr/Dr  net of the run
+
+Each item is recorded as an `FXRevaluation` row, which becomes the carrying basis for the next run. With
+`dry_run` nothing is written and the proposed entries are returned. Items whose currency has no rate path into
+the functional currency at `as_of` are reported in `skipped` by a dry run and make a real run fail. A movement
+dated before the first available rate is carried at the closing rate. Adjustments for an invoice that is later
+realized are not reversed automatically.
+"""
+import datetime
+from typing import Optional
+import numpy as np
+from sqlmodel import Session, select
+from sqlalchemy import func
+from . import models, money, crud, fx
+from .config import get_settings
+
+GAIN_LOSS_ACCOUNT = 'Unrealized FX Gain/Loss'
+ADJUSTMENT_ACCOUNT = 'FX Revaluation Adjustment'
+
+
+def _round_half_up(values: np.ndarray) -> np.ndarray:
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+def _rates_on(session: Session, dates: np.ndarray, currencies: list[str], functional: str, fallback: np.ndarray) -> np.ndarray:
+    """Rate into `functional` for each (date, currency) pair, one matrix per distinct date."""
+    cache = fx.get_rate_cache()
+    rates = np.array(fallback, dtype=float)
+    for day in set(dates.tolist()):
+        column = cache.matrix(session, day).column(functional)
+        for i in np.flatnonzero(dates == day):
+            rates[i] = column.get(currencies[i], rates[i])
+    return rates
+
+
+def _get_or_create_account(session: Session, name: str, type_: str, currency: str) -> models.Account:
+    acct = session.exec(select(models.Account).where(models.Account.name == name, models.Account.currency == currency)).first()
+    return acct or crud.create_account(session, models.Account(name=name, type=type_, currency=currency))
+
+
+def revalue(session: Session, as_of: datetime.date, dry_run: bool = False, functional_currency: Optional[str] = None) -> dict:
+    functional = (functional_currency or get_settings().FUNCTIONAL_CURRENCY).upper()
+    last_run = session.exec(select(func.max(models.FXRevaluation.as_of))).one()
+    if last_run and as_of <= last_run:
+        raise ValueError(f"FX revaluation already run for {last_run}; revalue a later date")
+    if not dry_run:
+        crud._check_period_open(session, as_of)
+    functional_exp = money.currency_exponent(session, functional)
+    exponent = func.coalesce(models.Currency.exponent, money.DEFAULT_EXPONENT)
+
+    prior: dict[tuple[str, int], int] = {}
+    if last_run:
+        q = select(models.FXRevaluation).where(models.FXRevaluation.as_of == last_run)
+        for r in session.exec(q).all():
+            prior[('account', r.account_id) if r.account_id else ('invoice', r.invoice_id)] = r.revalued_minor
+
+    # items: (kind, id) -> [currency, exponent, balance_minor]; movements: (item index, date, amount_minor)
+    items: dict[tuple[str, int], list] = {}
+    move_item: list[int] = []
+    move_date: list[datetime.date] = []
+    move_minor: list[int] = []
+
+    qa = (
+        select(models.Account.id, models.Account.currency, exponent)
+        .outerjoin(models.Currency, models.Currency.code == models.Account.currency)
+        .where(models.Account.currency != functional)
+    )
+    accounts = session.exec(qa).all()
+    totals = crud._totals_as_of(session, as_of) if accounts else {}
+    for acc_id, currency, exp in accounts:
+        debit, credit = totals.get(acc_id, (0, 0))
+        items[('account', acc_id)] = [currency, exp, debit - credit]
+    index = {key: i for i, key in enumerate(items)}
+    qm = (
+        select(models.LedgerEntry.account_id, models.JournalEntry.date,
+               func.sum(models.LedgerEntry.debit_minor - models.LedgerEntry.credit_minor))
+        .join(models.JournalEntry, models.JournalEntry.id == models.LedgerEntry.journal_id)
+        .join(models.Account, models.Account.id == models.LedgerEntry.account_id)
+        .where(models.Account.currency != functional, models.JournalEntry.date <= as_of)
+        .group_by(models.LedgerEntry.account_id, models.JournalEntry.date)
+    )
+    if last_run:
+        qm = qm.where(models.JournalEntry.date > last_run)
+    for acc_id, day, net in session.exec(qm).all():
+        move_item.append(index[('account', acc_id)])
+        move_date.append(day)
+        move_minor.append(int(net or 0))
+
+    realized = select(models.FXRealization.invoice_id).where(models.FXRealization.invoice_id.is_not(None))
+    qi = (
+        select(models.Invoice.id, models.Invoice.currency, exponent, models.Invoice.date, models.Invoice.taxable_total_minor)
+        .outerjoin(models.Currency, models.Currency.code == models.Invoice.currency)
+        .where(models.Invoice.currency != functional, models.Invoice.date <= as_of, models.Invoice.id.not_in(realized))
+    )
+    for inv_id, currency, exp, day, total in session.exec(qi).all():
+        key = ('invoice', inv_id)
+        index[key] = len(items)
+        items[key] = [currency, exp, int(total or 0)]
+        if key not in prior:
+            move_item.append(index[key])
+            move_date.append(day)
+            move_minor.append(int(total or 0))
+
+    keys = list(items)
+    currencies = [items[k][0] for k in keys]
+    scale = np.array([10.0 ** (functional_exp - items[k][1]) for k in keys])
+    balance = np.array([items[k][2] for k in keys], dtype=np.int64)
+    matrix = fx.get_rate_cache().matrix(session, as_of)
+    closing = matrix.column(functional)
+    closing_rate = np.array([closing.get(c, np.nan) for c in currencies])
+
+    move_item_arr = np.array(move_item, dtype=np.intp)
+    move_rate = _rates_on(session, np.array(move_date, dtype=object), [currencies[i] for i in move_item],
+                          functional, closing_rate[move_item_arr])
+    moved = np.bincount(move_item_arr, weights=np.array(move_minor, dtype=float) * scale[move_item_arr] * move_rate,
+                        minlength=len(keys)) if move_item else np.zeros(len(keys))
+    carrying = np.array([prior.get(k, 0) for k in keys], dtype=np.int64) + _round_half_up(np.nan_to_num(moved))
+    revalued = _round_half_up(np.nan_to_num(balance * scale * closing_rate))
+    gain_loss = revalued - carrying
+
+    entries, skipped = [], []
+    for i, (kind, ref) in enumerate(keys):
+        if np.isnan(closing_rate[i]):
+            skipped.append({"kind": kind, "id": ref, "currency": currencies[i], "reason": f"no rate into {functional}"})
+            continue
+        if balance[i] == 0 and carrying[i] == 0:
+            continue
+        entries.append({
+            "kind": kind, "id": ref, "currency": currencies[i], "closing_rate": float(closing_rate[i]),
+            "balance": money.from_minor(balance[i], items[(kind, ref)][1]),
+            "carrying": money.from_minor(carrying[i], functional_exp),
+            "revalued": money.from_minor(revalued[i], functional_exp),
+            "gain_loss": money.from_minor(gain_loss[i], functional_exp),
+            "balance_minor": int(balance[i]), "carrying_minor": int(carrying[i]),
+            "revalued_minor": int(revalued[i]), "gain_loss_minor": int(gain_loss[i]),
+        })
+    if skipped and not dry_run:
+        raise ValueError(f"No closing rate into {functional} for: {sorted({s['currency'] for s in skipped})}")
+    net_minor = sum(e["gain_loss_minor"] for e in entries)
+    result = {
+        "as_of": str(as_of), "functional_currency": functional, "dry_run": dry_run, "journal_id": None,
+        "total_gain_loss": money.from_minor(net_minor, functional_exp), "entries": entries, "skipped": skipped,
+    }
+    if not dry_run and entries:
+        result["journal_id"] = _post(session, as_of, functional, functional_exp, entries, net_minor)
+    return result
+
+
+def _post(session: Session, as_of: datetime.date, functional: str, functional_exp: int, entries: list[dict],
+          net_minor: int) -> Optional[int]:
+    adjustment = _get_or_create_account(session, ADJUSTMENT_ACCOUNT, 'asset', functional)
+    gain_account = _get_or_create_account(session, GAIN_LOSS_ACCOUNT, 'expense', functional)
+    lines = []
+    for e in entries:
+        amount = money.from_minor(abs(e["gain_loss_minor"]), functional_exp)
+        if e["gain_loss_minor"] > 0:
+            lines.append(models.LedgerEntry(account_id=adjustment.id, debit=amount))
+        elif e["gain_loss_minor"] < 0:
+            lines.append(models.LedgerEntry(account_id=adjustment.id, credit=amount))
+    if net_minor:
+        amount = money.from_minor(abs(net_minor), functional_exp)
+        lines.append(models.LedgerEntry(account_id=gain_account.id, credit=amount) if net_minor > 0
+                     else models.LedgerEntry(account_id=gain_account.id, debit=amount))
+    journal = None
+    if lines:
+        journal = models.JournalEntry(narration=f'Unrealized FX revaluation as of {as_of}', date=as_of)
+        session.add(journal)
+        session.flush()
+    for e in entries:
+        session.add(models.FXRevaluation(
+            as_of=as_of, journal_id=journal.id if journal else None,
+            account_id=e["id"] if e["kind"] == 'account' else None,
+            invoice_id=e["id"] if e["kind"] == 'invoice' else None,
+            currency=e["currency"], functional_currency=functional, closing_rate=e["closing_rate"],
+            balance_minor=e["balance_minor"], carrying_minor=e["carrying_minor"],
+            revalued_minor=e["revalued_minor"], gain_loss_minor=e["gain_loss_minor"],
+        ))
+    if journal:
+        # commits the journal, its lines, balance deltas and the revaluation rows together
+        crud.bulk_create_journals(session, [(journal, lines)])
+    else:
+        session.commit()
+    return journal.id if journal else None
@@ -5,6 +5,7 @@ import datetime
 class CurrencyCreate(BaseModel):
     code: str
     name: Optional[str]
+    exponent: int = 2
 
 class ExchangeRateCreate(BaseModel):
     base: str
@@ -27,6 +28,11 @@ class JournalCreate(BaseModel):
     lines: List[LedgerLine]
 
 
+class PeriodClose(BaseModel):
+    start_date: datetime.date
+    end_date: datetime.date
+
+
 class InvoiceLineCreate(BaseModel):
     description: Optional[str]
     quantity: float = 1.0
@@ -103,3 +109,11 @@ class GSTNWebhook(BaseModel):
     timestamp: Optional[str]
 
 
+
+
+class EInvoiceBatchSubmit(BaseModel):
+    # either explicit ids, or every invoice without an IRN dated within start..end
+    invoice_ids: Optional[List[int]]
+    start: Optional[datetime.date]
+    end: Optional[datetime.date]
+    concurrency: Optional[int]
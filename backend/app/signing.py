@@ -0,0 +1,106 @@
+"""Parallel RSA signing of canonical e-invoice payloads.
+
+RSA-2048 PKCS#1 v1.5 signing costs a millisecond or two of CPU per payload and holds the GIL, so signing a large
+batch inline keeps one core busy while the others idle. `SigningService` signs batches on a process pool of
+`GSP_SIGNING_WORKERS` processes (0: one per core). Each worker parses the private key once, in the pool
+initializer, and afterwards only receives payload bytes, `GSP_SIGNING_CHUNK` at a time. `sign_many` blocks and
+`sign_many_async` awaits the same pool from an event loop. Single payloads and small batches are signed inline,
+where shipping bytes to a worker would cost more than it saves.
+
+Workers are started with `spawn`: forking a threaded API process can deadlock the child on locks held by other
+threads. The pool starts on first use and lives as long as the service (`get_signing_service` keeps one per key).
+"""
+import asyncio
+import hashlib
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+from .config import get_settings
+from .gst_signing_rsa import load_private_key, sign_with_private
+
+# below this many payloads per worker, signing inline beats the round trip to the pool
+MIN_PER_WORKER = 4
+
+_worker_pem: Optional[bytes] = None
+
+
+def _init_worker(pem_private: bytes) -> None:
+    global _worker_pem
+    _worker_pem = pem_private
+    load_private_key(pem_private)
+
+
+def _sign_chunk(bodies: list[bytes]) -> list[str]:
+    return [sign_with_private(_worker_pem, body).hex() for body in bodies]
+
+
+class SigningService:
+    def __init__(self, pem_private: bytes, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        settings = get_settings()
+        self.pem_private = pem_private
+        self.workers = max(1, workers if workers is not None else (settings.GSP_SIGNING_WORKERS or os.cpu_count() or 1))
+        self.chunk_size = max(1, chunk_size or settings.GSP_SIGNING_CHUNK)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_worker, initargs=(self.pem_private,))
+            return self._pool
+
+    def _parallel(self, n: int) -> bool:
+        return self.workers > 1 and n >= self.workers * MIN_PER_WORKER
+
+    def _chunks(self, bodies: list[bytes]) -> list[list[bytes]]:
+        # at least one chunk per worker, so a batch smaller than workers * chunk_size still uses every core
+        size = max(1, min(self.chunk_size, math.ceil(len(bodies) / self.workers)))
+        return [bodies[i:i + size] for i in range(0, len(bodies), size)]
+
+    def _sign_inline(self, bodies: list[bytes]) -> list[str]:
+        return [sign_with_private(self.pem_private, body).hex() for body in bodies]
+
+    def sign(self, body: bytes) -> str:
+        return sign_with_private(self.pem_private, body).hex()
+
+    def sign_many(self, bodies: Sequence[bytes]) -> list[str]:
+        """Hex signatures of `bodies`, in order."""
+        bodies = list(bodies)
+        if not self._parallel(len(bodies)):
+            return self._sign_inline(bodies)
+        return [sig for chunk in self._executor().map(_sign_chunk, self._chunks(bodies)) for sig in chunk]
+
+    async def sign_many_async(self, bodies: Sequence[bytes]) -> list[str]:
+        """`sign_many` without blocking the event loop."""
+        bodies = list(bodies)
+        if not self._parallel(len(bodies)):
+            return await asyncio.to_thread(self._sign_inline, bodies)
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        chunks = await asyncio.gather(*(loop.run_in_executor(pool, _sign_chunk, chunk) for chunk in self._chunks(bodies)))
+        return [sig for chunk in chunks for sig in chunk]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+# sha256 of the private key PEM -> its service
+_services: dict[str, SigningService] = {}
+_services_lock = threading.Lock()
+
+
+def get_signing_service(pem_private: bytes) -> SigningService:
+    """Process-wide signing service (and worker pool) for a private key."""
+    key = hashlib.sha256(pem_private).hexdigest()
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = SigningService(pem_private)
+    return service
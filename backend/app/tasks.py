@@ -1,14 +1,13 @@
 from typing import Optional
 from .config import get_settings
-from .gsp_client import GSPClient
+from .gsp_client import get_client
 from .database import engine
 from sqlmodel import Session
 from . import crud
 
 
 def _worker_submit(invoice_id: int, payload: dict, use_sandbox: bool = False) -> dict:
-    client = GSPClient()
-    resp = client.submit_einvoice(payload, use_sandbox=use_sandbox)
+    resp = get_client().submit_einvoice(payload, use_sandbox=use_sandbox)
     irn = resp.get('irn') or resp.get('reference')
     status = resp.get('status', 'SUBMITTED')
     with Session(engine) as session:
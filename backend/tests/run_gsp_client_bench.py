@@ -0,0 +1,74 @@
+"""Micro-benchmark: per-submission overhead of a fresh GSP client vs the shared pooled client.
+
+Run with: `PYTHONPATH=. python3 backend/tests/run_gsp_client_bench.py --submissions 500`
+Starts a local keep-alive stub GSP on 127.0.0.1 and signs every request with a throwaway RSA key. The "fresh"
+mode does what the API did per invoice: build a client, parse the PEM key and open a new connection.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from backend.app.gsp_client import GSPClient
+from backend.app.gst_signing_rsa import generate_rsa_keypair
+
+
+class StubGSP(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; without this, delayed ACKs dominate keep-alive timings
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        body = json.dumps({"status": "IRN_ASSIGNED", "irn": f"IRN-{payload['invoice_number']}"}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _fresh_submit(url, pem, payload):
+    # the pre-pooling path: key parsed and a new connection opened for every submission
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    key = serialization.load_pem_private_key(pem, password=None)
+    signature = key.sign(body, padding.PKCS1v15(), hashes.SHA256()).hex()
+    r = requests.post(f'{url}/einvoice/submit', data=body, headers={'Content-Type': 'application/json', 'X-Signature': signature}, timeout=10)
+    r.raise_for_status()
+    return r.json()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--submissions', type=int, default=500)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGSP)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    pem, _ = generate_rsa_keypair()
+    payloads = [{"invoice_number": f'BENCH-{i}', "total_amount": 100.0, "lines": []} for i in range(args.submissions)]
+
+    start = time.perf_counter()
+    for p in payloads:
+        _fresh_submit(url, pem, p)
+    fresh = (time.perf_counter() - start) / len(payloads)
+
+    client = GSPClient(base_url=url, pem_private=pem)
+    start = time.perf_counter()
+    for p in payloads:
+        client.submit_einvoice(p)
+    shared = (time.perf_counter() - start) / len(payloads)
+    client.close()
+    server.shutdown()
+    print(f" fresh: {fresh * 1000:7.3f} ms/submission")
+    print(f"shared: {shared * 1000:7.3f} ms/submission")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark: throughput of an unrelated route while GSP submissions are stuck on a slow GSP.
+
+Run with: `PYTHONPATH=. python3 backend/tests/run_gsp_slow_bench.py --submissions 60 --gsp-delay 2`
+Serves the app in-process over ASGI against a throwaway SQLite database and a local stub GSP that answers after
+`--gsp-delay` seconds. `GET /periods` is hammered for `--seconds` with no submissions in flight, then alongside
+`--submissions` concurrent submissions through a threadpool-bound sync route (the old `submit_to_gsp`) and
+through the async `POST /invoices/{id}/submit_to_gsp`.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SlowGSP(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    delay = 2.0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.delay)
+        body = json.dumps({"status": "IRN_ASSIGNED", "irn": f"IRN-{payload['invoice_number']}"}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def _hammer(client, seconds: float, workers: int = 8) -> float:
+    done = 0
+    stop = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal done
+        while time.perf_counter() < stop:
+            (await client.get('/periods')).raise_for_status()
+            done += 1
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return done / seconds
+
+
+async def _run(args, app, ids):
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://api', timeout=None) as client:
+        print(f"{'idle':>6}: {await _hammer(client, args.seconds):8.0f} req/s on /periods")
+        for mode, path in (('sync', '/bench/sync_submit/{}'), ('async', '/invoices/{}/submit_to_gsp')):
+            batch = ids[mode]
+            submissions = asyncio.gather(*(client.post(path.format(i)) for i in batch))
+            await asyncio.sleep(0.2)
+            rate = await _hammer(client, args.seconds)
+            results = await submissions
+            assert all(r.status_code == 200 for r in results), [r.text for r in results if r.status_code != 200][:3]
+            print(f"{mode:>6}: {rate:8.0f} req/s on /periods with {len(batch)} slow submissions in flight")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--submissions', type=int, default=60)
+    parser.add_argument('--gsp-delay', type=float, default=2.0)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+    SlowGSP.delay = args.gsp_delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowGSP)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ['GSP_BASE_URL'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ['GSP_POOL_SIZE'] = str(args.submissions)
+    from fastapi.concurrency import run_in_threadpool
+    from backend.app import database, crud, models, gsp_client
+    from backend.app.main import app, _load_payload
+    from backend.app.middleware import SimpleRateLimiter
+
+    async def sync_submit(invoice_id: int):
+        # the pre-async route: the blocking client call (and its retry sleeps) occupies a threadpool worker
+        payload = await run_in_threadpool(_load_payload, invoice_id)
+        return await run_in_threadpool(gsp_client.get_client().submit_einvoice, payload)
+    app.add_api_route('/bench/sync_submit/{invoice_id}', sync_submit, methods=['POST'])
+    # the per-client rate limiter would throttle the load generator itself
+    app.user_middleware = [m for m in app.user_middleware if m.cls is not SimpleRateLimiter]
+    app.middleware_stack = app.build_middleware_stack()
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    database.init_db()
+    with next(database.get_session()) as session:
+        crud.create_currency(session, models.Currency(code='INR', name='Indian Rupee'))
+        ids = {mode: [crud.create_invoice(session, models.Invoice(invoice_number=f'{mode}-{i}', currency='INR'),
+                                          [models.InvoiceLine(description='x', amount=1.0)]).id for i in range(args.submissions)]
+               for mode in ('sync', 'async')}
+    asyncio.run(_run(args, app, ids))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Benchmark: invoices/second for one `crud.create_invoice` per invoice vs `crud.bulk_create_invoices` batches.
+
+Run with: `PYTHONPATH=. python3 backend/tests/run_invoice_bulk_bench.py --invoices 20000 --batch-size 1000`
+Uses a throwaway SQLite file by default; pass `--url` to benchmark against Postgres.
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+from sqlmodel import SQLModel, Session, create_engine
+from backend.app import models, crud
+
+
+def _setup(url):
+    engine = create_engine(url)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        crud.create_currency(session, models.Currency(code='INR', name='Indian Rupee'))
+    return engine
+
+
+def _make(i):
+    inv = models.Invoice(invoice_number=f'BENCH-{i}', customer_name='Customer', customer_gstin='27ABCDE1234F1Z5' if i % 2 else None,
+                         place_of_supply=str(i % 37), currency='INR', date=datetime.date(2026, 1, 1 + i % 28))
+    lines = [models.InvoiceLine(description=f'item {j}', quantity=1, unit_rate=100.0, amount=100.0, cgst=9.0, sgst=9.0) for j in range(3)]
+    return inv, lines
+
+
+def run(mode, url, n, batch_size):
+    engine = _setup(url)
+    start = time.perf_counter()
+    with Session(engine) as session:
+        if mode == 'single':
+            for i in range(n):
+                crud.create_invoice(session, *_make(i))
+        else:
+            for lo in range(0, n, batch_size):
+                crud.bulk_create_invoices(session, [_make(i) for i in range(lo, min(lo + batch_size, n))])
+    elapsed = time.perf_counter() - start
+    with Session(engine) as session:
+        assert crud.verify_gst_summary(session) == []
+    engine.dispose()
+    return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--invoices', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--url', default=None)
+    args = parser.parse_args()
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    for mode in ('single', 'bulk'):
+        rate = run(mode, url, args.invoices, args.batch_size)
+        print(f"{mode:>6}: {rate:8.0f} invoices/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark: journals/second for the legacy two-commit path, single-commit `create_journal` and group commit.
+
+Run with: `PYTHONPATH=. python3 backend/tests/run_journal_post_bench.py --journals 2000 --threads 16`
+Uses a throwaway SQLite file by default; pass `--url` to benchmark against Postgres.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlmodel import SQLModel, Session, create_engine
+from backend.app import models, crud
+from backend.app.posting import GroupCommitter
+
+
+def _legacy_create_journal(session, journal, lines):
+    # the pre-group-commit write path: one commit for the header, another for the lines
+    crud._check_balanced(lines)
+    session.add(journal)
+    session.commit()
+    crud._post_ledger_lines(session, journal, lines)
+    session.commit()
+    return journal
+
+
+def _setup(url):
+    engine = create_engine(url, connect_args={'check_same_thread': False} if url.startswith('sqlite') else {})
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        crud.create_currency(session, models.Currency(code='INR', name='Indian Rupee'))
+        a = crud.create_account(session, models.Account(name='Bank', type='asset', currency='INR'))
+        b = crud.create_account(session, models.Account(name='Sales', type='revenue', currency='INR'))
+        return engine, a.id, b.id
+
+
+def _make(i, a, b):
+    journal = models.JournalEntry(narration=f'bench {i}')
+    lines = [models.LedgerEntry(account_id=a, debit=1.0), models.LedgerEntry(account_id=b, credit=1.0)]
+    return journal, lines
+
+
+def run(mode, url, n, threads, window_ms):
+    engine, a, b = _setup(url)
+    committer = GroupCommitter(engine, window=window_ms / 1000.0) if mode == 'group' else None
+
+    def post(i):
+        journal, lines = _make(i, a, b)
+        if committer:
+            return committer.post(journal, lines)
+        with Session(engine) as session:
+            if mode == 'legacy':
+                return _legacy_create_journal(session, journal, lines)
+            return crud.create_journal(session, journal, lines)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(post, range(n)))
+    elapsed = time.perf_counter() - start
+    if committer:
+        committer.close()
+    with Session(engine) as session:
+        assert crud.verify_account_balances(session) == []
+    engine.dispose()
+    return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--journals', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--window-ms', type=float, default=5.0)
+    parser.add_argument('--url', default=None)
+    args = parser.parse_args()
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    for mode in ('legacy', 'single', 'group'):
+        rate = run(mode, url, args.journals, args.threads, args.window_ms)
+        print(f"{mode:>7}: {rate:8.0f} journals/s")
+
+
+if __name__ == '__main__':
+    main()
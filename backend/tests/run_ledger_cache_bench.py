@@ -0,0 +1,44 @@
+"""Benchmark: columnar ledger cache report latency on synthetic ledger lines (no database needed).
+
+Run with: `PYTHONPATH=. python3 backend/tests/run_ledger_cache_bench.py --lines 3000000 --accounts 500`
+"""
+import argparse
+import datetime
+import time
+import numpy as np
+from backend.app.ledger_cache import LedgerCache
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=3_000_000)
+    parser.add_argument('--accounts', type=int, default=500)
+    args = parser.parse_args()
+    n = args.lines
+    rng = np.random.default_rng(0)
+    cache = LedgerCache(initial_capacity=n)
+    cache._ids[:n] = np.arange(1, n + 1)
+    cache._account[:n] = rng.integers(1, args.accounts + 1, n)
+    cache._day[:n] = rng.integers(19000, 20500, n)
+    cache._month[:n] = cache._day[:n].astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+    amounts = rng.integers(1, 10_000_000, n)
+    is_debit = rng.random(n) < 0.5
+    cache._debit[:n] = np.where(is_debit, amounts, 0)
+    cache._credit[:n] = np.where(is_debit, 0, amounts)
+    cache._size = n
+
+    for label, fn in (
+        ('trial balance', lambda: cache.account_totals()),
+        ('trial balance as_of', lambda: cache.account_totals(as_of=datetime.date(2025, 1, 1))),
+        ('monthly movements', lambda: cache.monthly_movements()),
+        ('one account by month', lambda: cache.monthly_movements(account_id=7)),
+    ):
+        fn()
+        start = time.perf_counter()
+        for _ in range(5):
+            fn()
+        print(f"{label:>22}: {(time.perf_counter() - start) / 5 * 1000:7.1f} ms over {n} lines")
+
+
+if __name__ == '__main__':
+    main()
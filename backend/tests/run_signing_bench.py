@@ -0,0 +1,53 @@
+"""Benchmark: RSA-2048 payload signatures per second, inline vs the signing process pool per worker count.
+
+Run with: `PYTHONPATH=. python3 backend/tests/run_signing_bench.py --payloads 4000 --workers 1,2,4,8`
+Worker counts default to powers of two up to the number of cores. Pool start-up (spawning processes and parsing
+the key) is timed separately from steady-state signing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from backend.app.gst_signing_rsa import generate_rsa_keypair, verify_with_public
+from backend.app.signing import SigningService
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--payloads', type=int, default=4000)
+    parser.add_argument('--workers', default=','.join(str(2 ** i) for i in range(cores.bit_length()) if 2 ** i <= cores))
+    parser.add_argument('--chunk', type=int, default=64)
+    args = parser.parse_args()
+    pem, pub = generate_rsa_keypair()
+    bodies = [json.dumps({"invoice_number": f'SIGN-{i}', "total_amount": 100.0 + i, "lines": []},
+                         sort_keys=True, separators=(',', ':')).encode() for i in range(args.payloads)]
+    print(f'{args.payloads} payloads, {cores} cores')
+
+    inline = SigningService(pem, workers=1)
+    start = time.perf_counter()
+    expected = inline.sign_many(bodies)
+    base = args.payloads / (time.perf_counter() - start)
+    print(f'inline             {base:8.0f} sig/s')
+
+    for workers in (int(w) for w in args.workers.split(',')):
+        service = SigningService(pem, workers=workers, chunk_size=args.chunk)
+        start = time.perf_counter()
+        service.sign_many(bodies[:workers * 4])  # start the pool
+        warmup = time.perf_counter() - start
+        start = time.perf_counter()
+        sigs = service.sign_many(bodies)
+        rate = args.payloads / (time.perf_counter() - start)
+        start = time.perf_counter()
+        async_sigs = asyncio.run(service.sign_many_async(bodies))
+        async_rate = args.payloads / (time.perf_counter() - start)
+        service.shutdown()
+        assert sigs == async_sigs == expected  # PKCS#1 v1.5 signatures are deterministic
+        print(f'{workers:2d} workers  sync {rate:8.0f} sig/s ({rate / base:4.1f}x)  async {async_rate:8.0f} sig/s'
+              f'  start-up {warmup * 1000:6.0f} ms')
+    assert verify_with_public(pub, bodies[-1], bytes.fromhex(expected[-1]))
+
+
+if __name__ == '__main__':
+    main()
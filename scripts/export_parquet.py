@@ -0,0 +1,29 @@
+"""Export new journals, ledger lines, invoices and invoice lines to month-partitioned Parquet files.
+
+Writes through the configured storage adapter (S3/MinIO when `S3_BUCKET` is set, else `backend/storage/`).
+Only rows above each table's watermark are exported, so the job can run on a schedule. Rows that commit late
+below the watermark are picked up by later runs for up to `--gap-grace` seconds.
+
+Usage:
+  PYTHONPATH=. python scripts/export_parquet.py [--table ledgerentry ...] [--batch-size 50000] [--gap-grace 3600]
+"""
+import argparse
+from sqlmodel import Session
+from backend.app import database, exports
+from backend.app.storage import storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--table', action='append', choices=sorted(exports.EXPORTS), help='table to export (repeatable); default all')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--gap-grace', type=float, default=3600.0, help='seconds to keep waiting for skipped ids')
+    args = parser.parse_args()
+    with Session(database.engine) as session:
+        result = exports.export_all(session, storage, args.table, args.batch_size, args.gap_grace)
+    for table, info in result.items():
+        print(f"{table}: {info['rows']} rows, {len(info['files'])} file(s), watermark={info['last_id']}, open gaps={info['open_gaps']}")
+
+
+if __name__ == '__main__':
+    main()
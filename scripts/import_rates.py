@@ -0,0 +1,33 @@
+"""Bulk-load exchange rates from a CSV or NDJSON file, upserting on (base, target, timestamp).
+
+CSV needs a header with `base,target,rate,timestamp`; NDJSON has one object per line with the same fields.
+The file is streamed and written in batches, so multi-year backfills don't need to fit in memory.
+
+Usage:
+  PYTHONPATH=. python scripts/import_rates.py rates.csv [--format csv|ndjson] [--batch-size 5000]
+"""
+import argparse
+from sqlmodel import Session
+from backend.app import database, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default=None, help='default: from the file extension')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'ndjson')
+    job = imports.RateImport(fmt, args.batch_size)
+    with Session(database.engine) as session, open(args.path, encoding='utf-8', newline='') as f:
+        for line in f:
+            if job.feed(line.rstrip('\r\n')):
+                job.flush(session)
+        result = job.finish(session)
+    print(f"upserted={result['upserted']} duplicates={result['duplicates']} failed={result['failed']}")
+    for err in result['errors'][:20]:
+        print(f"  row {err['row']}: {err['error']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""Recompute materialized account balances from the ledger and report drift.
+
+Usage:
+  PYTHONPATH=. python scripts/rebuild_balances.py            # rebuild and print drift found
+  PYTHONPATH=. python scripts/rebuild_balances.py --verify   # only report drift, exit 1 if any
+"""
+import argparse
+from sqlmodel import Session
+from backend.app import database, crud
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verify', action='store_true', help='report drift without rewriting balances')
+    args = parser.parse_args()
+    with Session(database.engine) as session:
+        if args.verify:
+            drift = crud.verify_account_balances(session)
+        else:
+            drift = crud.rebuild_account_balances(session)
+    for row in drift:
+        print('DRIFT', row)
+    print(f"{len(drift)} account(s) drifted" + ('' if args.verify else ', balances rebuilt'))
+    if args.verify and drift:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
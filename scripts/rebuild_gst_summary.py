@@ -0,0 +1,29 @@
+"""Recompute the pre-aggregated GSTR-1 summary from invoices and report drift (e.g. after a backfill).
+
+Usage:
+  PYTHONPATH=. python scripts/rebuild_gst_summary.py            # rebuild and print drift found
+  PYTHONPATH=. python scripts/rebuild_gst_summary.py --verify   # only report drift, exit 1 if any
+"""
+import argparse
+from sqlmodel import Session
+from backend.app import database, crud
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verify', action='store_true', help='report drift without rewriting the summary')
+    args = parser.parse_args()
+    with Session(database.engine) as session:
+        if args.verify:
+            drift = crud.verify_gst_summary(session)
+        else:
+            drift = crud.rebuild_gst_summary(session)
+    for row in drift:
+        print('DRIFT', row)
+    print(f"{len(drift)} summary row(s) drifted" + ('' if args.verify else ', summary rebuilt'))
+    if args.verify and drift:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
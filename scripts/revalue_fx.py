@@ -0,0 +1,30 @@
+"""Revalue foreign-currency accounts and open invoices at closing rates and post the unrealized FX journal.
+
+Usage:
+  PYTHONPATH=. python scripts/revalue_fx.py --as-of 2026-03-31 [--dry-run] [--functional-currency INR]
+"""
+import argparse
+import datetime
+from sqlmodel import Session
+from backend.app import database, revaluation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--as-of', type=datetime.date.fromisoformat, required=True, help='closing date (YYYY-MM-DD)')
+    parser.add_argument('--dry-run', action='store_true', help='print the proposed entries without posting')
+    parser.add_argument('--functional-currency', default=None, help='defaults to FUNCTIONAL_CURRENCY')
+    args = parser.parse_args()
+    with Session(database.engine) as session:
+        result = revaluation.revalue(session, args.as_of, dry_run=args.dry_run, functional_currency=args.functional_currency)
+    for e in result['entries']:
+        print(f"{e['kind']:>7} {e['id']:>6} {e['currency']}: balance={e['balance']} rate={e['closing_rate']} "
+              f"carrying={e['carrying']} revalued={e['revalued']} gain_loss={e['gain_loss']}")
+    for s in result['skipped']:
+        print(f"skipped {s['kind']} {s['id']} {s['currency']}: {s['reason']}")
+    action = 'proposed' if result['dry_run'] else f"posted as journal {result['journal_id']}"
+    print(f"total {result['functional_currency']} {result['total_gain_loss']} {action}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Submit e-invoices to the GSP concurrently and print the outcome per invoice.
+
+Usage:
+  PYTHONPATH=. python scripts/submit_einvoices.py --ids 1,2,3 [--concurrency 16]
+  PYTHONPATH=. python scripts/submit_einvoices.py --start 2026-04-01 --end 2026-04-30 [--simulate-latency-ms 200]
+
+Without `--ids`, every invoice without an IRN in the date range is submitted. `--simulate-latency-ms` forces the
+simulated GSTN with that round-trip delay, for trying concurrency settings without a GSP.
+"""
+import argparse
+import datetime
+import time
+from sqlmodel import Session
+from backend.app import database, crud, gsp_batch, integrations
+from backend.app.gsp_client import get_client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ids', default=None, help='comma-separated invoice ids')
+    parser.add_argument('--start', type=datetime.date.fromisoformat, default=None)
+    parser.add_argument('--end', type=datetime.date.fromisoformat, default=None)
+    parser.add_argument('--concurrency', type=int, default=None, help='defaults to GSP_SUBMIT_CONCURRENCY')
+    parser.add_argument('--simulate-latency-ms', type=float, default=None)
+    args = parser.parse_args()
+    if not args.ids and not (args.start or args.end):
+        parser.error('give --ids or a --start/--end range')
+    client = get_client()
+    if args.simulate_latency_ms is not None:
+        client.base_url = None
+        client.sim = integrations.SimulatedGSTN(latency=args.simulate_latency_ms / 1000.0)
+    with Session(database.engine) as session:
+        ids = [int(i) for i in args.ids.split(',')] if args.ids else crud.unsubmitted_invoice_ids(session, args.start, args.end)
+        started = time.perf_counter()
+        report = gsp_batch.submit_batch(session, ids, client=client, concurrency=args.concurrency)
+        elapsed = time.perf_counter() - started
+    for r in report['results']:
+        detail = r.get('irn') or r.get('error') or r.get('response') or ''
+        print(f"{r['invoice_id']:>8} {r['status']:<10} {detail}")
+    print(f"{report['total']} invoices in {elapsed:.2f}s: {report['counts']}")
+
+
+if __name__ == '__main__':
+    main()
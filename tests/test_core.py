@@ -1,5 +1,6 @@
 import os
 import sys
+import datetime
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 from app import database, models, crud
 
@@ -30,3 +31,960 @@ def test_einvoice_payload():
         payload = crud.build_einvoice_payload(s, created.id)
         assert payload['invoice_number'] == 'TINV'
         assert payload['total_amount'] == 100
+
+def test_account_balance_materialized():
+    with next(database.get_session()) as s:
+        bank = crud.create_account(s, models.Account(name='Bank', type='asset', currency='INR'))
+        sales = crud.create_account(s, models.Account(name='Sales', type='revenue', currency='INR'))
+        for amt in (250.0, 50.5):
+            lines = [models.LedgerEntry(account_id=bank.id, debit=amt), models.LedgerEntry(account_id=sales.id, credit=amt)]
+            crud.create_journal(s, models.JournalEntry(narration='Sale'), lines)
+        assert crud.get_account_balance(s, bank.id)['balance'] == 300.5
+        assert crud.get_account_balance(s, sales.id)['balance'] == -300.5
+        assert crud.verify_account_balances(s) == []
+        # simulate drift and rebuild
+        row = s.get(models.AccountBalance, bank.id)
+        row.debit_minor = 100
+        s.add(row)
+        s.commit()
+        drift = crud.rebuild_account_balances(s)
+        assert [d['account_id'] for d in drift] == [bank.id]
+        assert crud.get_account_balance(s, bank.id)['balance'] == 300.5
+
+
+def test_trial_balance_constant_queries_and_periods():
+    from sqlalchemy import event
+    with next(database.get_session()) as s:
+        crud.create_currency(s, models.Currency(code='EUR', name='Euro'))
+        crud.create_exchange_rate(s, models.ExchangeRate(base='EUR', target='INR', rate=90.0))
+        eur = crud.create_account(s, models.Account(name='Bank EUR', type='asset', currency='EUR'))
+        cap = crud.create_account(s, models.Account(name='Capital EUR', type='equity', currency='EUR'))
+        for day, amt in ((datetime.date(2026, 1, 10), 10.0), (datetime.date(2026, 2, 10), 5.0)):
+            lines = [models.LedgerEntry(account_id=eur.id, debit=amt), models.LedgerEntry(account_id=cap.id, credit=amt)]
+            crud.create_journal(s, models.JournalEntry(narration='Capital', date=day), lines)
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(database.engine, 'before_cursor_execute', listener)
+        try:
+            rows = {r['account_id']: r for r in crud.trial_balance(s, target_currency='inr')}
+        finally:
+            event.remove(database.engine, 'before_cursor_execute', listener)
+        assert len(statements) == 2
+        assert rows[eur.id]['balance'] == 15.0
+        assert rows[eur.id]['converted_balance'] == 1350.0
+        as_of = {r['account_id']: r for r in crud.trial_balance(s, as_of=datetime.date(2026, 1, 31))}
+        assert as_of[eur.id]['balance'] == 10.0
+        feb = {r['account_id']: r for r in crud.trial_balance(s, date_from=datetime.date(2026, 2, 1), date_to=datetime.date(2026, 2, 28))}
+        assert feb[eur.id]['balance'] == 5.0
+        assert feb[cap.id]['balance'] == -5.0
+
+
+def test_period_close_snapshot_and_lock():
+    with next(database.get_session()) as s:
+        bank = crud.create_account(s, models.Account(name='Bank Close', type='asset', currency='INR'))
+        loan = crud.create_account(s, models.Account(name='Loan Close', type='liability', currency='INR'))
+        def post(day, amt):
+            lines = [models.LedgerEntry(account_id=bank.id, debit=amt), models.LedgerEntry(account_id=loan.id, credit=amt)]
+            return crud.create_journal(s, models.JournalEntry(narration='Loan', date=day), lines)
+        post(datetime.date(2025, 12, 15), 40.0)
+        period = crud.close_period(s, datetime.date(2025, 12, 1), datetime.date(2025, 12, 31))
+        snap = s.get(models.PeriodBalance, (period.id, bank.id))
+        assert snap.debit_minor == 4000
+        post(datetime.date(2026, 1, 5), 2.0)
+        assert crud.get_account_balance(s, bank.id, as_of=datetime.date(2026, 1, 31))['balance'] == 42.0
+        assert crud.get_account_balance(s, bank.id, as_of=datetime.date(2025, 12, 31))['balance'] == 40.0
+        rows = {r['account_id']: r for r in crud.trial_balance(s, as_of=datetime.date(2026, 1, 31))}
+        assert rows[loan.id]['balance'] == -42.0
+        try:
+            post(datetime.date(2025, 12, 20), 1.0)
+            assert False, 'back-dated post into closed period accepted'
+        except ValueError as e:
+            assert 'Period closed' in str(e)
+
+
+def test_bulk_journal_import_ndjson_and_csv():
+    import asyncio
+    import json
+    from app import imports
+    with next(database.get_session()) as s:
+        cash = crud.create_account(s, models.Account(name='Import Cash', type='asset', currency='INR'))
+        wages = crud.create_account(s, models.Account(name='Import Wages', type='expense', currency='INR'))
+        rows = [json.dumps({"narration": f"Pay {i}", "date": "2026-03-01", "lines": [
+            {"account_id": wages.id, "debit": 10.0}, {"account_id": cash.id, "credit": 10.0}]}) for i in range(5)]
+        rows.insert(2, json.dumps({"narration": "bad", "lines": [{"account_id": wages.id, "debit": 1.0}]}))
+        rows.insert(4, 'not json')
+        job = imports.JournalImport('ndjson', batch_size=2)
+        for line in rows:
+            if job.feed(line):
+                job.flush(s)
+        report = job.finish(s)
+        assert report['imported'] == 5
+        assert [e['row'] for e in report['errors']] == [3, 5]
+
+        async def body():
+            yield b"journal_ref,date,narration,account_id,debit,credit\nJ1,2026-03-02,Bank fee,"
+            yield f"{wages.id},4.5,0\nJ1,2026-03-02,Bank fee,{cash.id},0,4.5\nJ2,2026-03-02,Bad,{cash.id},0,1\n".encode()
+
+        async def run_csv():
+            job = imports.JournalImport('csv')
+            async for line in imports.aiter_lines(body()):
+                job.feed(line)
+            return job.finish(s)
+        report = asyncio.run(run_csv())
+        assert report['imported'] == 1
+        assert report['errors'][0]['journal_ref'] == 'J2'
+        assert crud.get_account_balance(s, cash.id)['balance'] == -54.5
+        assert crud.verify_account_balances(s) == []
+
+
+def test_group_commit_posts_concurrent_journals():
+    from concurrent.futures import ThreadPoolExecutor
+    from app.posting import GroupCommitter
+    with next(database.get_session()) as s:
+        bank_id = crud.create_account(s, models.Account(name='GC Bank', type='asset', currency='INR')).id
+        sales_id = crud.create_account(s, models.Account(name='GC Sales', type='revenue', currency='INR')).id
+    committer = GroupCommitter(database.engine, window=0.02)
+
+    def post(i):
+        credit = 2.0 if i == 3 else 1.0  # journal 3 is unbalanced
+        lines = [models.LedgerEntry(account_id=bank_id, debit=1.0), models.LedgerEntry(account_id=sales_id, credit=credit)]
+        try:
+            return committer.post(models.JournalEntry(narration=f'gc {i}'), lines).id
+        except ValueError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(post, range(8)))
+    committer.close()
+    assert ids[3] is None
+    assert len({i for i in ids if i}) == 7
+    with next(database.get_session()) as s:
+        assert crud.get_account_balance(s, bank_id)['balance'] == 7.0
+        assert crud.verify_account_balances(s) == []
+
+
+def test_group_commit_survives_database_errors():
+    from sqlalchemy.exc import OperationalError
+    from app import posting
+    with next(database.get_session()) as s:
+        bank_id = crud.create_account(s, models.Account(name='GCE Bank', type='asset', currency='INR')).id
+        sales_id = crud.create_account(s, models.Account(name='GCE Sales', type='revenue', currency='INR')).id
+    committer = posting.GroupCommitter(database.engine, window=0.001, timeout=5)
+    lines = lambda: [models.LedgerEntry(account_id=bank_id, debit=1.0), models.LedgerEntry(account_id=sales_id, credit=1.0)]
+    original = crud._latest_closed_period
+
+    def broken(session):
+        raise OperationalError('SELECT', {}, Exception('connection dropped'))
+
+    crud._latest_closed_period = broken
+    try:
+        try:
+            committer.post(models.JournalEntry(narration='gce 1'), lines())
+            raise AssertionError('expected the database error')
+        except OperationalError:
+            pass
+    finally:
+        crud._latest_closed_period = original
+    assert committer.post(models.JournalEntry(narration='gce 2'), lines()).id
+    committer.close()
+
+
+def test_minor_unit_money_is_exact():
+    from app import money
+    assert money.to_minor(0.1) + money.to_minor(0.2) == money.to_minor(0.3)
+    assert money.to_minor(10.005) == 1001
+    assert money.to_minor(1234, 0) == 1234
+    with next(database.get_session()) as s:
+        crud.create_currency(s, models.Currency(code='JPY', name='Yen', exponent=0))
+        yen = crud.create_account(s, models.Account(name='Bank JPY', type='asset', currency='JPY'))
+        eq = crud.create_account(s, models.Account(name='Equity JPY', type='equity', currency='JPY'))
+        dimes = crud.create_account(s, models.Account(name='Petty Cash', type='asset', currency='INR'))
+        sundry = crud.create_account(s, models.Account(name='Sundry', type='expense', currency='INR'))
+        crud.create_journal(s, models.JournalEntry(narration='Yen'), [
+            models.LedgerEntry(account_id=yen.id, debit=1500), models.LedgerEntry(account_id=eq.id, credit=1500)])
+        for _ in range(10):
+            crud.create_journal(s, models.JournalEntry(narration='Dime'), [
+                models.LedgerEntry(account_id=dimes.id, debit=0.1), models.LedgerEntry(account_id=sundry.id, credit=0.1)])
+        assert crud.get_account_balance(s, yen.id)['balance_minor'] == 1500
+        assert crud.get_account_balance(s, dimes.id)['balance'] == 1.0
+        rows = {r['account_id']: r for r in crud.trial_balance(s)}
+        assert rows[yen.id]['balance'] == 1500.0
+        assert rows[dimes.id]['balance_minor'] == 100
+        inv = models.Invoice(invoice_number='MINOR-1', customer_name='C', currency='INR', date=datetime.date(2030, 1, 5))
+        lines = [models.InvoiceLine(description='x', amount=0.1, igst=0.01) for _ in range(3)]
+        crud.create_invoice(s, inv, lines)
+        summary = crud.summarize_gstr1(s, datetime.date(2030, 1, 1), datetime.date(2030, 1, 31))
+        assert summary['total_taxable'] == 0.3
+        assert summary['total_igst'] == 0.03
+        assert summary['invoice_count'] == 1
+
+
+def test_account_ledger_keyset_pages_carry_running_balance():
+    with next(database.get_session()) as s:
+        bank = crud.create_account(s, models.Account(name='Stmt Bank', type='asset', currency='INR'))
+        other = crud.create_account(s, models.Account(name='Stmt Other', type='income', currency='INR'))
+        for day, amt in ((3, 5.0), (1, 10.0), (2, -4.0), (2, 1.25), (4, 2.0)):
+            debit, credit = (amt, 0.0) if amt > 0 else (0.0, -amt)
+            crud.create_journal(s, models.JournalEntry(narration=f'd{day}', date=datetime.date(2026, 4, day)), [
+                models.LedgerEntry(account_id=bank.id, debit=debit, credit=credit),
+                models.LedgerEntry(account_id=other.id, debit=credit, credit=debit)])
+        rows, cursor = [], None
+        while True:
+            page = crud.account_ledger(s, bank.id, cursor=cursor, limit=2)
+            rows.extend(page['rows'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        assert [r['date'] for r in rows] == ['2026-04-01', '2026-04-02', '2026-04-02', '2026-04-03', '2026-04-04']
+        assert [r['balance'] for r in rows] == [10.0, 6.0, 7.25, 12.25, 14.25]
+        page = crud.account_ledger(s, bank.id, start=datetime.date(2026, 4, 3))
+        assert page['opening_balance'] == 7.25
+        assert [r['balance'] for r in page['rows']] == [12.25, 14.25]
+        assert len(list(crud.iter_account_ledger(s, bank.id, chunk_size=2))) == 5
+
+
+def test_parquet_export_is_incremental(tmp_path):
+    import pyarrow.parquet as pq
+    from app import exports
+    from app.storage import Storage
+
+    class LocalStorage(Storage):
+        def __init__(self):
+            self.bucket = None
+            self.s3_client = None
+            self.local_base = str(tmp_path)
+
+    store = LocalStorage()
+    with next(database.get_session()) as s:
+        first = exports.export_table(s, 'ledgerentry', store)
+        assert first['rows'] > 0
+        total = sum(pq.read_table(f).num_rows for f in first['files'])
+        assert total == first['rows']
+        assert all('/month=' in f for f in first['files'])
+        assert exports.export_table(s, 'ledgerentry', store)['rows'] == 0
+        acc = crud.create_account(s, models.Account(name='Export New', type='asset', currency='INR'))
+        crud.create_journal(s, models.JournalEntry(narration='late', date=datetime.date(2026, 6, 1)), [
+            models.LedgerEntry(account_id=acc.id, debit=1.0), models.LedgerEntry(account_id=acc.id, credit=1.0)])
+        again = exports.export_table(s, 'ledgerentry', store)
+        assert again['rows'] == 2
+        assert again['files'][0].endswith('.parquet') and 'month=2026-06' in again['files'][0]
+        assert pq.read_table(again['files'][0]).column('debit_minor').to_pylist() == [100, 0]
+        invoices = exports.export_table(s, 'invoice', store)
+        exported = pq.read_table(invoices['files'][0])
+        assert {'grand_total', 'grand_total_minor', 'taxable_total_minor'} <= set(exported.column_names)
+
+
+def test_parquet_export_picks_up_rows_committed_out_of_order(tmp_path):
+    import pyarrow.parquet as pq
+    from sqlalchemy import delete, insert
+    from sqlmodel import select
+    from app import exports
+    from app.storage import Storage
+
+    class LocalStorage(Storage):
+        def __init__(self):
+            self.bucket = None
+            self.s3_client = None
+            self.local_base = str(tmp_path)
+
+    store = LocalStorage()
+    with next(database.get_session()) as s:
+        exports.export_table(s, 'journalentry', store)
+        first = crud.create_journal(s, models.JournalEntry(narration='ooo 1', date=datetime.date(2026, 7, 1)), [])
+        crud.create_journal(s, models.JournalEntry(narration='ooo 2', date=datetime.date(2026, 7, 2)), [])
+        # simulate a transaction that took `first.id` but commits only after a later id has been exported
+        s.execute(delete(models.JournalEntry).where(models.JournalEntry.id == first.id))
+        s.commit()
+        run = exports.export_table(s, 'journalentry', store)
+        assert run['rows'] == 1 and run['open_gaps'] == 1
+        s.execute(insert(models.JournalEntry), [{"id": first.id, "narration": 'ooo 1', "date": datetime.date(2026, 7, 1)}])
+        s.commit()
+        late = exports.export_table(s, 'journalentry', store)
+        assert late['rows'] == 1 and late['open_gaps'] == 0
+        assert pq.read_table(late['files'][0]).column('id').to_pylist() == [first.id]
+        assert exports.export_table(s, 'journalentry', store)['rows'] == 0
+        # ids that never commit (rolled back) are given up on after the grace period
+        crud.create_journal(s, models.JournalEntry(narration='ooo 3', date=datetime.date(2026, 7, 3)), [])
+        crud.create_journal(s, models.JournalEntry(narration='ooo 4', date=datetime.date(2026, 7, 3)), [])
+        last = s.exec(select(models.JournalEntry.id).order_by(models.JournalEntry.id.desc())).first()
+        s.execute(delete(models.JournalEntry).where(models.JournalEntry.id == last - 1))
+        s.commit()
+        assert exports.export_table(s, 'journalentry', store)['open_gaps'] == 1
+        assert exports.export_table(s, 'journalentry', store, gap_grace=0)['open_gaps'] == 0
+
+
+def test_journal_import_reports_closed_period_and_exponent_errors_per_row():
+    import json
+    from sqlmodel import select
+    from app import imports
+    with next(database.get_session()) as s:
+        ids = {a.name: a.id for a in s.exec(select(models.Account)).all()}
+        cash, wages, yen, eq = ids['Import Cash'], ids['Import Wages'], ids['Bank JPY'], ids['Equity JPY']
+        rows = [
+            {"narration": "ok", "date": "2026-04-01", "lines": [{"account_id": wages, "debit": 2.0}, {"account_id": cash, "credit": 2.0}]},
+            {"narration": "closed", "date": "2025-06-01", "lines": [{"account_id": wages, "debit": 2.0}, {"account_id": cash, "credit": 2.0}]},
+            # balanced in paise but not in whole yen: 1 != 1 + 1
+            {"narration": "yen", "date": "2026-04-01", "lines": [{"account_id": yen, "debit": 1.4}, {"account_id": eq, "credit": 0.7},
+                                                                  {"account_id": eq, "credit": 0.7}]},
+            {"narration": "ok too", "date": "2026-04-02", "lines": [{"account_id": wages, "debit": 3.0}, {"account_id": cash, "credit": 3.0}]},
+        ]
+        job = imports.JournalImport('ndjson', batch_size=10)
+        for row in rows:
+            job.feed(json.dumps(row))
+        report = job.finish(s)
+        assert report['imported'] == 2
+        assert [(e['row'], e['error'].split(':')[0]) for e in report['errors']] == [(2, 'Period closed'), (3, 'Journal not balanced')]
+
+
+def test_group_commit_and_import_keep_three_decimal_amounts():
+    import json
+    from sqlmodel import select
+    from app import imports, posting
+    with next(database.get_session()) as s:
+        crud.create_currency(s, models.Currency(code='KWD', name='Kuwaiti Dinar', exponent=3))
+        bank = crud.create_account(s, models.Account(name='Bank KWD', type='asset', currency='KWD')).id
+        eq = crud.create_account(s, models.Account(name='Equity KWD', type='equity', currency='KWD')).id
+    lines = lambda: [models.LedgerEntry(account_id=bank, debit=1.2345), models.LedgerEntry(account_id=eq, credit=1.2345)]
+    committer = posting.GroupCommitter(database.engine, window=0.001, timeout=5)
+    posted = committer.post(models.JournalEntry(narration='kwd gc', date=datetime.date(2030, 5, 1)), lines())
+    committer.close()
+    with next(database.get_session()) as s:
+        job = imports.JournalImport('ndjson')
+        job.feed(json.dumps({"narration": "kwd import", "date": "2030-05-02", "lines": [
+            {"account_id": bank, "debit": 1.2345}, {"account_id": eq, "credit": 1.2345}]}))
+        assert job.finish(s)['imported'] == 1
+        q = select(models.LedgerEntry.debit_minor).where(models.LedgerEntry.account_id == bank)
+        assert s.exec(q.where(models.LedgerEntry.journal_id == posted.id)).all() == [1235]
+        assert s.exec(q).all() == [1235, 1235]
+        assert crud.get_account_balance(s, bank)['balance_minor'] == 2470
+
+def test_ledger_cache_matches_sql():
+    from app.ledger_cache import LedgerCache, check_consistency
+    cache = LedgerCache(initial_capacity=4)
+    with next(database.get_session()) as s:
+        cache.load(s)
+        assert check_consistency(s, cache) == []
+        a = crud.create_account(s, models.Account(name='Cache A', type='asset', currency='INR'))
+        b = crud.create_account(s, models.Account(name='Cache B', type='income', currency='INR'))
+        for month, amt in ((7, 3.5), (7, 1.0), (8, 2.25)):
+            j = crud.create_journal(s, models.JournalEntry(narration='c', date=datetime.date(2026, month, 2)), [
+                models.LedgerEntry(account_id=a.id, debit=amt), models.LedgerEntry(account_id=b.id, credit=amt)])
+            if month == 7:
+                # posts reach the cache through the post hook or the id catch-up in sync()
+                cache.append([(l.id, l.account_id, j.date, l.debit_minor, l.credit_minor)
+                              for l in s.exec(crud.select(models.LedgerEntry).where(models.LedgerEntry.journal_id == j.id)).all()])
+        cache.sync(s)
+        assert check_consistency(s, cache) == []
+        assert cache.account_totals()[a.id] == (675, 0)
+        assert cache.account_totals(as_of=datetime.date(2026, 7, 31))[a.id] == (450, 0)
+        assert cache.monthly_movements(account_id=b.id) == [(b.id, '2026-07', 0, 450), (b.id, '2026-08', 0, 225)]
+
+
+def test_ledger_cache_monthly_movements_with_sparse_accounts_and_months():
+    from app.ledger_cache import LedgerCache
+    cache = LedgerCache()
+    cache.append([(1, 90000, datetime.date(1975, 1, 3), 100, 0), (2, 7, datetime.date(2060, 12, 9), 0, 250),
+                  (3, 90000, datetime.date(1975, 1, 20), 5, 0)])
+    assert cache.monthly_movements() == [(7, '2060-12', 0, 250), (90000, '1975-01', 105, 0)]
+
+def test_ledger_cache_picks_up_bulk_posts_and_late_ids():
+    from app import ledger_cache
+    from app.ledger_cache import LedgerCache, check_consistency
+    cache = LedgerCache()
+    with next(database.get_session()) as s:
+        a = crud.create_account(s, models.Account(name='Gap A', type='asset', currency='INR'))
+        b = crud.create_account(s, models.Account(name='Gap B', type='income', currency='INR'))
+        cache.load(s)
+
+        def lines(amt):
+            return [models.LedgerEntry(account_id=a.id, debit=amt), models.LedgerEntry(account_id=b.id, credit=amt)]
+        ledger_cache._cache = cache
+        try:
+            crud.bulk_create_journals(s, [(models.JournalEntry(narration='g', date=datetime.date(2030, 4, 1)), lines(1.0))])
+            assert cache.account_totals()[a.id] == (100, 0)  # through the post hook, before any sync
+        finally:
+            ledger_cache._cache = None
+        first = crud.create_journal(s, models.JournalEntry(narration='g', date=datetime.date(2030, 4, 2)), lines(2.0))
+        crud.create_journal(s, models.JournalEntry(narration='g', date=datetime.date(2030, 4, 3)), lines(4.0))
+        # the first journal's lines commit after the second's: hold them back while the cache syncs past them
+        held = s.exec(crud.select(models.LedgerEntry).where(models.LedgerEntry.journal_id == first.id)).all()
+        copies = [models.LedgerEntry(id=l.id, journal_id=l.journal_id, account_id=l.account_id, debit=l.debit,
+                                     credit=l.credit, debit_minor=l.debit_minor, credit_minor=l.credit_minor) for l in held]
+        for l in held:
+            s.delete(l)
+        s.commit()
+        cache.sync(s)
+        assert cache.account_totals()[a.id] == (500, 0)
+        s.add_all(copies)
+        s.commit()
+        cache.append([(copies[0].id, a.id, first.date, copies[0].debit_minor, 0)])
+        cache.append([(copies[0].id, a.id, first.date, copies[0].debit_minor, 0)])  # repeated hook calls count once
+        assert cache.sync(s) == 1
+        assert cache.account_totals()[a.id] == (700, 0)
+        assert cache._gaps == []
+        assert check_consistency(s, cache) == []
+
+def test_fx_rate_cache_as_of_and_invalidation():
+    import json
+    from app import fx
+    cache = fx.get_rate_cache()
+    with next(database.get_session()) as s:
+        crud.create_currency(s, models.Currency(code='GBP', name='Pound'))
+        jan, feb = datetime.datetime(2026, 1, 15, 9), datetime.datetime(2026, 2, 15, 9)
+        crud.create_exchange_rate(s, models.ExchangeRate(base='GBP', target='INR', rate=100.0, timestamp=jan))
+        cache.load(s)
+        crud.create_exchange_rate(s, models.ExchangeRate(base='GBP', target='INR', rate=110.0, timestamp=feb))
+        assert cache.rate(s, 'GBP', 'INR') == 110.0
+        assert cache.rate(s, 'GBP', 'INR', as_of=datetime.date(2026, 1, 31)) == 100.0
+        assert cache.rate(s, 'GBP', 'INR', as_of=datetime.date(2026, 1, 14)) is None
+        assert crud._convert_amount(s, 220.0, 'INR', 'GBP') == 2.0
+        assert cache.rates_into(s, 'INR', datetime.date(2026, 1, 31))['GBP'] == 100.0
+        # an update published by another replica lands in the cache without a reload
+        fx._apply_message(json.dumps({"origin": "other", "base": "GBP", "target": "INR",
+                                      "timestamp": "2026-03-01T00:00:00", "rate": 120.0}))
+        assert cache.rate(s, 'GBP', 'INR') == 120.0
+        fx._apply_message(b'not json')
+        assert cache.rate(s, 'GBP', 'INR') == 110.0
+
+
+def test_fx_matrix_triangulates_through_pivot():
+    from app.fx import RateMatrix
+    m = RateMatrix.build({('USD', 'INR'): 80.0, ('EUR', 'USD'): 1.1, ('GBP', 'EUR'): 1.2, ('JPY', 'KRW'): 9.0}, pivots=['USD'])
+    assert m.rate('EUR', 'INR') == 1.1 * 80.0
+    assert abs(m.rate('INR', 'GBP') - 1 / (1.2 * 1.1 * 80.0)) < 1e-15
+    assert m.rate('JPY', 'INR') is None
+    converted = m.convert_many([10.0, 2.0, 5.0, 7.0], ['EUR', 'INR', 'JPY', 'XXX'], 'INR')
+    assert converted.tolist() == [880.0, 2.0, 5.0, 7.0]
+
+
+def test_fx_revaluation_dry_run_and_post(tmp_path):
+    from sqlmodel import SQLModel, Session, create_engine
+    from app import fx, revaluation
+    engine = create_engine(f"sqlite:///{tmp_path / 'reval.db'}")
+    SQLModel.metadata.create_all(engine)
+    fx.get_rate_cache().invalidate()
+    try:
+        with Session(engine) as s:
+            for code in ('INR', 'USD'):
+                crud.create_currency(s, models.Currency(code=code, name=code))
+            for ts, rate in ((datetime.datetime(2030, 1, 1), 80.0), (datetime.datetime(2030, 1, 20), 82.0),
+                             (datetime.datetime(2030, 1, 31), 85.0), (datetime.datetime(2030, 2, 15), 90.0)):
+                crud.create_exchange_rate(s, models.ExchangeRate(base='USD', target='INR', rate=rate, timestamp=ts))
+            bank = crud.create_account(s, models.Account(name='Bank USD', type='asset', currency='USD'))
+            cap = crud.create_account(s, models.Account(name='Capital USD', type='equity', currency='USD'))
+            crud.create_journal(s, models.JournalEntry(narration='fund', date=datetime.date(2030, 1, 5)), [
+                models.LedgerEntry(account_id=bank.id, debit=100.0), models.LedgerEntry(account_id=cap.id, credit=100.0)])
+            inv = crud.create_invoice(s, models.Invoice(invoice_number='USD-1', currency='USD', date=datetime.date(2030, 1, 25)),
+                                      [models.InvoiceLine(description='svc', amount=50.0)])
+
+            preview = revaluation.revalue(s, datetime.date(2030, 1, 31), dry_run=True, functional_currency='INR')
+            gains = {(e['kind'], e['id']): e['gain_loss'] for e in preview['entries']}
+            assert gains == {('account', bank.id): 500.0, ('account', cap.id): -500.0, ('invoice', inv.id): 150.0}
+            assert preview['total_gain_loss'] == 150.0 and preview['journal_id'] is None
+            assert s.exec(crud.select(models.FXRevaluation)).all() == []
+
+            posted = revaluation.revalue(s, datetime.date(2030, 1, 31), functional_currency='INR')
+            assert posted['entries'] == preview['entries']
+            gl = s.exec(crud.select(models.Account).where(models.Account.name == revaluation.GAIN_LOSS_ACCOUNT)).one()
+            assert crud.get_account_balance(s, gl.id)['balance'] == -150.0
+            assert crud.verify_account_balances(s) == []
+
+            # the next run starts from the revalued amounts
+            feb = revaluation.revalue(s, datetime.date(2030, 2, 28), functional_currency='INR')
+            assert {(e['kind'], e['id']): e['gain_loss'] for e in feb['entries']} == {
+                ('account', bank.id): 500.0, ('account', cap.id): -500.0, ('invoice', inv.id): 250.0}
+            try:
+                revaluation.revalue(s, datetime.date(2030, 2, 28), functional_currency='INR')
+                assert False, 'expected a repeated run to be rejected'
+            except ValueError:
+                pass
+    finally:
+        fx.get_rate_cache().invalidate()
+        engine.dispose()
+
+
+def test_bulk_rate_import_upserts_and_refreshes_cache():
+    from app import imports, fx
+    with next(database.get_session()) as s:
+        crud.create_currency(s, models.Currency(code='CHF', name='Franc'))
+        fx.get_rate_cache().load(s)
+        job = imports.RateImport('csv', batch_size=2)
+        for line in ['base,target,rate,timestamp', 'CHF,INR,95.0,2026-04-01', 'chf,inr,96.0,2026-04-01',
+                     'CHF,INR,97.5,2026-04-02T00:00:00+05:30', 'CHF,XYZ,1.0,2026-04-02', 'CHF,INR,-1,2026-04-03']:
+            if job.feed(line):
+                job.flush(s)
+        report = job.finish(s)
+        assert (report['upserted'], report['duplicates']) == (2, 1)
+        assert [e['row'] for e in report['errors']] == [5, 6]
+        # re-importing replaces the rate for an existing (base, target, timestamp)
+        job = imports.RateImport('ndjson')
+        job.feed('{"base": "CHF", "target": "INR", "rate": 98.0, "timestamp": "2026-04-01"}')
+        assert job.finish(s)['upserted'] == 1
+        rates = s.exec(crud.select(models.ExchangeRate).where(models.ExchangeRate.base == 'CHF').order_by(models.ExchangeRate.timestamp)).all()
+        assert [(r.timestamp, r.rate) for r in rates] == [
+            (datetime.datetime(2026, 4, 1), 98.0), (datetime.datetime(2026, 4, 1, 18, 30), 97.5)]
+        assert fx.get_rate_cache().rate(s, 'CHF', 'INR', as_of=datetime.datetime(2026, 4, 1, 12)) == 98.0
+
+
+def test_gstr1_breakdown_by_category_and_place_of_supply():
+    with next(database.get_session()) as s:
+        day = datetime.date(2030, 2, 10)
+        specs = [('B2B-1', '27ABCDE1234F1Z5', '27', False, False, dict(amount=100, cgst=9, sgst=9)),
+                 ('B2B-2', '29ABCDE1234F1Z5', '29', False, False, dict(amount=200, igst=36)),
+                 ('B2C-1', None, '27', False, False, dict(amount=50, cgst=4.5, sgst=4.5)),
+                 ('EXP-1', None, '96', True, True, dict(amount=300)),
+                 ('EXP-2', None, '96', True, False, dict(amount=400, igst=72))]
+        for number, gstin, pos, export, lut, amounts in specs:
+            inv = models.Invoice(invoice_number=f'G1-{number}', customer_gstin=gstin, place_of_supply=pos,
+                                 is_export=export, lut_applicable=lut, currency='INR', date=day)
+            crud.create_invoice(s, inv, [models.InvoiceLine(description='x', **amounts)])
+        summary = crud.summarize_gstr1(s, datetime.date(2030, 2, 1), datetime.date(2030, 2, 28))
+        assert summary['invoice_count'] == 5
+        assert summary['total_taxable'] == 1050.0 and summary['total_igst'] == 108.0
+        assert summary['by_category']['B2B'] == {'invoice_count': 2, 'taxable': 300.0, 'igst': 36.0, 'cgst': 9.0, 'sgst': 9.0}
+        assert summary['by_category']['EXPWOP']['taxable'] == 300.0
+        assert summary['by_category']['EXPWP']['igst'] == 72.0
+        assert [(g['category'], g['place_of_supply']) for g in summary['breakdown']] == [
+            ('B2B', '27'), ('B2B', '29'), ('B2C', '27'), ('EXPWP', '96'), ('EXPWOP', '96')]
+
+
+def test_gst_summary_maintained_incrementally():
+    with next(database.get_session()) as s:
+        inv = crud.create_invoice(s, models.Invoice(invoice_number='GSTS-1', place_of_supply='96', is_export=True, currency='INR',
+                                                    date=datetime.date(2030, 3, 31)), [models.InvoiceLine(description='x', amount=500, igst=90)])
+        crud.create_invoice(s, models.Invoice(invoice_number='GSTS-2', customer_gstin='27ABCDE1234F1Z5', place_of_supply='27',
+                                              currency='INR', date=datetime.date(2030, 4, 2)), [models.InvoiceLine(description='x', amount=10, cgst=0.9, sgst=0.9)])
+        row = s.get(models.GSTSummary, ('2030-03', 'EXPWP', '96', 'INR'))
+        assert (row.invoice_count, row.taxable_minor, row.igst_minor) == (1, 50000, 9000)
+        crud.apply_lut(s, inv.id, 'LUT-1')
+        assert s.get(models.GSTSummary, ('2030-03', 'EXPWP', '96', 'INR')).invoice_count == 0
+        assert crud.verify_gst_summary(s) == []
+        # March is read from the summary, the first days of April from the invoices
+        summary = crud.summarize_gstr1(s, datetime.date(2030, 3, 1), datetime.date(2030, 4, 5))
+        assert summary['by_category']['EXPWOP']['taxable'] == 500.0
+        assert summary['by_category']['B2B'] == {'invoice_count': 1, 'taxable': 10.0, 'igst': 0.0, 'cgst': 0.9, 'sgst': 0.9}
+        s.execute(crud.delete(models.GSTSummary))
+        s.commit()
+        assert len(crud.rebuild_gst_summary(s)) > 0
+        assert crud.verify_gst_summary(s) == []
+        assert crud.summarize_gstr1(s, datetime.date(2030, 3, 1), datetime.date(2030, 4, 5)) == summary
+
+
+def test_invoice_totals_stored_on_invoice():
+    with next(database.get_session()) as s:
+        inv = crud.create_invoice(s, models.Invoice(invoice_number='TOT-1', currency='INR', date=datetime.date(2030, 5, 2)), [
+            models.InvoiceLine(description='a', amount=100.10, cgst=9.01, sgst=9.01),
+            models.InvoiceLine(description='b', amount=0.20, igst=0.04),
+        ])
+        assert (inv.taxable_total_minor, inv.igst_total_minor, inv.cgst_total_minor, inv.sgst_total_minor) == (10030, 4, 901, 901)
+        assert inv.grand_total_minor == 11836 and inv.grand_total == 118.36 and inv.taxable_total == 100.3
+        assert crud.build_einvoice_payload(s, inv.id)['total_amount'] == 100.3
+        summary = crud.summarize_gstr1(s, datetime.date(2030, 5, 2), datetime.date(2030, 5, 2))
+        assert summary['by_category']['B2C'] == {'invoice_count': 1, 'taxable': 100.3, 'igst': 0.04, 'cgst': 9.01, 'sgst': 9.01}
+
+
+def test_bulk_invoice_import_returns_ids_in_order():
+    import json
+    from app import imports
+    with next(database.get_session()) as s:
+        records = [{"invoice_number": f"BULK-{i}", "date": "2030-06-01", "currency": "inr", "place_of_supply": "27",
+                    "lines": [{"description": "x", "amount": 100.0, "cgst": 9.0, "sgst": 9.0}]} for i in range(5)]
+        records.insert(1, {"invoice_number": "BULK-0", "currency": "INR", "lines": []})
+        records.insert(3, {"invoice_number": "BULK-X", "currency": "XYZ", "lines": []})
+        job = imports.InvoiceImport(batch_size=2)
+        for line in ['  ', '[', ',\n'.join(json.dumps(r) for r in records), ']']:
+            if job.feed(line):
+                job.flush(s)
+        report = job.finish(s)
+        assert (report['imported'], [e['row'] for e in report['errors']]) == (5, [2, 4])
+        ids = report['invoice_ids']
+        assert ids[1] is None and ids[3] is None
+        assert [s.get(models.Invoice, i).invoice_number for i in ids if i] == [f'BULK-{i}' for i in range(5)]
+        inv = s.get(models.Invoice, ids[-1])
+        assert (inv.grand_total_minor, inv.currency) == (11800, 'INR')
+        assert crud.verify_gst_summary(s) == []
+        job = imports.InvoiceImport('ndjson')
+        job.feed(json.dumps({"invoice_number": "BULK-5", "currency": "INR", "lines": [{"amount": 1.0}]}))
+        job.feed('not json')
+        report = job.finish(s)
+        assert report['imported'] == 1 and report['invoice_ids'][1] is None and report['errors'][0]['row'] == 2
+
+
+def test_invoice_json_array_is_split_as_it_streams():
+    import json
+    from app import imports
+    records = [{"invoice_number": f"ARR-{i}", "currency": "INR", "customer_name": 'say "hi", [ok] {\\}',
+                "lines": [{"description": "a,b]", "amount": 1.0}]} for i in range(5)]
+    body = json.dumps(records, separators=(',', ':'))  # one line
+    with next(database.get_session()) as s:
+        job = imports.InvoiceImport(batch_size=2)
+        flushes = 0
+        for i in range(0, len(body), 7):
+            if job.feed_text(body[i:i + 7]):
+                job.flush(s)
+                flushes += 1
+        report = job.finish(s)
+        assert (report['imported'], report['failed'], flushes) == (5, 0, 2)
+        assert s.get(models.Invoice, report['invoice_ids'][0]).customer_name == 'say "hi", [ok] {\\}'
+    splitter = imports.JSONArraySplitter()
+    assert splitter.feed(' [1, "a]", {"b": [2]} ,null]  ') == ['1', '"a]"', '{"b": [2]}', 'null']
+    splitter.close()
+    assert imports.JSONArraySplitter().feed('[]') == []
+    for bad in ('{"a": 1}', '[1,,2]', '[1,]', '[1] 2', '[1}', '[1, 2'):
+        try:
+            splitter = imports.JSONArraySplitter()
+            splitter.feed(bad)
+            splitter.close()
+            raise AssertionError(f'accepted {bad}')
+        except ValueError:
+            pass
+
+def test_einvoice_payload_cached_with_etag():
+    from fastapi.testclient import TestClient
+    from app import einvoice
+    from app.main import app
+    from app.gst_signing_rsa import generate_rsa_keypair, verify_with_public
+    with next(database.get_session()) as s:
+        inv = crud.create_invoice(s, models.Invoice(invoice_number='ETAG-1', currency='INR', is_export=True, date=datetime.date(2030, 7, 1)),
+                                  [models.InvoiceLine(description='x', amount=50.0, igst=9.0)])
+        cache = einvoice.get_payload_cache()
+        entry = cache.get(s, inv.id)
+        assert cache.get(s, inv.id) is entry
+        assert entry.body == einvoice.canonical_bytes(crud.build_einvoice_payload(s, inv.id))
+        priv, pub = generate_rsa_keypair()
+        assert entry.signature(priv) is entry.signature(priv)
+        assert verify_with_public(pub, entry.body, bytes.fromhex(entry.signature(priv)))
+
+        client = TestClient(app)
+        r = client.get(f'/invoices/{inv.id}/einvoice_payload')
+        assert r.status_code == 200 and r.headers['etag'] == entry.etag and r.json()['total_amount'] == 50.0
+        assert client.get(f'/invoices/{inv.id}/einvoice_payload', headers={'If-None-Match': entry.etag}).status_code == 304
+        # changing the invoice bumps its revision, which rebuilds the payload under a new ETag
+        crud.apply_lut(s, inv.id, 'LUT-9')
+        r = client.get(f'/invoices/{inv.id}/einvoice_payload', headers={'If-None-Match': entry.etag})
+        assert r.status_code == 200 and r.headers['etag'] != entry.etag and r.json()['lut_applicable'] is True
+        assert client.get('/invoices/999999/einvoice_payload').status_code == 404
+
+
+def test_batch_gsp_submission_runs_concurrently():
+    import time
+    from app import gsp_batch, integrations
+    from app.gsp_client import GSPClient
+
+    class FlakyGSTN(integrations.SimulatedGSTN):
+        def submit_einvoice(self, payload):
+            if payload['invoice_number'] == 'BATCH-3':
+                raise RuntimeError('GSP timeout')
+            return super().submit_einvoice(payload)
+
+    with next(database.get_session()) as s:
+        ids = [crud.create_invoice(s, models.Invoice(invoice_number=f'BATCH-{i}', currency='INR', date=datetime.date(2030, 8, 1)),
+                                   [models.InvoiceLine(description='x', amount=10.0)]).id for i in range(8)]
+        assert crud.unsubmitted_invoice_ids(s, datetime.date(2030, 8, 1), datetime.date(2030, 8, 1)) == ids
+        client = GSPClient(base_url=None)
+        client.base_url, client.sim = None, FlakyGSTN(latency=0.1)
+        started = time.perf_counter()
+        report = gsp_batch.submit_batch(s, ids + [999999], client=client, concurrency=8, write_batch=3)
+        assert time.perf_counter() - started < 0.5
+        assert report['counts'] == {'submitted': 7, 'failed': 1, 'not_found': 1}
+        assert [r['invoice_id'] for r in report['results']] == ids + [999999]
+        assert report['results'][3] == {'invoice_id': ids[3], 'status': 'failed', 'error': 'GSP timeout'}
+        s.expire_all()
+        assert s.get(models.Invoice, ids[0]).einvoice_irn == 'IRN-SIM-BATCH-0'
+        assert crud.get_einvoice_status(s, ids[3])['events'][0]['event'] == 'GSP_SUBMISSION_FAILED'
+        report = gsp_batch.submit_batch(s, ids, client=client)
+        assert report['counts'] == {'skipped': 7, 'failed': 1}
+
+
+def test_shared_gsp_client_reuses_session_and_parsed_keys():
+    from fastapi.testclient import TestClient
+    from app import gsp_client, gst_signing_rsa
+    from app.main import app
+    assert gsp_client.get_client() is gsp_client.get_client()
+    priv, pub = gst_signing_rsa.generate_rsa_keypair()
+    client = gsp_client.GSPClient(base_url='http://gsp.invalid', pem_private=priv)
+    assert client.http.get_adapter('https://gsp.invalid')._pool_maxsize == client.settings.GSP_POOL_SIZE
+    before = gst_signing_rsa.load_private_key.cache_info().misses
+    for message in (b'a', b'b', b'c'):
+        assert gst_signing_rsa.verify_with_public(pub, message, gst_signing_rsa.sign_with_private(priv, message))
+    assert gst_signing_rsa.load_private_key.cache_info().misses == before + 1
+    with next(database.get_session()) as s:
+        inv = crud.create_invoice(s, models.Invoice(invoice_number='SHARED-1', currency='INR', date=datetime.date(2030, 9, 1)),
+                                  [models.InvoiceLine(description='x', amount=10.0)])
+    r = TestClient(app).post(f'/invoices/{inv.id}/submit_to_gsp')
+    assert r.status_code == 200 and r.json()['irn'] == 'IRN-SIM-SHARED-1'
+
+
+def test_async_gsp_client_retries_with_backoff_and_deadline():
+    import asyncio
+    import time
+    import httpx
+    from app.gsp_client import AsyncGSPClient
+    calls = []
+
+    async def flaky(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"status": "IRN_ASSIGNED", "irn": "IRN-ASYNC"})
+
+    async def stalled(request):
+        await asyncio.sleep(5)
+        return httpx.Response(200, json={})
+
+    async def run():
+        client = AsyncGSPClient(base_url='http://gsp.test', transport=httpx.MockTransport(flaky))
+        client.backoff = 0.01
+        resp = await client.submit_einvoice({"invoice_number": "A-1"})
+        await client.aclose()
+        client = AsyncGSPClient(base_url='http://gsp.test', transport=httpx.MockTransport(stalled))
+        started = time.perf_counter()
+        try:
+            await client.submit_einvoice({"invoice_number": "A-2"}, deadline=0.2)
+            raise AssertionError('expected the deadline to expire')
+        except RuntimeError:
+            elapsed = time.perf_counter() - started
+        await client.aclose()
+        return resp, elapsed
+
+    resp, elapsed = asyncio.run(run())
+    assert resp['irn'] == 'IRN-ASYNC' and len(calls) == 3
+    assert calls[0].content == b'{"invoice_number":"A-1"}'
+    assert elapsed < 1.0
+
+
+def test_gsp_circuit_breaker_trips_and_limiter_backs_off():
+    import time
+    from fastapi.testclient import TestClient
+    from app import resilience
+    from app.gsp_client import GSPClient
+    from app.integrations import FaultyGSTN
+    from app.main import app
+    guard = resilience.Guard(resilience.CircuitBreaker('test', failure_threshold=3, reset_timeout=0.2, shared=False),
+                             resilience.AdaptiveLimiter(1, 4, latency_target=0.05, queue_timeout=0.1))
+    client = GSPClient(guard=guard)
+    client.base_url, client.sim = None, FaultyGSTN()
+    client.sim.fail_next(3)
+    for _ in range(3):
+        try:
+            client.submit_einvoice({"invoice_number": "CB-1"})
+            raise AssertionError('expected an injected fault')
+        except ConnectionError:
+            pass
+    assert guard.breaker.state == resilience.OPEN and guard.breaker.trips == 1
+    assert guard.limiter.limit < 4
+    try:
+        client.submit_einvoice({"invoice_number": "CB-1"})
+        raise AssertionError('expected the open circuit to reject the call')
+    except resilience.CircuitOpenError:
+        pass
+    assert client.sim.calls == 3 and guard.breaker.rejected == 1
+    time.sleep(0.25)
+    assert guard.breaker.state == resilience.HALF_OPEN
+    assert client.submit_einvoice({"invoice_number": "CB-1"})['irn'] == 'IRN-SIM-CB-1'
+    assert guard.breaker.state == resilience.CLOSED
+    snap = TestClient(app).get('/health/gsp').json()
+    assert set(snap) == {'breaker', 'limiter'} and 'state' in snap['breaker'] and 'limit' in snap['limiter']
+
+
+def test_signing_pool_signs_batches_like_inline_signing():
+    import asyncio
+    from app import gst_signing_rsa
+    from app.einvoice import CanonicalPayload
+    from app.gsp_client import GSPClient
+    from app.signing import SigningService
+    priv, pub = gst_signing_rsa.generate_rsa_keypair()
+    bodies = [f'{{"invoice_number":"SIG-{i}"}}'.encode() for i in range(20)]
+    service = SigningService(priv, workers=2, chunk_size=3)
+    try:
+        sigs = service.sign_many(bodies)
+        assert service._pool is not None
+        assert asyncio.run(service.sign_many_async(bodies)) == sigs
+    finally:
+        service.shutdown()
+    assert sigs == [gst_signing_rsa.sign_with_private(priv, b).hex() for b in bodies]
+    assert all(gst_signing_rsa.verify_with_public(pub, b, bytes.fromhex(s)) for b, s in zip(bodies, sigs))
+    client = GSPClient(base_url='http://gsp.invalid', pem_private=priv)
+    payloads = [CanonicalPayload(i, 0, {"invoice_number": f'SIG-{i}'}) for i in range(3)]
+    assert client.presign(payloads) == 3 and client.presign(payloads) == 0
+    assert payloads[0].signature(priv) == gst_signing_rsa.sign_with_private(priv, payloads[0].body).hex()
+
+
+def test_list_invoices_filters_search_and_keyset_pages():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with next(database.get_session()) as s:
+        ids = []
+        for i in range(5):
+            inv = models.Invoice(invoice_number=f'LIST-{i}', customer_name='Acme Exports' if i % 2 else 'Zen Traders',
+                                 customer_gstin='29LISTG0000A1Z5', currency='INR', is_export=bool(i % 2),
+                                 date=datetime.date(2030, 10, 1 + i // 2))
+            ids.append(crud.create_invoice(s, inv, [models.InvoiceLine(description='x', amount=100.0, igst=18.0),
+                                                    models.InvoiceLine(description='y', amount=50.0)]).id)
+        newest_first = [ids[4], ids[3], ids[2], ids[1], ids[0]]
+        seen, cursor = [], None
+        while True:
+            page = crud.list_invoices(s, cursor=cursor, limit=2, customer_gstin='29LISTG0000A1Z5')
+            seen += [r['id'] for r in page['rows']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        assert seen == newest_first
+        found = crud.list_invoices(s, q='acme', start=datetime.date(2030, 10, 1), end=datetime.date(2030, 10, 3), include_totals=True)
+        assert [r['id'] for r in found['rows']] == [ids[3], ids[1]]
+        assert found['rows'][0]['grand_total'] == 168.0 and found['rows'][0]['line_count'] == 2
+        exports = crud.list_invoices(s, customer_gstin='29LISTG0000A1Z5', is_export=False, currency='INR')
+        assert [r['id'] for r in exports['rows']] == [ids[4], ids[2], ids[0]] and 'grand_total' not in exports['rows'][0]
+    client = TestClient(app)
+    r = client.get('/invoices', params={'q': 'LIST-', 'limit': 3, 'start': '2030-10-01', 'end': '2030-10-03'})
+    assert r.status_code == 200 and len(r.json()['rows']) == 3 and r.json()['next_cursor']
+    assert client.get('/invoices', params={'cursor': 'nope'}).status_code == 400
+
+
+def test_only_duplicate_invoice_numbers_become_value_errors():
+    from sqlalchemy.exc import IntegrityError
+    with next(database.get_session()) as s:
+        crud.create_invoice(s, models.Invoice(invoice_number='DUP-1', currency='INR', einvoice_irn='IRN-DUP-1',
+                                              date=datetime.date(2030, 11, 1)), [models.InvoiceLine(description='x', amount=1.0)])
+        try:
+            crud.create_invoice(s, models.Invoice(invoice_number='DUP-1', currency='INR', date=datetime.date(2030, 11, 1)), [])
+            raise AssertionError('expected a duplicate number error')
+        except ValueError as e:
+            assert 'already exists' in str(e)
+        try:
+            crud.create_invoice(s, models.Invoice(invoice_number='DUP-2', currency='INR', einvoice_irn='IRN-DUP-1',
+                                                  date=datetime.date(2030, 11, 1)), [])
+            raise AssertionError('expected the IRN conflict to propagate')
+        except IntegrityError:
+            pass
+        assert crud.create_invoice(s, models.Invoice(invoice_number='DUP-2', currency='INR', date=datetime.date(2030, 11, 1)), []).id
+
+
+def test_gsp_guard_ignores_client_errors_and_stale_successes():
+    import asyncio
+    import time
+    import httpx
+    from app import resilience
+    from app.gsp_client import AsyncGSPClient
+    guard = resilience.Guard(resilience.CircuitBreaker('4xx', failure_threshold=1, reset_timeout=0.1, shared=False),
+                             resilience.AdaptiveLimiter(1, 4, latency_target=1.0, queue_timeout=0.1))
+    calls = []
+
+    async def bad_request(request):
+        calls.append(request)
+        return httpx.Response(400, json={"error": "invalid GSTIN"})
+
+    async def run():
+        client = AsyncGSPClient(base_url='http://gsp.test', transport=httpx.MockTransport(bad_request), guard=guard)
+        try:
+            await client.submit_einvoice({"invoice_number": "BAD-1"})
+            raise AssertionError('expected the rejection')
+        except RuntimeError as e:
+            assert 'rejected' in str(e)
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert len(calls) == 1 and guard.breaker.state == resilience.CLOSED and guard.limiter.decreases == 0
+
+    breaker = guard.breaker
+    slow = breaker.allow()  # a call admitted while the GSP looked healthy
+    breaker.record_failure(breaker.allow())
+    assert breaker.state == resilience.OPEN
+    breaker.record_success(slow)
+    assert breaker.state == resilience.OPEN
+    time.sleep(0.15)
+    probe = breaker.allow()
+    breaker.record_success(slow)
+    assert breaker.state == resilience.HALF_OPEN
+    breaker.record_success(probe)
+    assert breaker.state == resilience.CLOSED
+
+
+def test_async_gsp_client_signs_off_the_event_loop_and_bounds_simulated_calls():
+    import asyncio
+    import threading
+    import time
+    import httpx
+    from app import gsp_client, gst_signing_rsa, resilience, signing
+    from app.einvoice import CanonicalPayload
+    from app.integrations import SimulatedGSTN
+    priv, _ = gst_signing_rsa.generate_rsa_keypair()
+    signer_threads = []
+
+    def recording(original):
+        def sign(pem, message):
+            signer_threads.append(threading.current_thread())
+            return original(pem, message)
+        return sign
+
+    async def ok(request):
+        return httpx.Response(200, json={"status": "IRN_ASSIGNED", "irn": "IRN-OFFLOOP"})
+
+    async def run():
+        loop_thread = threading.current_thread()
+        client = gsp_client.AsyncGSPClient(base_url='http://gsp.test', pem_private=priv, transport=httpx.MockTransport(ok))
+        cached = CanonicalPayload(1, 0, {"invoice_number": "OFF-1"})
+        await client.submit_einvoice(cached)
+        await client.submit_einvoice({"invoice_number": "OFF-2"})
+        await client.aclose()
+        sim = gsp_client.AsyncGSPClient(base_url=None, guard=resilience.new_gsp_guard())
+        sim.base_url, sim.sim = None, SimulatedGSTN(latency=1.0)
+        started = time.perf_counter()
+        try:
+            await sim.submit_einvoice({"invoice_number": "OFF-3"}, deadline=0.1)
+            raise AssertionError('expected the deadline to expire')
+        except RuntimeError:
+            elapsed = time.perf_counter() - started
+        return loop_thread, cached, elapsed
+
+    saved = signing.sign_with_private, gsp_client.sign_with_private
+    signing.sign_with_private, gsp_client.sign_with_private = recording(saved[0]), recording(saved[1])
+    try:
+        loop_thread, cached, elapsed = asyncio.run(run())
+    finally:
+        signing.sign_with_private, gsp_client.sign_with_private = saved
+    assert len(signer_threads) == 2 and loop_thread not in signer_threads
+    assert cached.signed_by(priv)
+    assert elapsed < 0.5
+
+
+def test_fx_realization_posts_to_a_balanced_gain_loss_account():
+    from sqlmodel import select
+    with next(database.get_session()) as s:
+        inv = crud.create_invoice(s, models.Invoice(invoice_number='FXR-1', customer_name='C', currency='INR',
+                                                    date=datetime.date(2030, 6, 1)),
+                                  [models.InvoiceLine(description='x', amount=100.0)])
+        fx = crud.create_fx_realization(s, inv.id, 102.5, 'INR', 'INR')
+        assert fx.gain_loss_minor == 250
+        acct = s.exec(select(models.Account).where(models.Account.name == 'FX Gain/Loss')).one()
+        assert s.get(models.AccountBalance, acct.id).credit_minor == 250
+        assert crud.verify_account_balances(s) == []
+
+
+def test_period_close_rejects_open_periods_and_fx_realization_respects_it():
+    from sqlmodel import select
+    with next(database.get_session()) as s:
+        for start, end in ((datetime.date.today().replace(day=1), datetime.date.today()),
+                           (datetime.date(2025, 12, 15), datetime.date(2026, 1, 31))):
+            try:
+                crud.close_period(s, start, end)
+                raise AssertionError(f'closed {start}..{end}')
+            except ValueError:
+                pass
+        inv = s.exec(select(models.Invoice).where(models.Invoice.invoice_number == 'FXR-1')).one()
+        before = len(s.exec(select(models.FXRealization)).all())
+        # a period covering today can only come from an earlier close; insert it directly
+        period = models.FiscalPeriod(start_date=datetime.date(2026, 1, 1), end_date=datetime.date.today())
+        s.add(period)
+        s.commit()
+        try:
+            crud.create_fx_realization(s, inv.id, 103.0, 'INR', 'INR')
+            raise AssertionError('realization posted into a closed period')
+        except ValueError as e:
+            assert 'Period closed' in str(e)
+        finally:
+            s.rollback()
+            s.delete(period)
+            s.commit()
+        assert len(s.exec(select(models.FXRealization)).all()) == before
@@ -0,0 +1,100 @@
+"""Query-plan regression test: hot crud lookups must be index searches, not full table scans.
+
+Seeds a throwaway SQLite database, records every SELECT the hot crud functions issue and runs
+`EXPLAIN QUERY PLAN` on each. Any `SCAN <table>` step (a sequential scan) fails the test, except on small
+reference tables where the planner rightly prefers a scan.
+"""
+import os
+import sys
+import datetime
+import pytest
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+from app import models, crud
+
+# a handful of rows each; a scan of these is cheaper than an index lookup
+REFERENCE_TABLES = {'currency', 'fiscalperiod'}
+# unfiltered first pages walk an index in ORDER BY order and stop at the LIMIT, reading one page of rows
+# (SQLite indexes end in the rowid, so it may walk ix_invoice_date just as well as ix_invoice_date_id)
+ORDERED_WALKS = {'invoice_list': {'SCAN invoice USING INDEX ix_invoice_date_id', 'SCAN invoice USING INDEX ix_invoice_date'}}
+
+
+@pytest.fixture(scope='module')
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        crud.create_currency(s, models.Currency(code='INR', name='Rupee'))
+        crud.create_currency(s, models.Currency(code='USD', name='Dollar'))
+        accounts = [crud.create_account(s, models.Account(name=f'A{i}', type='asset', currency='INR')).id for i in range(20)]
+        start = datetime.date(2026, 1, 1)
+        journals = []
+        for i in range(2000):
+            a, b = accounts[i % 20], accounts[(i * 7 + 1) % 20]
+            journals.append((models.JournalEntry(narration=f'J{i}', date=start + datetime.timedelta(days=i % 300)),
+                             [models.LedgerEntry(account_id=a, debit=10.0), models.LedgerEntry(account_id=b, credit=10.0)]))
+        crud.bulk_create_journals(s, journals)
+        crud.close_period(s, datetime.date(2026, 1, 1), datetime.date(2026, 3, 31))
+        for i in range(300):
+            inv = models.Invoice(invoice_number=f'INV-{i}', customer_name='C', currency='INR', einvoice_irn=f'IRN-{i}',
+                                 date=start + datetime.timedelta(days=i))
+            s.add(inv)
+            s.flush()
+            s.add(models.InvoiceLine(invoice_id=inv.id, description='x', amount=100, igst=18, amount_minor=10000, igst_minor=1800))
+            s.add(models.EInvoiceAudit(invoice_id=inv.id, event='SUBMITTED'))
+            s.add(models.WebhookNonce(nonce=f'n-{i}'))
+            s.add(models.ExchangeRate(base='USD', target='INR', rate=80 + i / 100, timestamp=datetime.datetime(2026, 1, 1) + datetime.timedelta(days=i)))
+        s.commit()
+        s.connection().exec_driver_sql('ANALYZE')
+        s.commit()
+    yield engine
+    engine.dispose()
+
+
+def _scans(engine, call, allowed=frozenset()) -> list[str]:
+    """Run `call(session)` and return the full-scan plan steps of every SELECT it issued."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        with Session(engine) as s:
+            call(s)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert statements
+    scans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall():
+                detail = row[-1]
+                if detail.startswith('SCAN ') and detail.split()[1] not in REFERENCE_TABLES | {'CONSTANT'} and detail not in allowed:
+                    scans.append(f'{detail}  <-  {statement}')
+    return scans
+
+
+HOT_QUERIES = {
+    'account_balance_as_of': lambda s: crud.get_account_balance(s, 3, as_of=datetime.date(2026, 6, 30)),
+    'account_ledger': lambda s: crud.account_ledger(s, 3, start=datetime.date(2026, 5, 1), limit=50),
+    'account_ledger_next_page': lambda s: crud.account_ledger(s, 3, cursor='2026-05-10_100_0', limit=50),
+    'einvoice_payload': lambda s: crud.build_einvoice_payload(s, 150),
+    'einvoice_status': lambda s: crud.get_einvoice_status(s, 150),
+    'status_by_irn': lambda s: crud.update_einvoice_status_by_irn(s, 'IRN-150', 'ACCEPTED'),
+    'nonce_check': lambda s: crud.check_and_store_nonce(s, 'fresh-nonce', None),
+    'latest_rate': lambda s: crud.get_latest_rate(s, 'USD', 'INR'),
+    'gstr1_summary': lambda s: crud.summarize_gstr1(s, datetime.date(2026, 3, 1), datetime.date(2026, 3, 31)),
+    'invoice_list': lambda s: crud.list_invoices(s, limit=50, include_totals=True),
+    'invoice_list_next_page': lambda s: crud.list_invoices(s, cursor='2026-06-01_150', limit=50),
+    'invoice_list_by_gstin': lambda s: crud.list_invoices(s, customer_gstin='29ABCDE1234F1Z5', limit=50),
+    'invoice_list_by_status': lambda s: crud.list_invoices(s, einvoice_status='ACCEPTED', start=datetime.date(2026, 3, 1), limit=50),
+    'invoice_search': lambda s: crud.list_invoices(s, q='INV-1', limit=50),
+}
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(engine, name):
+    assert _scans(engine, HOT_QUERIES[name], ORDERED_WALKS.get(name, frozenset())) == []